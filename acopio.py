@@ -10,6 +10,9 @@ import pandas as pd
 import os
 import io, base64
 import matplotlib.pyplot as plt
+import cache_datos
+import ingesta
+from tiempos import medido
 from modelo_acopio import predecir_acopio  # importar la función del otro módulo
 
 # Crear el Blueprint
@@ -21,29 +24,32 @@ DATA_PATH = os.path.join("DataSheet", "Volumen de Acopio Directos - Res 0017 de
 # ==========================
 # Función para cargar y limpiar la data
 # ==========================
+def _leer_csv(buffer, dtype=None):
+    # Intentar diferentes codificaciones
+    encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
+    for encoding in encodings:
+        try:
+            buffer.seek(0)
+            return pd.read_csv(buffer, sep=';', encoding=encoding, dtype=dtype)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("No se pudo leer el archivo con ninguna codificación")
+
+
+@medido('acopio.datos')
 def cargar_datos():
     """Cargar y normalizar el CSV de acopio.
 
     Intenta múltiples codificaciones, normaliza nombres de columnas,
     convierte columnas numéricas (quitando separadores de miles y
     normalizando decimales) y devuelve un DataFrame listo para uso en
-    las vistas.
+    las vistas. La lectura pasa por `ingesta`: si el CSV sólo creció se
+    limpian únicamente las filas nuevas.
     """
-    # Intentar diferentes codificaciones
-    encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
-    df = None
-    
-    for encoding in encodings:
-        try:
-            df = pd.read_csv(DATA_PATH, sep=';', encoding=encoding)
-            # Si llegamos aquí, la lectura fue exitosa
-            break
-        except UnicodeDecodeError:
-            continue
-    
-    if df is None:
-        raise ValueError("No se pudo leer el archivo con ninguna codificación")
+    return ingesta.leer('acopio', DATA_PATH, _leer_csv, _limpiar).df.copy()
+
 
+def _limpiar(df):
     # Normalizar nombres de columnas: quitar espacios y tildes
     def normalize_col(col):
         import unicodedata
@@ -92,25 +98,35 @@ def cargar_datos():
 # ==========================
 # Función para generar gráfico
 # ==========================
+@medido('acopio.grafico')
+def grafico_anual(anio):
+    """Gráfico de `anio` cacheado; se regenera sólo si llegan filas de ese año."""
+    lectura = ingesta.leer('acopio', DATA_PATH, _leer_csv, _limpiar)
+    return cache_datos.memo(('acopio', 'grafico', int(anio)), cache_datos.firma_anio(lectura, anio),
+                            lambda: generar_grafico(lectura.df, anio))
+
+
 def generar_grafico(df, anio):
     """Genera un gráfico de barras (base64 PNG) del volumen total por mes para `anio`."""
     df_anio = df[df['AÑO'] == anio].copy()
     columnas_deptos = df.columns[2:]
     resumen = df_anio.groupby('MES')[columnas_deptos].sum().sum(axis=1).reset_index(name='VOLUMEN (LITROS)')
 
+    # API orientada a objetos (no la figura "actual" de pyplot): el
+    # vigilante de `recarga_datos` genera gráficos en otro hilo.
     fig, ax = plt.subplots(figsize=(8, 4))
     ax.bar(resumen['MES'], resumen['VOLUMEN (LITROS)'])
     ax.set_title(f'Volumen total de acopio - {anio}')
     ax.set_xlabel('Mes')
     ax.set_ylabel('Volumen (Litros)')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
 
     buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
+    fig.savefig(buffer, format='png')
     buffer.seek(0)
     grafico_base64 = base64.b64encode(buffer.getvalue()).decode()
-    plt.close()
+    plt.close(fig)
     return grafico_base64
 
 # ==========================
@@ -144,7 +160,7 @@ def analisis_acopio():
     mes_min = df_anio.loc[df_anio['TOTAL'].idxmin()]
 
     # Gráfico
-    grafico_base64 = generar_grafico(df, anio)
+    grafico_base64 = grafico_anual(anio)
 
     # Predicciones usando modelo externo (capturar errores sin romper la vista)
     try:
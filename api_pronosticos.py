@@ -0,0 +1,133 @@
+"""API JSON de pronósticos por departamento.
+
+Expone `/api/pronosticos/<serie>` (serie = 'precio' o 'acopio') para
+consultar varios departamentos con un horizonte de 1 a 36 meses en una
+sola respuesta. Las predicciones y bandas salen de los ajustes en lote
+cacheados en `modelo_precio` y `modelo_acopio`: nada se reentrena por
+petición, sólo se evalúan los coeficientes ya ajustados.
+
+Parámetros (query string):
+- `horizonte`: meses a pronosticar (6 por defecto).
+- `departamentos`: lista separada por comas o 'all' (por defecto). También
+  se acepta `departamento` repetido.
+- `modelo`: fuerza 'lineal' o 'estacional' para todas las series; si se
+  omite, cada departamento usa el modelo que tenga configurado.
+"""
+
+import os
+from datetime import datetime
+
+from flask import Blueprint, jsonify, request
+
+from inversion import ERRORES_DATOS
+from pronosticos import PRONOSTICADORES, modelo_para, validar_horizonte
+from modelo_precio import pronostico_departamentos
+from modelo_acopio import pronostico_acopio
+
+api_pronosticos_bp = Blueprint('api_pronosticos', __name__)
+
+# serie -> función que devuelve el AjusteLote cacheado para un modelo
+FUENTES = {
+    'precio': pronostico_departamentos,
+    'acopio': pronostico_acopio,
+}
+
+
+def _departamentos_pedidos():
+    """Lista de nombres pedidos o None si se piden todos."""
+    pedidos = request.args.getlist('departamento')
+    for valor in request.args.getlist('departamentos'):
+        pedidos.extend(valor.split(','))
+    pedidos = [p.strip() for p in pedidos if p.strip()]
+    if not pedidos or any(p.lower() in ('all', 'todos') for p in pedidos):
+        return None
+    return pedidos
+
+
+def _registrar_error():
+    """Guarda el traceback en instance/api_pronosticos_error.log (la respuesta no lo incluye)."""
+    try:
+        import traceback
+        log_dir = os.path.join(os.path.dirname(__file__), 'instance')
+        os.makedirs(log_dir, exist_ok=True)
+        with open(os.path.join(log_dir, 'api_pronosticos_error.log'), 'a', encoding='utf-8') as f:
+            f.write(f"--- {datetime.utcnow().isoformat()} {request.full_path} ---\n")
+            f.write(traceback.format_exc())
+    except Exception:
+        pass
+
+
+@api_pronosticos_bp.route('/api/pronosticos/<serie>')
+def pronosticos(serie):
+    """Pronóstico de varios departamentos en una sola respuesta JSON."""
+    fuente = FUENTES.get(serie)
+    if fuente is None:
+        return jsonify({'error': f"Serie desconocida: {serie}. Use 'precio' o 'acopio'."}), 404
+
+    try:
+        horizonte = validar_horizonte(request.args.get('horizonte', 6))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    modelo = request.args.get('modelo') or None
+    if modelo is not None and modelo not in PRONOSTICADORES:
+        return jsonify({'error': f"Modelo desconocido: {modelo}. Opciones: {', '.join(PRONOSTICADORES)}"}), 400
+
+    try:
+        # las columnas son las mismas para cualquier modelo
+        base = fuente(modelo_para('NACIONAL', modelo))
+    except ERRORES_DATOS:
+        _registrar_error()
+        return jsonify({'error': 'No se pudieron cargar los datos de esta serie.'}), 503
+    if base is None:
+        return jsonify({'error': 'No hay datos disponibles para esta serie.'}), 503
+
+    pedidos = _departamentos_pedidos()
+    if pedidos is None:
+        nombres = list(base.columnas)
+    else:
+        por_clave = {c.upper(): c for c in base.columnas}
+        desconocidos = [p for p in pedidos if p.upper() not in por_clave]
+        if desconocidos:
+            return jsonify({'error': 'Departamentos desconocidos', 'departamentos': desconocidos,
+                            'disponibles': base.columnas}), 400
+        nombres = list(dict.fromkeys(por_clave[p.upper()] for p in pedidos))
+
+    # agrupar por modelo para evaluar cada ajuste una sola vez
+    grupos = {}
+    for nombre in nombres:
+        grupos.setdefault(modelo_para(nombre, modelo), []).append(nombre)
+
+    ajustes = {}
+    try:
+        for nombre_modelo in grupos:
+            ajustes[nombre_modelo] = base if nombre_modelo == modelo_para('NACIONAL', modelo) else fuente(nombre_modelo)
+    except ERRORES_DATOS:
+        _registrar_error()
+        return jsonify({'error': 'No se pudieron cargar los datos de esta serie.'}), 503
+
+    series = {}
+    for nombre_modelo, grupo in grupos.items():
+        ajuste = ajustes[nombre_modelo]
+        predicciones = ajuste.predecir(horizonte)
+        bandas = ajuste.bandas(horizonte)
+        periodos = ajuste.periodos_futuros(horizonte)
+        n_obs = ajuste.n_obs()
+        for nombre in grupo:
+            i = ajuste.columnas.index(nombre)
+            item = {
+                'departamento': nombre,
+                'modelo': nombre_modelo,
+                'observaciones': int(n_obs[i]),
+                'periodos': [f"{a}-{m:02d}" for a, m in periodos[i]],
+                'prediccion': [float(v) for v in predicciones[i]],
+            }
+            for clave, valores in bandas.items():
+                item[clave] = [float(v) for v in valores[i]]
+            series[nombre] = item
+
+    return jsonify({
+        'serie': serie,
+        'horizonte': horizonte,
+        'series': [series[n] for n in nombres],
+    })
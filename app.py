@@ -20,6 +20,13 @@ from inversion import inversion_bp
 from acopio import acopio_bp
 from precio import precio_bp
 from perfil import perfil_bp
+from api_pronosticos import api_pronosticos_bp
+import recarga_datos
+from recarga_datos import recarga_bp
+from monitor_sql import monitor_sql_bp
+from metricas import metricas_bp
+from exportar import exportar_bp
+import seed_db
 
 import pandas as pd
 import io, base64
@@ -96,7 +103,8 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
 })
 
 import logging
-logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+# El log de cada sentencia SQL (sqlalchemy.engine en INFO) lo reemplaza
+# `monitor_sql`: sólo sentencias lentas o muestreadas (SQL_LOG_COMPLETO=1 lo reactiva)
 import sys
 
 # En entornos como Render (cuentas gratuitas) no puedes acceder a archivos en disco
@@ -174,6 +182,22 @@ db.init_app(app)
 # Importar modelo después de inicializar db (evita import circular)
 with app.app_context():
     from models import User
+    import cache_usuarios
+    import busqueda_usuarios
+    import suscripciones
+    import monitor_sql
+    import tiempos
+    import metricas
+    import compresion
+
+# Tiempo de cada sentencia SQL y log de las lentas
+monitor_sql.instalar(app)
+# Server-Timing por etapas (TIEMPOS_ETAPAS=1 lo activa)
+tiempos.instalar(app)
+# Latencia por endpoint para /metrics
+metricas.instalar(app)
+# gzip/brotli de las respuestas de texto (el último: corre primero al responder)
+compresion.instalar(app)
 
 # Configurar Flask-Login
 login_manager = LoginManager(app)
@@ -181,7 +205,8 @@ login_manager.login_view = 'login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # caché con TTL: los /keepalive y páginas siguientes no consultan la BD
+    return cache_usuarios.obtener(int(user_id))
 
 # Página de inicio pública
 @app.route('/')
@@ -359,20 +384,14 @@ def session_timeout_handler():
 
     # Actualizar last_activity para cada request válida
     session['last_activity'] = now_ts
-    # Verificar expiración de suscripción y degradar rol si corresponde
+    # Suscripción vencida: degradar sólo en memoria (comparación barata); el
+    # UPDATE lo hace el barrido periódico de `suscripciones`
     try:
         if current_user.is_authenticated:
-            expires = getattr(current_user, 'subscription_expires', None)
-            if expires is not None:
-                # Si expiró, degradar a 'free'
-                try:
-                    if expires and expires < datetime.utcnow():
-                        current_user.role = 'free'
-                        current_user.subscription_expires = None
-                        db.session.commit()
-                        flash('Tu suscripción expiró y tu cuenta fue degradada a Free.', 'info')
-                except Exception:
-                    pass
+            expira = suscripciones.aplicar_vencimiento(current_user)
+            if expira is not None and session.get('aviso_suscripcion') != expira.isoformat():
+                session['aviso_suscripcion'] = expira.isoformat()
+                flash('Tu suscripción expiró y tu cuenta fue degradada a Free.', 'info')
     except Exception:
         pass
 
@@ -392,70 +411,11 @@ def index1():
 def index2():
     return render_template('index2.html')
 
-# Crear la base de datos si no existe
-with app.app_context():
-    # Crear tablas en la BD al arrancar, pero no fallar el arranque si la BD
-    # no está disponible (p. ej. durante despliegue). Se registra el error.
-    if os.environ.get('SKIP_CREATE_ALL') != '1':
-        try:
-            db.create_all()
-        except Exception as e:
-            # Registrar error y seguir adelante para que Gunicorn no muera
-            try:
-                import traceback
-                log_dir = os.path.join(Path(__file__).resolve().parent, 'instance')
-                os.makedirs(log_dir, exist_ok=True)
-                with open(os.path.join(log_dir, 'db_init_error.log'), 'a', encoding='utf-8') as f:
-                    f.write('\n--- DB INIT ERROR ---\n')
-                    f.write(traceback.format_exc())
-            except Exception:
-                pass
-            # También emitir a stdout/stderr para que Render lo capture
-            import sys
-            print('WARNING: db.create_all() falló, continuar arranque. Error:', file=sys.stderr)
-            import traceback
-            traceback.print_exc()
-        else:
-            # Seeder: cargar datos iniciales si las tablas están vacías
-            def seed_initial_data():
-                try:
-                    from models import Departamento, User
-                    # Cargar departamentos si la tabla está vacía
-                    if Departamento.query.first() is None:
-                        departamentos = [
-                            'Amazonas','Antioquia','Arauca','Atlántico','Bolívar','Boyacá','Caldas','Caquetá',
-                            'Casanare','Cauca','Cesar','Chocó','Córdoba','Cundinamarca','Guainía','Guaviare',
-                            'Huila','La Guajira','Magdalena','Meta','Nariño','Norte de Santander','Putumayo',
-                            'Quindío','Risaralda','San Andrés y Providencia','Santander','Sucre','Tolima',
-                            'Valle del Cauca','Vaupés','Vichada','Bogotá D.C.'
-                        ]
-                        for name in departamentos:
-                            d = Departamento(name=name)
-                            db.session.add(d)
-                        db.session.commit()
-
-                    # Crear un usuario admin por defecto si no existe ninguno
-                    if User.query.filter_by(is_admin=True).first() is None:
-                        admin_email = os.environ.get('DEFAULT_ADMIN_EMAIL', 'admin@example.com')
-                        admin_password = os.environ.get('DEFAULT_ADMIN_PASSWORD')
-                        if admin_password:
-                            admin = User(name='Administrador', email=admin_email, is_admin=True,
-                                         primer_nombre='Admin', primer_apellido='User')
-                            admin.set_password(admin_password)
-                            db.session.add(admin)
-                            db.session.commit()
-                except Exception:
-                    try:
-                        log_dir = os.path.join(Path(__file__).resolve().parent, 'instance')
-                        os.makedirs(log_dir, exist_ok=True)
-                        with open(os.path.join(log_dir, 'seed_error.log'), 'a', encoding='utf-8') as f:
-                            import traceback
-                            f.write('\n--- SEED ERROR ---\n')
-                            f.write(traceback.format_exc())
-                    except Exception:
-                        pass
-
-            seed_initial_data()
+# Esquema y datos iniciales: se hacen una vez por despliegue con
+# `python seed_db.py` (idempotente y con candado), no en cada worker.
+# SEMBRAR_AL_ARRANCAR=1 lo repite al importar, para hosts sin fase de release.
+if os.environ.get('SEMBRAR_AL_ARRANCAR') == '1' and os.environ.get('SKIP_CREATE_ALL') != '1':
+    seed_db.sembrar_app(app)
 
 # Política de tratamiento de datos
 @app.route("/politica-datos")
@@ -475,9 +435,32 @@ app.register_blueprint(acopio_bp)
 app.register_blueprint(precio_bp)
 app.register_blueprint(inversion_bp)
 app.register_blueprint(perfil_bp)
+app.register_blueprint(api_pronosticos_bp)
+app.register_blueprint(recarga_bp)
+app.register_blueprint(monitor_sql_bp)
+app.register_blueprint(metricas_bp)
+app.register_blueprint(exportar_bp)
+
+# 🔄 Hilos en segundo plano del servidor web. No se arrancan al importar:
+# los scripts que importan `app` (seed_db, migraciones, importaciones...)
+# no deben vigilar DataSheet ni escribir en la BD. Los llaman sólo los
+# puntos de entrada del servidor: `python app.py`, `gunicorn.conf.py` y
+# `pythonanywhere_wsgi.py`.
+def iniciar_hilos():
+    """Arranca los hilos del servidor (una vez por proceso)."""
+    # Vigilante de DataSheet (DATASHEET_RECARGA_SEGUNDOS=0 lo desactiva)
+    recarga_datos.iniciar()
+    # ⏳ Barrido de suscripciones vencidas (SUSCRIPCIONES_BARRIDO_SEGUNDOS=0 lo desactiva)
+    suscripciones.iniciar(app)
 
 # ✅ Ejecución de la app
 if __name__ == '__main__':
+    # servidor de desarrollo: preparar la BD local antes de arrancar
+    if os.environ.get('SKIP_CREATE_ALL') != '1' and os.environ.get('SEMBRAR_AL_ARRANCAR') != '1':
+        seed_db.sembrar_app(app)
+    # con el recargador de debug, sólo en el proceso que atiende peticiones
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_hilos()
     app.run(debug=True, port=5000)
 
 # =============================================================================
@@ -8,3 +8,6 @@ ALTER TABLE consultas ADD PRIMARY KEY (id);
 CREATE INDEX idx_consultas_user_id ON consultas(user_id);
 
 ALTER TABLE consultas ADD CONSTRAINT fk_consultas_user FOREIGN KEY (user_id) REFERENCES blog_user(id) ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- Índice compuesto para listar/recortar consultas por usuario en orden de creación
+CREATE INDEX ix_consultas_user_created ON consultas(user_id, created_at);
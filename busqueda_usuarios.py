@@ -0,0 +1,227 @@
+"""Búsqueda indexada de usuarios para `/admin/users`.
+
+Cada usuario tiene en `blog_user_tokens` un token por palabra de sus
+campos de texto (nombre, correo, documento, teléfono, dirección...),
+normalizado a minúsculas y sin tildes (`José` -> `jose`); teléfono y
+documento guardan además sus dígitos juntos (`300 123 4567` ->
+`3001234567`). La búsqueda parte el texto igual y exige que cada palabra
+sea prefijo de algún token del usuario: `jose gom` encuentra a "José
+Gómez". Cada palabra se resuelve con un rango sobre la PK
+(token, user_id), así que el costo depende de los tokens que coinciden y
+no del número de usuarios. Las palabras que son un rol (`free`, `pago1`,
+`pago2`, `admin`) filtran por rol.
+
+Los tokens se mantienen con eventos del ORM al insertar, modificar o
+borrar un `User`. Lo que se escriba sin ORM (p. ej. el admin que crea
+`seed_db`) se indexa con `reindexar()`, que `seed_db.py` ejecuta en cada
+despliegue para los usuarios sin tokens.
+
+`listado()` y `total_usuarios()` sirven la tabla paginada de
+`/admin/users`: sólo id, nombre, correo y rol, y un total cacheado
+`USUARIOS_TOTAL_TTL` segundos (60; en MySQL, la estimación de
+`information_schema`).
+
+  python busqueda_usuarios.py            # sólo usuarios sin tokens
+  python busqueda_usuarios.py --todo     # reconstruir todo el índice
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import event, select, delete, insert, exists, func, text
+from sqlalchemy import inspect as sa_inspect
+
+from models import User, UserSearchToken
+
+
+CAMPOS = ('name', 'email', 'tipo_documento', 'numero_documento', 'primer_nombre', 'segundo_nombre',
+          'primer_apellido', 'segundo_apellido', 'telefono', 'direccion')
+# además de sus palabras, se indexan todos sus dígitos juntos
+CAMPOS_DIGITOS = ('numero_documento', 'telefono')
+ROLES = ('free', 'pago1', 'pago2', 'admin')
+LARGO_TOKEN = 60
+LOTE_REINDEXAR = 1000
+# Segundos que se reutiliza el total de usuarios de la lista de administración
+TTL_TOTAL = float(os.environ.get('USUARIOS_TOTAL_TTL', '60'))
+# Columnas que muestra /admin/users (no se cargan hashes ni datos personales)
+COLUMNAS_LISTADO = ('id', 'name', 'email', 'role')
+
+_TOKENS = UserSearchToken.__table__
+_USUARIOS = User.__table__
+
+_LOCK = threading.Lock()
+# (instante de expiración, total, aproximado)
+_TOTAL = [0.0, None, False]
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes ni diacríticos."""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(ch for ch in texto if not unicodedata.combining(ch)).lower()
+
+
+def palabras(texto):
+    """Palabras alfanuméricas normalizadas de `texto`."""
+    if not texto:
+        return []
+    return [p[:LARGO_TOKEN] for p in re.findall(r'[a-z0-9]+', normalizar(texto))]
+
+
+def tokens_usuario(valores):
+    """Conjunto de tokens de un usuario (`valores`: objeto o dict con los CAMPOS)."""
+    leer = valores.get if isinstance(valores, dict) else lambda c: getattr(valores, c, None)
+    tokens = set()
+    for campo in CAMPOS:
+        valor = leer(campo)
+        tokens.update(palabras(valor))
+        if campo in CAMPOS_DIGITOS and valor:
+            digitos = re.sub(r'\D', '', str(valor))[:LARGO_TOKEN]
+            if digitos:
+                tokens.add(digitos)
+    return tokens
+
+
+def _escribir_tokens(connection, filas, borrar=True):
+    """Reemplaza los tokens de los usuarios en `filas` ({user_id: tokens})."""
+    if not filas:
+        return
+    if borrar:
+        connection.execute(delete(_TOKENS).where(_TOKENS.c.user_id.in_(list(filas))))
+    valores = [{'token': t, 'user_id': uid} for uid, tokens in filas.items() for t in tokens]
+    if valores:
+        connection.execute(insert(_TOKENS), valores)
+
+
+@event.listens_for(User, 'after_insert')
+def _usuario_creado(mapper, connection, usuario):
+    _escribir_tokens(connection, {usuario.id: tokens_usuario(usuario)}, borrar=False)
+
+
+@event.listens_for(User, 'after_update')
+def _usuario_actualizado(mapper, connection, usuario):
+    estado = sa_inspect(usuario)
+    if any(estado.attrs[c].history.has_changes() for c in CAMPOS):
+        _escribir_tokens(connection, {usuario.id: tokens_usuario(usuario)})
+
+
+@event.listens_for(User, 'before_delete')
+def _usuario_borrado(mapper, connection, usuario):
+    connection.execute(delete(_TOKENS).where(_TOKENS.c.user_id == usuario.id))
+
+
+def _rango(tabla, prefijo):
+    # token >= 'abc' AND token < 'abd': usa el índice en MySQL y SQLite
+    # (LIKE 'abc%' no lo usa en SQLite con la colación por defecto)
+    siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    return tabla.c.token >= prefijo, tabla.c.token < siguiente
+
+
+def interpretar(q):
+    """Separa `q` en (prefijos de texto, roles)."""
+    prefijos, roles = [], []
+    for p in dict.fromkeys(palabras(q)):
+        (roles if p in ROLES else prefijos).append(p)
+    return prefijos, roles
+
+
+def ids_pagina(q, despues=None, limite=50):
+    """Ids (ascendentes) de los usuarios que coinciden con `q`, después del id `despues`.
+
+    Devuelve None si `q` no tiene palabras buscables.
+    """
+    prefijos, roles = interpretar(q)
+    if not prefijos and not roles:
+        return None
+    if prefijos:
+        # el primer prefijo recorre el índice; los demás se exigen con IN
+        principal = _TOKENS.alias('t0')
+        columna = principal.c.user_id
+        consulta = select(columna).where(*_rango(principal, prefijos[0]))
+        for i, prefijo in enumerate(prefijos[1:], 1):
+            otro = _TOKENS.alias(f't{i}')
+            consulta = consulta.where(columna.in_(select(otro.c.user_id).where(*_rango(otro, prefijo))))
+        if roles:
+            consulta = consulta.join(_USUARIOS, _USUARIOS.c.id == columna).where(_USUARIOS.c.role.in_(roles))
+        consulta = consulta.distinct()
+    else:
+        columna = _USUARIOS.c.id
+        consulta = select(columna).where(_USUARIOS.c.role.in_(roles))
+    if despues is not None:
+        consulta = consulta.where(columna > despues)
+    return consulta.order_by(columna).limit(limite)
+
+
+def listado(ids=None, despues=None, limite=50):
+    """Consulta de las COLUMNAS_LISTADO por id ascendente: de `ids` o una página keyset."""
+    consulta = select(*[_USUARIOS.c[c] for c in COLUMNAS_LISTADO]).order_by(_USUARIOS.c.id)
+    if ids is not None:
+        return consulta.where(_USUARIOS.c.id.in_(ids))
+    if despues is not None:
+        consulta = consulta.where(_USUARIOS.c.id > despues)
+    return consulta.limit(limite)
+
+
+def total_usuarios(connection):
+    """(total, aproximado) de usuarios, reutilizado `TTL_TOTAL` segundos.
+
+    En MySQL se lee la estimación de `information_schema` (instantánea,
+    aproximada en InnoDB); en otros motores, `COUNT(*)`.
+    """
+    ahora = time.monotonic()
+    with _LOCK:
+        if _TOTAL[0] > ahora:
+            return _TOTAL[1], _TOTAL[2]
+    total, aproximado = None, False
+    if connection.dialect.name == 'mysql':
+        total = connection.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t"), {'t': _USUARIOS.name}).scalar()
+        aproximado = total is not None
+    if total is None:
+        total = connection.execute(select(func.count()).select_from(_USUARIOS)).scalar()
+    with _LOCK:
+        _TOTAL[:] = [ahora + TTL_TOTAL, total, aproximado]
+    return total, aproximado
+
+
+def reindexar(connection, todo=False, lote=LOTE_REINDEXAR):
+    """Calcula los tokens de los usuarios sin tokens (o de todos) por lotes. Devuelve cuántos."""
+    columnas = [_USUARIOS.c.id] + [_USUARIOS.c[c] for c in CAMPOS]
+    ultimo = 0
+    total = 0
+    while True:
+        consulta = select(*columnas).where(_USUARIOS.c.id > ultimo).order_by(_USUARIOS.c.id).limit(lote)
+        if not todo:
+            consulta = consulta.where(~exists().where(_TOKENS.c.user_id == _USUARIOS.c.id))
+        filas = connection.execute(consulta).mappings().all()
+        if not filas:
+            return total
+        _escribir_tokens(connection, {f['id']: tokens_usuario(f) for f in filas}, borrar=todo)
+        ultimo = filas[-1]['id']
+        total += len(filas)
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description='Reconstruir el índice de búsqueda de usuarios')
+    parser.add_argument('--todo', action='store_true', help='Recalcular todos los usuarios, no sólo los que no tienen tokens')
+    args = parser.parse_args()
+
+    os.environ['SEMBRAR_AL_ARRANCAR'] = '0'
+    from app import app
+    from database import db
+    try:
+        with app.app_context():
+            _TOKENS.create(bind=db.engine, checkfirst=True)
+            with db.engine.begin() as conn:
+                n = reindexar(conn, todo=args.todo)
+    except Exception as e:
+        print('ERROR reindexando usuarios:', e)
+        sys.exit(1)
+    print('Usuarios indexados:', n)
@@ -0,0 +1,137 @@
+"""Caché en proceso para datos y pronósticos derivados de `DataSheet/`.
+
+Cada entrada se guarda junto con la firma (fecha de modificación y
+tamaño) de los archivos de los que depende; mientras la firma no cambie
+se devuelve el valor almacenado y, si cambia, se reconstruye en la
+siguiente lectura. `memo_incremental` hace lo mismo con los datos que
+vienen de `ingesta`: si el CSV sólo creció, extiende el valor en lugar
+de reconstruirlo. La caché es por proceso (cada worker de gunicorn
+tiene la suya) y está protegida con un lock para los workers con hilos.
+
+Por clave se conservan las últimas `VERSIONES_RETENIDAS` versiones: así
+el vigilante de `recarga_datos` puede construir la versión nueva
+mientras las peticiones siguen leyendo la publicada. Los aciertos,
+fallos y extensiones se cuentan por grupo (los dos primeros elementos de
+la clave, p. ej. 'precio.nacional') para `/metrics`.
+"""
+
+import os
+import threading
+import time
+
+
+VERSIONES_RETENIDAS = 2
+
+_LOCK = threading.Lock()
+# clave -> lista [(firma, valor), ...], la más reciente primero
+_ENTRADAS = {}
+# grupo -> {'aciertos', 'fallos', 'extensiones', 'segundos_construccion'}
+_CONTADORES = {}
+
+
+def firma(*rutas):
+    """Tupla (ruta, mtime_ns, tamaño) de cada archivo; None si no existe."""
+    salida = []
+    for ruta in rutas:
+        try:
+            st = os.stat(ruta)
+            salida.append((ruta, st.st_mtime_ns, st.st_size))
+        except OSError:
+            salida.append((ruta, None, None))
+    return tuple(salida)
+
+
+def _contar(clave, tipo, segundos=0.0):
+    grupo = '.'.join(str(p) for p in clave[:2])
+    c = _CONTADORES.setdefault(grupo, {'aciertos': 0, 'fallos': 0, 'extensiones': 0,
+                                       'segundos_construccion': 0.0})
+    c[tipo] += 1
+    c['segundos_construccion'] += segundos
+
+
+def _buscar(clave, firma_actual):
+    with _LOCK:
+        for f, valor in _ENTRADAS.get(clave, ()):
+            if f == firma_actual:
+                _contar(clave, 'aciertos')
+                return True, valor
+    return False, None
+
+
+def _guardar(clave, firma_actual, valor, tipo='fallos', segundos=0.0):
+    with _LOCK:
+        _contar(clave, tipo, segundos)
+        versiones = [e for e in _ENTRADAS.get(clave, ()) if e[0] != firma_actual]
+        _ENTRADAS[clave] = [(firma_actual, valor)] + versiones[:VERSIONES_RETENIDAS - 1]
+
+
+def memo(clave, firma_actual, constructor):
+    """Devuelve el valor cacheado bajo `clave` o lo construye con `constructor()`.
+
+    Si ninguna versión almacenada tiene `firma_actual` el valor se
+    reconstruye. La construcción ocurre fuera del lock para no bloquear
+    otras claves; si dos hilos construyen a la vez gana el último.
+    """
+    encontrado, valor = _buscar(clave, firma_actual)
+    if encontrado:
+        return valor
+    t0 = time.perf_counter()
+    valor = constructor()
+    _guardar(clave, firma_actual, valor, segundos=time.perf_counter() - t0)
+    return valor
+
+
+def invalidar(prefijo=None):
+    """Elimina las entradas cuya clave (tupla) empieza por `prefijo` (todas si es None)."""
+    with _LOCK:
+        if prefijo is None:
+            _ENTRADAS.clear()
+            return
+        n = len(prefijo)
+        for clave in [k for k in _ENTRADAS if k[:n] == tuple(prefijo)]:
+            del _ENTRADAS[clave]
+
+
+def memo_incremental(clave, lectura, construir, extender):
+    """Como `memo`, pero extiende el valor cuando el dataset sólo creció.
+
+    `lectura` es una `ingesta.Lectura`. Si hay un valor construido con
+    la misma generación y menos filas, se llama a
+    `extender(valor, desde)` con el índice de la primera fila nueva; si
+    devuelve None (por ejemplo, filas fuera de orden) se reconstruye
+    todo con `construir()`.
+    """
+    actual = (lectura.generacion, len(lectura.df))
+    encontrado, valor = _buscar(clave, actual)
+    if encontrado:
+        return valor
+    with _LOCK:
+        previas = [e for e in _ENTRADAS.get(clave, ())
+                   if e[0][0] == lectura.generacion and e[0][1] < actual[1]]
+    t0 = time.perf_counter()
+    if previas:
+        (_, desde), previo = max(previas, key=lambda e: e[0][1])
+        valor = extender(previo, desde)
+        if valor is not None:
+            _guardar(clave, actual, valor, 'extensiones', time.perf_counter() - t0)
+            return valor
+    valor = construir()
+    _guardar(clave, actual, valor, segundos=time.perf_counter() - t0)
+    return valor
+
+
+def firma_anio(lectura, anio):
+    """Firma de los resúmenes/gráficos de `anio`: cambia al llegar filas de ese año."""
+    return (lectura.generacion, lectura.versiones_anio.get(int(anio), 0))
+
+
+def resumen():
+    """Claves cacheadas y número de versiones de cada una (para diagnóstico)."""
+    with _LOCK:
+        return {' / '.join(str(p) for p in clave): len(v) for clave, v in _ENTRADAS.items()}
+
+
+def contadores():
+    """Aciertos, fallos, extensiones y segundos de construcción por grupo de claves."""
+    with _LOCK:
+        return {grupo: dict(c) for grupo, c in _CONTADORES.items()}
@@ -0,0 +1,117 @@
+"""Caché en proceso de usuarios para `login_manager.user_loader`.
+
+Flask-Login carga el usuario en cada petición autenticada, incluidos los
+`/keepalive` que cada pestaña abierta envía una vez por minuto. Para no
+ir a la base de datos en cada uno, se guardan por id los valores de las
+columnas de `User` durante `TTL_USUARIOS` segundos (variable de entorno
+`USUARIOS_CACHE_TTL`, 300 por defecto; 0 desactiva la caché) con un
+máximo de `MAX_USUARIOS` entradas (`USUARIOS_CACHE_MAX`, 1000); al
+llenarse se descartan las más antiguas.
+
+En cada acierto se arma una instancia nueva y se incorpora a la sesión
+con `merge(load=False)`, sin consulta: el resto del código puede
+modificar `current_user` y hacer commit como siempre. Cualquier cambio
+de un `User` que pase por el ORM (edición de perfil, suscripción,
+acciones de administración en `perfil`) invalida su entrada al hacer
+flush y otra vez al confirmar la transacción; las actualizaciones
+masivas (`UPDATE` sin ORM) deben llamar a `invalidar()` explícitamente.
+La caché es por proceso: en otros workers un cambio se ve, como mucho,
+`TTL_USUARIOS` segundos después.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from database import db
+from models import User
+
+
+TTL_USUARIOS = float(os.environ.get('USUARIOS_CACHE_TTL', '300'))
+MAX_USUARIOS = int(os.environ.get('USUARIOS_CACHE_MAX', '1000'))
+
+_LOCK = threading.Lock()
+# id -> (instante de expiración, {columna: valor}), la más antigua primero
+_ENTRADAS = OrderedDict()
+_CONTADORES = {'aciertos': 0, 'fallos': 0, 'invalidaciones': 0}
+_COLUMNAS = [attr.key for attr in db.inspect(User).column_attrs]
+
+
+def _desde_cache(user_id):
+    ahora = time.monotonic()
+    with _LOCK:
+        entrada = _ENTRADAS.get(user_id)
+        if entrada is None or entrada[0] <= ahora:
+            _ENTRADAS.pop(user_id, None)
+            _CONTADORES['fallos'] += 1
+            return None
+        _CONTADORES['aciertos'] += 1
+        return entrada[1]
+
+
+def _guardar(user_id, valores):
+    with _LOCK:
+        _ENTRADAS.pop(user_id, None)
+        _ENTRADAS[user_id] = (time.monotonic() + TTL_USUARIOS, valores)
+        while len(_ENTRADAS) > MAX_USUARIOS:
+            _ENTRADAS.popitem(last=False)
+
+
+def obtener(user_id):
+    """Devuelve el `User` con `user_id` ligado a `db.session` (o None si no existe)."""
+    if TTL_USUARIOS <= 0:
+        return db.session.get(User, user_id)
+    valores = _desde_cache(user_id)
+    if valores is not None:
+        # copia desligada con los valores cacheados; merge(load=False) la
+        # incorpora a la sesión como si viniera de la base de datos
+        copia = User(**valores)
+        make_transient_to_detached(copia)
+        return db.session.merge(copia, load=False)
+    usuario = db.session.get(User, user_id)
+    if usuario is not None:
+        _guardar(user_id, {c: getattr(usuario, c) for c in _COLUMNAS})
+    return usuario
+
+
+def invalidar(user_id=None):
+    """Descarta la entrada de `user_id` (o todas si es None)."""
+    with _LOCK:
+        _CONTADORES['invalidaciones'] += 1
+        if user_id is None:
+            _ENTRADAS.clear()
+        else:
+            _ENTRADAS.pop(user_id, None)
+
+
+def resumen():
+    """Entradas y contadores de aciertos/fallos (para diagnóstico)."""
+    with _LOCK:
+        return dict(_CONTADORES, entradas=len(_ENTRADAS), ttl_segundos=TTL_USUARIOS,
+                    maximo=MAX_USUARIOS)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _usuario_modificado(mapper, connection, usuario):
+    invalidar(usuario.id)
+    sesion = object_session(usuario)
+    if sesion is not None:
+        sesion.info.setdefault('usuarios_modificados', set()).add(usuario.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _tras_commit(sesion):
+    # una petición concurrente pudo volver a cachear el valor previo entre
+    # el flush y el commit: se invalida de nuevo con los datos ya confirmados
+    for user_id in sesion.info.pop('usuarios_modificados', ()):
+        invalidar(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _tras_rollback(sesion):
+    sesion.info.pop('usuarios_modificados', None)
@@ -0,0 +1,160 @@
+"""Compresión gzip/brotli de las respuestas de texto.
+
+Páginas como `/inversion` envían la tabla del censo, scripts en línea y
+gráficos en base64; Render y PythonAnywhere no siempre las comprimen en
+el proxy. Este hook (`after_request`) comprime en la app las respuestas
+que cumplen todo lo siguiente:
+
+- tipo de texto (`text/*`, JSON, JavaScript, SVG, XML);
+- al menos `COMPRESION_MINIMO` bytes (variable de entorno, 1024): por
+  debajo el ahorro no compensa la cabecera ni el tiempo de CPU;
+- código 200 y sin `Content-Encoding` previo;
+- cuerpo en memoria: las respuestas en streaming (las exportaciones de
+  `exportar`) se dejan pasar tal cual. Los archivos de `/static` se leen
+  para comprimirlos si no superan `COMPRESION_MAXIMO` bytes (4 MB).
+
+La codificación se negocia con `Accept-Encoding` según la calidad (`q`)
+que pide el cliente: `br` si el paquete opcional `brotli` está instalado
+(`pip install brotli`), si no `gzip`. Toda respuesta comprimible lleva
+`Vary: Accept-Encoding` para que un proxy no sirva la versión comprimida
+a un cliente que no la acepta, y un `ETag` fuerte pasa a débil (el
+cuerpo enviado ya no es byte a byte el original).
+
+Los cuerpos comprimidos de las respuestas cacheables (sin `no-store`)
+se guardan en una caché LRU por hash del cuerpo y codificación, de
+hasta `COMPRESION_CACHE_BYTES` bytes comprimidos (4 MB; 0 la desactiva):
+la misma página o el mismo archivo estático se comprime una sola vez
+por worker. Los contadores se publican en `/metrics`.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MINIMO = int(os.environ.get('COMPRESION_MINIMO', '1024'))
+MAXIMO = int(os.environ.get('COMPRESION_MAXIMO', str(4 * 1024 * 1024)))
+NIVEL_GZIP = int(os.environ.get('COMPRESION_NIVEL_GZIP', '6'))
+# calidad 11 (la de brotli por defecto) es demasiado lenta para comprimir en cada petición
+CALIDAD_BROTLI = int(os.environ.get('COMPRESION_CALIDAD_BROTLI', '5'))
+CACHE_BYTES = int(os.environ.get('COMPRESION_CACHE_BYTES', str(4 * 1024 * 1024)))
+
+TIPOS = ('application/json', 'application/javascript', 'application/xml',
+         'image/svg+xml', 'application/manifest+json')
+
+_LOCK = threading.Lock()
+# (hash del cuerpo, codificación) -> cuerpo comprimido, el menos usado primero
+_CACHE = OrderedDict()
+_CACHE_TAMANO = [0]
+_CONTADORES = {'comprimidas': 0, 'cache_aciertos': 0, 'bytes_originales': 0, 'bytes_enviados': 0}
+
+
+def comprimible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in TIPOS)
+
+
+def codificacion_aceptada(aceptadas):
+    """'br', 'gzip' o None según un `Accept-Encoding` ya interpretado (werkzeug)."""
+    q_br = aceptadas.quality('br') if brotli is not None else 0
+    q_gzip = aceptadas.quality('gzip')
+    if q_br > 0 and q_br >= q_gzip:
+        return 'br'
+    if q_gzip > 0:
+        return 'gzip'
+    return None
+
+
+def comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=CALIDAD_BROTLI)
+    # mtime=0: la misma entrada da siempre los mismos bytes
+    return gzip.compress(datos, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def _comprimir_con_cache(datos, codificacion):
+    clave = (hashlib.blake2b(datos, digest_size=16).digest(), codificacion)
+    with _LOCK:
+        comprimido = _CACHE.get(clave)
+        if comprimido is not None:
+            _CACHE.move_to_end(clave)
+            _CONTADORES['cache_aciertos'] += 1
+            return comprimido
+    comprimido = comprimir(datos, codificacion)
+    # una sola entrada no puede ocupar más de un cuarto de la caché
+    if len(comprimido) * 4 > CACHE_BYTES:
+        return comprimido
+    with _LOCK:
+        if clave not in _CACHE:
+            _CACHE[clave] = comprimido
+            _CACHE_TAMANO[0] += len(comprimido)
+            while _CACHE_TAMANO[0] > CACHE_BYTES:
+                _, viejo = _CACHE.popitem(last=False)
+                _CACHE_TAMANO[0] -= len(viejo)
+    return comprimido
+
+
+def _comprimir_respuesta(respuesta):
+    if not comprimible(respuesta.mimetype):
+        return respuesta
+    respuesta.vary.add('Accept-Encoding')
+    if (respuesta.status_code != 200 or request.method == 'HEAD'
+            or 'Content-Encoding' in respuesta.headers):
+        return respuesta
+    codificacion = codificacion_aceptada(request.accept_encodings)
+    if codificacion is None:
+        return respuesta
+    if respuesta.direct_passthrough:
+        # send_file (p. ej. /static): se lee el archivo si su tamaño es conocido y acotado
+        largo = respuesta.content_length
+        if largo is None or largo < MINIMO or largo > MAXIMO:
+            return respuesta
+        respuesta.direct_passthrough = False
+    elif respuesta.is_streamed:
+        return respuesta
+    datos = respuesta.get_data()
+    if len(datos) < MINIMO:
+        return respuesta
+
+    if CACHE_BYTES > 0 and not respuesta.cache_control.no_store:
+        comprimido = _comprimir_con_cache(datos, codificacion)
+    else:
+        comprimido = comprimir(datos, codificacion)
+    if len(comprimido) >= len(datos):
+        return respuesta
+
+    respuesta.set_data(comprimido)
+    respuesta.headers['Content-Encoding'] = codificacion
+    # los rangos se calcularon sobre el cuerpo sin comprimir
+    respuesta.headers.pop('Accept-Ranges', None)
+    etag, debil = respuesta.get_etag()
+    if etag and not debil:
+        respuesta.set_etag(etag, weak=True)
+    with _LOCK:
+        _CONTADORES['comprimidas'] += 1
+        _CONTADORES['bytes_originales'] += len(datos)
+        _CONTADORES['bytes_enviados'] += len(comprimido)
+    return respuesta
+
+
+def contadores():
+    """Respuestas comprimidas, aciertos de la caché, bytes y estado de la caché."""
+    with _LOCK:
+        return dict(_CONTADORES, cache_entradas=len(_CACHE), cache_bytes=_CACHE_TAMANO[0])
+
+
+def instalar(app):
+    """Registra el hook de compresión.
+
+    Flask ejecuta los `after_request` en orden inverso al de registro:
+    instalado al final, comprime antes de que `metricas` mida la petición.
+    """
+    app.after_request(_comprimir_respuesta)
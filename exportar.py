@@ -0,0 +1,169 @@
+"""Exportación en streaming de consultas guardadas (CSV o JSON).
+
+- `/mis-consultas/exportar.<csv|json>`: las consultas del usuario actual
+  (mismos planes que pueden ver Mis Consultas).
+- `/admin/consultas/exportar.<csv|json>`: todas las consultas, con el
+  correo del usuario (sólo administradores).
+
+Cada consulta sale con su payload (`query`), su resumen de producción
+(`summary`, el más reciente) y sus precios por departamento. Las
+consultas se leen con un cursor del lado del servidor (`stream_results`)
+en lotes de `LOTE_EXPORTAR` filas (variable `EXPORTAR_LOTE`, 1000); por
+cada lote se traen query, resumen y precios con un `IN` por tabla en una
+segunda conexión (MySQL no admite otra consulta en la conexión del
+cursor abierto). La respuesta es un generador: la memoria depende del
+lote, no del número de consultas.
+"""
+
+import csv
+import io
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+
+from flask import Blueprint, Response, stream_with_context, flash, redirect, url_for
+from flask_login import login_required, current_user
+from sqlalchemy import select
+
+from database import db
+from models import Consulta, ConsultaQuery, ConsultaSummary, ConsultaPrecio, User
+
+
+LOTE_EXPORTAR = int(os.environ.get('EXPORTAR_LOTE', '1000'))
+# Bytes aproximados de cada trozo de la respuesta (menos trozos, menos costo por trozo en el servidor WSGI)
+TAMANO_TROZO = 64 * 1024
+COLUMNAS_CSV = ('consulta_id', 'user_id', 'email', 'titulo', 'descripcion', 'creada', 'raza',
+                'num_vacas', 'litros_por_vaca', 'query', 'summary', 'precios')
+
+exportar_bp = Blueprint('exportar', __name__)
+
+
+def _json_o_texto(texto):
+    if not texto:
+        return None
+    try:
+        return json.loads(texto)
+    except Exception:
+        return texto
+
+
+def consultas_exportables(user_id=None, lote=LOTE_EXPORTAR, decodificar=True):
+    """Genera un dict por consulta (de `user_id`, o de todos si es None), por id ascendente.
+
+    Con `decodificar=False`, `query` y `summary` quedan como el texto JSON
+    guardado (el CSV los escribe tal cual, sin decodificar y recodificar).
+    """
+    leer = _json_o_texto if decodificar else (lambda texto: texto or None)
+    c = Consulta.__table__
+    consulta = select(c.c.id, c.c.user_id, User.__table__.c.email, c.c.titulo, c.c.descripcion,
+                      c.c.created_at, c.c.raza, c.c.num_vacas, c.c.litros_por_vaca,
+                      c.c.query_text, c.c.summary) \
+        .join(User.__table__, User.__table__.c.id == c.c.user_id) \
+        .order_by(c.c.id)
+    if user_id is not None:
+        consulta = consulta.where(c.c.user_id == user_id)
+
+    with db.engine.connect() as conn_cursor, db.engine.connect() as conn:
+        resultado = conn_cursor.execution_options(stream_results=True, yield_per=lote).execute(consulta)
+        for filas in resultado.partitions():
+            ids = [f.id for f in filas]
+            # ordenadas por id: la última fila de cada consulta es la vigente
+            queries = dict(conn.execute(
+                select(ConsultaQuery.consulta_id, ConsultaQuery.query_text)
+                .where(ConsultaQuery.consulta_id.in_(ids)).order_by(ConsultaQuery.id)).all())
+            resumenes = dict(conn.execute(
+                select(ConsultaSummary.consulta_id, ConsultaSummary.summary)
+                .where(ConsultaSummary.consulta_id.in_(ids)).order_by(ConsultaSummary.id)).all())
+            precios = defaultdict(list)
+            for cid, departamento, precio in conn.execute(
+                    select(ConsultaPrecio.consulta_id, ConsultaPrecio.departamento, ConsultaPrecio.precio)
+                    .where(ConsultaPrecio.consulta_id.in_(ids)).order_by(ConsultaPrecio.id)):
+                precios[cid].append({'departamento': departamento, 'precio': precio})
+            for f in filas:
+                yield {
+                    'consulta_id': f.id,
+                    'user_id': f.user_id,
+                    'email': f.email,
+                    'titulo': f.titulo,
+                    'descripcion': f.descripcion,
+                    'creada': f.created_at.isoformat() if f.created_at else None,
+                    'raza': f.raza,
+                    'num_vacas': f.num_vacas,
+                    'litros_por_vaca': f.litros_por_vaca,
+                    'query': leer(queries.get(f.id) or f.query_text),
+                    'summary': leer(resumenes.get(f.id) or f.summary),
+                    'precios': precios.get(f.id, []),
+                }
+
+
+def generar_csv(registros, columnas=COLUMNAS_CSV):
+    """Texto CSV en trozos de ~TAMANO_TROZO; query/summary/precios como JSON."""
+    buffer = io.StringIO()
+    # BOM para que Excel detecte UTF-8
+    buffer.write('\ufeff')
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for registro in registros:
+        escritor.writerow([
+            json.dumps(registro[col], ensure_ascii=False) if isinstance(registro[col], (dict, list)) else registro[col]
+            for col in columnas
+        ])
+        if buffer.tell() >= TAMANO_TROZO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generar_json(registros):
+    """Un arreglo JSON emitido en trozos de ~TAMANO_TROZO."""
+    partes = ['[']
+    tamano = 1
+    separador = '\n'
+    for registro in registros:
+        texto = separador + json.dumps(registro, ensure_ascii=False)
+        partes.append(texto)
+        tamano += len(texto)
+        separador = ',\n'
+        if tamano >= TAMANO_TROZO:
+            yield ''.join(partes)
+            partes, tamano = [], 0
+    partes.append('\n]\n')
+    yield ''.join(partes)
+
+
+def _respuesta(user_id, formato, nombre, columnas=COLUMNAS_CSV):
+    fecha = datetime.utcnow().strftime('%Y%m%d')
+    if formato == 'csv':
+        registros = consultas_exportables(user_id, decodificar=False)
+        cuerpo, mimetype = generar_csv(registros, columnas), 'text/csv'
+    else:
+        cuerpo, mimetype = generar_json(consultas_exportables(user_id)), 'application/json'
+    respuesta = Response(stream_with_context(cuerpo), mimetype=mimetype)
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre}_{fecha}.{formato}"'
+    # que un proxy (nginx) no acumule la respuesta completa
+    respuesta.headers['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+
+@exportar_bp.route('/mis-consultas/exportar.<any(csv, json):formato>')
+@login_required
+def exportar_mis_consultas(formato):
+    """Descarga las consultas guardadas del usuario actual."""
+    user_role = getattr(current_user, 'role', None)
+    if not (current_user.email == 'admin@example.com' or getattr(current_user, 'is_admin', False) or user_role in ('pago1', 'pago2')):
+        flash('Tu plan no permite acceder a Mis Consultas. Actualiza tu suscripción.', 'danger')
+        return redirect(url_for('perfil.perfil'))
+    columnas = tuple(c for c in COLUMNAS_CSV if c not in ('user_id', 'email'))
+    return _respuesta(current_user.id, formato, 'mis_consultas', columnas)
+
+
+@exportar_bp.route('/admin/consultas/exportar.<any(csv, json):formato>')
+@login_required
+def exportar_consultas_admin(formato):
+    """Descarga todas las consultas de todos los usuarios (solo administrador)."""
+    if not (current_user.email == 'admin@example.com' or getattr(current_user, 'is_admin', False)):
+        flash('No tienes permiso para acceder a la administración.', 'danger')
+        return redirect(url_for('perfil.perfil'))
+    return _respuesta(None, formato, 'consultas')
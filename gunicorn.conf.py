@@ -0,0 +1,7 @@
+"""Configuración de gunicorn (la lee `gunicorn -c gunicorn.conf.py`, ver Procfile)."""
+
+
+def post_worker_init(worker):
+    # cada worker arranca sus hilos en segundo plano ya con la app importada
+    from app import iniciar_hilos
+    iniciar_hilos()
@@ -0,0 +1,312 @@
+"""Importación masiva de consultas desde JSON-lines.
+
+Cada línea es un payload de Inversión (el mismo JSON que envía el
+formulario a `/mis-consultas/guardar`) o un objeto
+`{"titulo": ..., "descripcion": ..., "query": <payload>, "email": ...}`.
+Se valida con las mismas reglas que `guardar_consulta` (`leer_payload` y
+`campos_consulta` las comparten), los resúmenes de producción de cada
+lote se calculan juntos con `razas.estimar_produccion_lote` (la misma
+función que usa `guardar_consulta`) y cada lote de `LOTE_IMPORTAR`
+líneas (variable `IMPORTAR_LOTE`, 1000) se guarda en una transacción:
+un INSERT por tabla (también en MySQL, ver `_insertar_consultas`) y los
+borrados de la política FIFO.
+La política FIFO se respeta: un usuario nunca queda con más de `maximo`
+consultas y, si un lote trae más que eso para un usuario, sólo se
+insertan las `maximo` últimas.
+
+Desde `/mis-consultas/importar` (POST, cuerpo JSON-lines o archivo
+`archivo`) se importan al usuario actual. Por consola:
+
+  python importar_consultas.py consultas.jsonl --email usuario@correo.com
+  python importar_consultas.py consultas.jsonl      # cada línea trae "email"
+"""
+
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+from database import db
+from models import Consulta, ConsultaQuery, ConsultaSummary, ConsultaPrecio, User
+from razas import estimar_produccion_lote
+
+
+LOTE_IMPORTAR = int(os.environ.get('IMPORTAR_LOTE', '1000'))
+# Errores por línea que se devuelven en el resumen (el resto sólo se cuenta)
+MAX_ERRORES_REPORTADOS = 50
+
+
+class ConsultaInvalida(ValueError):
+    """La línea o el payload no cumplen las reglas de `guardar_consulta`."""
+
+
+def leer_payload(query_raw):
+    """Payload (dict) a partir del texto JSON enviado; ConsultaInvalida si no es válido."""
+    if isinstance(query_raw, dict):
+        return query_raw
+    query_raw = (query_raw or '').strip() if isinstance(query_raw, str) else ''
+    if not query_raw:
+        raise ConsultaInvalida('No se recibieron datos para guardar la consulta.')
+    try:
+        payload = json.loads(query_raw)
+    except Exception:
+        raise ConsultaInvalida('Formato de datos inválido. Asegúrate de enviar JSON válido.')
+    if not isinstance(payload, dict):
+        raise ConsultaInvalida('Formato de datos inválido. Asegúrate de enviar JSON válido.')
+    return payload
+
+
+def campos_consulta(payload, titulo='', descripcion=''):
+    """Columnas de `Consulta` y filas de precios que `guardar_consulta` deriva del payload.
+
+    Devuelve (campos, precios): `campos` con titulo, descripcion, raza,
+    num_vacas y litros_por_vaca; `precios` como lista de
+    {'departamento', 'precio'} (sin `consulta_id`).
+    """
+    # autogenerar título si falta
+    if not titulo:
+        raza = payload.get('raza') or 'SinRaza'
+        nv = payload.get('num_vacas') or payload.get('numVacas') or ''
+        titulo = f"Consulta inversión - {raza} - {nv}"
+
+    # Extraer campos atómicos desde el payload para normalizar
+    raza_val = None
+    nv_val = None
+    litros_vaca = None
+    try:
+        raza_val = payload.get('raza') or payload.get('Raza') or None
+        nv_val = payload.get('num_vacas') or payload.get('numVacas') or None
+        if nv_val is not None:
+            try:
+                nv_val = int(nv_val)
+            except Exception:
+                nv_val = None
+        # intentar extraer litros_por_vaca si viene en payload
+        litros_vaca = payload.get('litros_por_vaca') or payload.get('litrosPorVaca') or None
+        if litros_vaca is not None:
+            try:
+                litros_vaca = float(litros_vaca)
+            except Exception:
+                litros_vaca = None
+    except Exception:
+        raza_val = nv_val = litros_vaca = None
+
+    precios = payload.get('precios_departamentos') or payload.get('precios') or []
+    filas_precios = []
+    if isinstance(precios, list):
+        for p in precios:
+            if not isinstance(p, dict):
+                continue
+            precio_val = None
+            try:
+                precio_val = float(p.get('precio')) if p.get('precio') is not None else None
+            except Exception:
+                precio_val = None
+            filas_precios.append({'departamento': p.get('departamento') or '', 'precio': precio_val})
+
+    campos = {
+        'titulo': titulo,
+        'descripcion': descripcion,
+        'raza': raza_val,
+        'num_vacas': nv_val,
+        'litros_por_vaca': litros_vaca,
+    }
+    return campos, filas_precios
+
+
+def _interpretar_linea(linea, usuario_fijo, usuarios):
+    try:
+        objeto = json.loads(linea)
+    except Exception:
+        raise ConsultaInvalida('Formato de datos inválido. Asegúrate de enviar JSON válido.')
+    if not isinstance(objeto, dict):
+        raise ConsultaInvalida('Formato de datos inválido. Asegúrate de enviar JSON válido.')
+    if 'query' in objeto:
+        payload = leer_payload(objeto.get('query'))
+        titulo = str(objeto.get('titulo') or '').strip()
+        descripcion = str(objeto.get('descripcion') or '').strip()
+    else:
+        payload, titulo, descripcion = objeto, '', ''
+
+    user_id = usuario_fijo
+    if user_id is None:
+        email = str(objeto.get('email') or '').strip()
+        if not email:
+            raise ConsultaInvalida('Falta el campo "email" del usuario.')
+        if email not in usuarios:
+            usuarios[email] = db.session.execute(db.select(User.id).where(User.email == email)).scalar()
+        user_id = usuarios[email]
+        if user_id is None:
+            raise ConsultaInvalida(f'No existe el usuario {email}.')
+
+    campos, precios = campos_consulta(payload, titulo, descripcion)
+    return {'user_id': user_id, 'payload': payload, 'campos': campos, 'precios': precios}
+
+
+class _IdsNoContiguos(Exception):
+    """Otra transacción intercaló ids en el INSERT multi-fila; el lote se repite fila a fila."""
+
+
+def _insertar_consultas(filas, multifila):
+    """Inserta las filas de `consultas` del lote y devuelve sus ids, en el mismo orden.
+
+    - PostgreSQL y MariaDB: INSERT multi-fila con RETURNING ordenado.
+    - MySQL y SQLite: un solo INSERT multi-fila (el flush del ORM haría uno
+      por fila para leer `lastrowid`, y SQLite no garantiza el orden de
+      RETURNING en lote). `lastrowid` es el id de la primera fila en MySQL
+      y el de la última en SQLite; los ids del rango se leen con un SELECT.
+      SQLite serializa las escrituras, así que el rango es siempre el del
+      lote. En MySQL otra transacción puede intercalar ids
+      (`innodb_autoinc_lock_mode=2`): sus filas no son visibles aquí
+      (REPEATABLE READ, el nivel por defecto de InnoDB), el rango no
+      coincide y se lanza `_IdsNoContiguos` para repetir el lote con
+      `multifila=False`.
+    - Otros motores, o `multifila=False`: fila a fila con el ORM.
+    """
+    tabla = Consulta.__table__
+    dialecto = db.session.get_bind().dialect
+    if multifila and dialecto.insert_executemany_returning and dialecto.name != 'sqlite':
+        return list(db.session.execute(
+            db.insert(tabla).returning(tabla.c.id, sort_by_parameter_order=True), filas).scalars())
+    if multifila and dialecto.name in ('mysql', 'sqlite'):
+        ultimo = db.session.execute(db.insert(tabla).values(filas)).lastrowid
+        primero = ultimo if dialecto.name == 'mysql' else ultimo - len(filas) + 1
+        insertadas = db.session.execute(
+            db.select(tabla.c.id, tabla.c.user_id, tabla.c.titulo)
+            .where(tabla.c.id.between(primero, primero + len(filas) - 1))
+            .order_by(tabla.c.id)
+        ).all()
+        if [(u, t) for _, u, t in insertadas] != [(f['user_id'], f['titulo']) for f in filas]:
+            raise _IdsNoContiguos()
+        return [i for i, _, _ in insertadas]
+    consultas = [Consulta(**f) for f in filas]
+    db.session.add_all(consultas)
+    db.session.flush()
+    return [c.id for c in consultas]
+
+
+def _escribir_lote(conservar, resumenes, por_usuario, maximo, multifila):
+    """Borrados FIFO e INSERTs del lote en la transacción actual. Devuelve cuántas se eliminaron."""
+    # FIFO contra lo ya guardado: dejar lugar para las nuevas de cada
+    # usuario (una consulta y un DELETE por tabla para todo el lote)
+    sobrantes = Consulta.surplus_ids_many(
+        {user_id: maximo - min(len(filas), maximo) for user_id, filas in por_usuario.items()})
+    Consulta.delete_many(sobrantes)
+
+    ids = _insertar_consultas([dict(r['campos'], user_id=r['user_id']) for r in conservar], multifila)
+
+    filas_queries, filas_resumenes, filas_precios = [], [], []
+    for consulta_id, r, prod_info in zip(ids, conservar, resumenes):
+        filas_queries.append({'consulta_id': consulta_id, 'query_text': json.dumps(r['payload'], ensure_ascii=False)})
+        if prod_info is not None:
+            filas_resumenes.append({'consulta_id': consulta_id, 'summary': json.dumps(prod_info, ensure_ascii=False)})
+        filas_precios.extend(dict(p, consulta_id=consulta_id) for p in r['precios'])
+    db.session.execute(db.insert(ConsultaQuery), filas_queries)
+    if filas_resumenes:
+        db.session.execute(db.insert(ConsultaSummary), filas_resumenes)
+    if filas_precios:
+        db.session.execute(db.insert(ConsultaPrecio), filas_precios)
+    return len(sobrantes)
+
+
+def _guardar_lote(registros, maximo, resumen):
+    # FIFO dentro del lote: de cada usuario sólo sobreviven sus `maximo` últimas
+    por_usuario = defaultdict(list)
+    for r in registros:
+        por_usuario[r['user_id']].append(r)
+    conservar = []
+    for filas in por_usuario.values():
+        if len(filas) > maximo:
+            resumen['omitidas_fifo'] += len(filas) - maximo
+            filas = filas[-maximo:]
+        conservar.extend(filas)
+    resumenes = estimar_produccion_lote([r['payload'] for r in conservar])
+
+    try:
+        try:
+            eliminadas = _escribir_lote(conservar, resumenes, por_usuario, maximo, multifila=True)
+        except _IdsNoContiguos:
+            db.session.rollback()
+            eliminadas = _escribir_lote(conservar, resumenes, por_usuario, maximo, multifila=False)
+        db.session.commit()
+        resumen['eliminadas_fifo'] += eliminadas
+        resumen['importadas'] += len(conservar)
+    except Exception:
+        db.session.rollback()
+        resumen['lotes_fallidos'] += 1
+        try:
+            import traceback
+            log_dir = os.path.join(os.path.dirname(__file__), 'instance')
+            os.makedirs(log_dir, exist_ok=True)
+            with open(os.path.join(log_dir, 'importar_consultas_error.log'), 'a', encoding='utf-8') as f:
+                f.write(f"--- {datetime.utcnow().isoformat()} ---\n")
+                f.write(traceback.format_exc())
+        except Exception:
+            pass
+
+
+def importar(lineas, maximo, usuario_fijo=None, lote=LOTE_IMPORTAR):
+    """Importa un iterable de líneas JSON (str o bytes). Devuelve un resumen (dict).
+
+    Con `usuario_fijo` todas las consultas son de ese usuario; si no, cada
+    línea debe traer el `email` de su dueño. Las líneas inválidas se
+    cuentan y se informan (las primeras MAX_ERRORES_REPORTADOS) sin
+    detener la importación.
+    """
+    resumen = {'leidas': 0, 'importadas': 0, 'invalidas': 0, 'omitidas_fifo': 0,
+               'eliminadas_fifo': 0, 'lotes_fallidos': 0, 'errores': []}
+    usuarios = {}
+    pendientes = []
+    for numero, linea in enumerate(lineas, 1):
+        if isinstance(linea, bytes):
+            linea = linea.decode('utf-8', errors='replace')
+        linea = linea.strip().lstrip('\ufeff')
+        if not linea:
+            continue
+        resumen['leidas'] += 1
+        try:
+            pendientes.append(_interpretar_linea(linea, usuario_fijo, usuarios))
+        except ConsultaInvalida as e:
+            resumen['invalidas'] += 1
+            if len(resumen['errores']) < MAX_ERRORES_REPORTADOS:
+                resumen['errores'].append({'linea': numero, 'error': str(e)})
+            continue
+        if len(pendientes) >= lote:
+            _guardar_lote(pendientes, maximo, resumen)
+            pendientes = []
+    if pendientes:
+        _guardar_lote(pendientes, maximo, resumen)
+    return resumen
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Importar consultas desde un archivo JSON-lines')
+    parser.add_argument('archivo', help='Archivo .jsonl (una consulta por línea); "-" para leer de stdin')
+    parser.add_argument('--email', help='Usuario dueño de todas las consultas (si no, cada línea trae "email")')
+    parser.add_argument('--lote', type=int, default=LOTE_IMPORTAR, help='Líneas por transacción')
+    args = parser.parse_args()
+
+    os.environ['SEMBRAR_AL_ARRANCAR'] = '0'
+    from app import app
+    from perfil import MAX_CONSULTAS_USUARIO
+
+    with app.app_context():
+        usuario_fijo = None
+        if args.email:
+            usuario = User.get_by_email(args.email)
+            if usuario is None:
+                print('ERROR: no existe el usuario', args.email)
+                sys.exit(1)
+            usuario_fijo = usuario.id
+        t0 = time.perf_counter()
+        entrada = sys.stdin if args.archivo == '-' else open(args.archivo, encoding='utf-8')
+        with entrada:
+            resultado = importar(entrada, MAX_CONSULTAS_USUARIO, usuario_fijo, args.lote)
+    for error in resultado.pop('errores'):
+        print(f"  línea {error['linea']}: {error['error']}")
+    print(json.dumps(resultado, ensure_ascii=False), f'({time.perf_counter() - t0:.2f}s)')
+    sys.exit(1 if resultado['lotes_fallidos'] else 0)
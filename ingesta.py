@@ -0,0 +1,229 @@
+"""Lectura incremental de los CSV de `DataSheet/`.
+
+Los CSV de precios y acopio crecen agregando meses al final. En lugar de
+volver a parsear todo el histórico cuando el archivo cambia, `leer()`
+recuerda hasta qué byte se leyó y, si el archivo sólo creció (la
+cabecera y los bytes ya leídos siguen iguales), parsea únicamente las
+líneas nuevas, las limpia con la misma función que la carga completa y
+las agrega al DataFrame cacheado. Cualquier otro cambio (archivo
+reemplazado, editado o más corto) provoca una relectura completa.
+
+Cada lectura devuelve una `Lectura` con:
+
+- `generacion`: cambia en cada relectura completa; mientras no cambie,
+  las filas nuevas están siempre al final (`df.iloc[filas_previas:]`).
+- `versiones_anio`: contador por año que aumenta cuando llegan filas de
+  ese año; sirve como firma de los resúmenes y gráficos por año.
+
+El estado es por proceso y está protegido con un lock. Cuando el
+vigilante de `recarga_datos` está activo en el proceso, las peticiones
+reciben la última `Lectura` publicada sin consultar el disco; el
+vigilante lee los cambios dentro de `preparando()`, reconstruye lo que
+depende de ellos y recién entonces llama a `publicar()`.
+"""
+
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+# Bytes finales ya leídos que se comparan para confirmar que el archivo sólo creció
+BYTES_VERIFICACION = 4096
+
+Lectura = namedtuple('Lectura', ['df', 'generacion', 'versiones_anio', 'ruta'])
+
+_LOCK = threading.Lock()
+_ESTADOS = {}
+_GENERACION = [0]
+# Lecturas que ven las peticiones mientras el vigilante está activo
+_PUBLICADAS = {}
+# pid del proceso donde corre el vigilante (None = sin vigilante)
+_VIGILANTE = {'pid': None}
+_LOCAL = threading.local()
+# clave -> lecturas por tipo y duración de la última completa/incremental (para /metrics)
+_LECTURAS = {}
+
+
+def _leer_bytes(ruta, inicio=0, fin=None):
+    with open(ruta, 'rb') as f:
+        f.seek(inicio)
+        return f.read() if fin is None else f.read(fin - inicio)
+
+
+def _cabecera(datos):
+    fin = datos.find(b'\n')
+    return datos if fin < 0 else datos[:fin + 1]
+
+
+def _siguiente_generacion():
+    _GENERACION[0] += 1
+    return _GENERACION[0]
+
+
+def _versiones(df, columna_anio, previas=None):
+    versiones = dict(previas or {})
+    if columna_anio in df.columns:
+        for anio in pd.unique(df[columna_anio].dropna()):
+            versiones[int(anio)] = versiones.get(int(anio), 0) + 1
+    return versiones
+
+
+def _contar(clave, tipo, segundos=None):
+    # se llama con _LOCK tomado
+    c = _LECTURAS.setdefault(clave, {'publicadas': 0, 'sin_cambios': 0, 'incrementales': 0,
+                                     'completas': 0, 'segundos_incremental': None,
+                                     'segundos_completa': None})
+    c[tipo] += 1
+    if segundos is not None:
+        c['segundos_incremental' if tipo == 'incrementales' else 'segundos_completa'] = segundos
+
+
+def lecturas():
+    """Lecturas por tipo y duración de la última, por cargador (para métricas)."""
+    with _LOCK:
+        return {clave: dict(c) for clave, c in _LECTURAS.items()}
+
+
+def activar_vigilancia():
+    """Marca que el proceso actual tiene un vigilante que publica las lecturas."""
+    _VIGILANTE['pid'] = os.getpid()
+
+
+def _vigilado():
+    # tras un fork (gunicorn --preload) el hijo no hereda el hilo vigilante
+    return _VIGILANTE['pid'] == os.getpid()
+
+
+@contextmanager
+def preparando():
+    """Dentro del bloque, `leer()` revisa el disco aunque haya lecturas publicadas
+    y no publica lo que lee (lo hace `publicar()` al terminar)."""
+    _LOCAL.preparando = True
+    try:
+        yield
+    finally:
+        _LOCAL.preparando = False
+
+
+def publicar():
+    """Hace visibles para las peticiones las últimas lecturas preparadas (cambio atómico)."""
+    global _PUBLICADAS
+    with _LOCK:
+        _PUBLICADAS = {clave: estado['lectura'] for clave, estado in _ESTADOS.items()}
+
+
+def estado():
+    """Versión (generación, filas) leída y publicada de cada CSV, para diagnóstico."""
+    with _LOCK:
+        salida = {}
+        for clave, e in _ESTADOS.items():
+            publicada = _PUBLICADAS.get(clave)
+            salida[clave] = {
+                'ruta': e['ruta'],
+                'mtime_ns': e['firma'][0],
+                'bytes': e['firma'][1],
+                'generacion': e['lectura'].generacion,
+                'filas': len(e['lectura'].df),
+                'publicada': None if publicada is None else [publicada.generacion, len(publicada.df)],
+            }
+        return salida
+
+
+def leer(clave, ruta, leer_csv, limpiar, columna_anio='AÑO'):
+    """Devuelve la `Lectura` actual de `ruta` para el cargador `clave`.
+
+    `leer_csv(buffer, dtype=None)` parsea bytes CSV (con cabecera) y
+    `limpiar(df)` normaliza el DataFrame crudo; ambos se aplican igual a
+    la carga completa y a las filas agregadas, de modo que el resultado
+    es el mismo que releer el archivo entero. El DataFrame devuelto es
+    compartido: quien lo modifique debe copiarlo antes.
+    """
+    preparando_ = getattr(_LOCAL, 'preparando', False)
+    if not preparando_ and _vigilado():
+        publicada = _PUBLICADAS.get(clave)
+        if publicada is not None and publicada.ruta == ruta:
+            with _LOCK:
+                _contar(clave, 'publicadas')
+            return publicada
+    lectura = _leer(clave, ruta, leer_csv, limpiar, columna_anio)
+    if not preparando_:
+        with _LOCK:
+            _PUBLICADAS[clave] = lectura
+    return lectura
+
+
+def _leer(clave, ruta, leer_csv, limpiar, columna_anio):
+    st = os.stat(ruta)
+    t0 = time.perf_counter()
+    with _LOCK:
+        estado = _ESTADOS.get(clave)
+        if estado is not None and estado['ruta'] == ruta and estado['firma'] == (st.st_mtime_ns, st.st_size):
+            _contar(clave, 'sin_cambios')
+            return estado['lectura']
+
+        if estado is not None and estado['ruta'] == ruta and st.st_size > estado['offset']:
+            offset = estado['offset']
+            inicio = max(0, offset - BYTES_VERIFICACION)
+            previo = _leer_bytes(ruta, inicio, offset)
+            if (previo == estado['cola']
+                    and _leer_bytes(ruta, 0, len(estado['cabecera'])) == estado['cabecera']):
+                nuevos = _leer_bytes(ruta, offset, st.st_size)
+                if nuevos.strip():
+                    # columnas de texto en la carga completa se leen como texto también
+                    # aquí, para que p.ej. '1.230' no se convierta en el float 1.23
+                    crudo = leer_csv(io.BytesIO(estado['cabecera'] + nuevos),
+                                     dtype={c: str for c in estado['texto']})
+                    agregadas = limpiar(crudo)
+                    agregadas.index = pd.RangeIndex(len(estado['lectura'].df),
+                                                    len(estado['lectura'].df) + len(agregadas))
+                    df = pd.concat([estado['lectura'].df, agregadas])
+                    versiones = _versiones(agregadas, columna_anio, estado['lectura'].versiones_anio)
+                    print(f"[ingesta] {clave}: {len(agregadas)} filas nuevas en {os.path.basename(ruta)}")
+                else:
+                    df, versiones = estado['lectura'].df, estado['lectura'].versiones_anio
+                lectura = Lectura(df, estado['lectura'].generacion, versiones, ruta)
+                _ESTADOS[clave] = {
+                    'ruta': ruta,
+                    'firma': (st.st_mtime_ns, st.st_size),
+                    'offset': st.st_size,
+                    'cabecera': estado['cabecera'],
+                    'texto': estado['texto'],
+                    'cola': _leer_bytes(ruta, max(0, st.st_size - BYTES_VERIFICACION), st.st_size),
+                    'lectura': lectura,
+                }
+                _contar(clave, 'incrementales', time.perf_counter() - t0)
+                return lectura
+
+        # Relectura completa
+        datos = _leer_bytes(ruta)
+        crudo = leer_csv(io.BytesIO(datos))
+        texto = [c for c in crudo.columns if not pd.api.types.is_numeric_dtype(crudo[c])]
+        df = limpiar(crudo).reset_index(drop=True)
+        lectura = Lectura(df, _siguiente_generacion(), _versiones(df, columna_anio), ruta)
+        _ESTADOS[clave] = {
+            'ruta': ruta,
+            'firma': (st.st_mtime_ns, st.st_size),
+            'offset': len(datos),
+            'cabecera': _cabecera(datos),
+            'texto': texto,
+            'cola': datos[-BYTES_VERIFICACION:],
+            'lectura': lectura,
+        }
+        _contar(clave, 'completas', time.perf_counter() - t0)
+        return lectura
+
+
+def olvidar(clave=None):
+    """Descarta el estado de `clave` (o de todas), forzando una relectura completa."""
+    with _LOCK:
+        if clave is None:
+            _ESTADOS.clear()
+            _PUBLICADAS.clear()
+        else:
+            _ESTADOS.pop(clave, None)
+            _PUBLICADAS.pop(clave, None)
@@ -9,14 +9,21 @@ datos, limpiar series y calcular métricas usadas por las plantillas.
 from flask import Blueprint, render_template, request, current_app
 import traceback
 import pandas as pd
+import numpy as np
 import os
 
 from modelo_acopio import predecir_acopio
-from modelo_precio import predecir_precio, cargar_datos as cargar_precios
+from modelo_precio import predecir_precio, cargar_datos as cargar_precios, lectura_precios
+from pronosticos import perfil_estacional, MESES_NOMBRES
+import cache_datos
+import ingesta
+from razas import BREED_STATS
+from tiempos import etapa, medido
 
 inversion_bp = Blueprint('inversion', __name__, template_folder='templates')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+@medido('inversion.censo')
 def cargar_censo_bovino():
     """Carga y limpia el CSV del censo bovino.
 
@@ -38,6 +45,7 @@ def cargar_censo_bovino():
         raise ValueError("El DataFrame del censo está vacío")
     return df
 
+@medido('inversion.razas')
 def cargar_datos_raza():
     """Construye y devuelve un DataFrame con información aproximada de razas por departamento.
 
@@ -63,39 +71,66 @@ def cargar_datos_raza():
     return pd.DataFrame(data)
 
 
-# Estadísticas por raza (valores por vaca en litros/día y composición)
-BREED_STATS = {
-    'Holstein': {'min': 30.0, 'max': 40.0, 'avg': 35.0, 'fat': 3.5, 'protein': 3.1},
-    'Simmental Suizo': {'min': 20.0, 'max': 30.0, 'avg': 25.0, 'fat': 4.0, 'protein': 3.4},
-    'Jersey': {'min': 18.0, 'max': 25.0, 'avg': 21.5, 'fat': 5.0, 'protein': 3.8},
-    'Normando': {'min': 20.0, 'max': 28.0, 'avg': 24.0, 'fat': 4.2, 'protein': 3.5},
-    'Gyr': {'min': 10.0, 'max': 18.0, 'avg': 14.0, 'fat': 4.75, 'protein': 3.65}
-}
+MESES_ES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+            'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+# Errores esperables al leer o ajustar los datasets (archivo ausente,
+# columnas faltantes, valores no numéricos, sistema singular)
+ERRORES_DATOS = (OSError, KeyError, ValueError, np.linalg.LinAlgError)
+
+
+def perfiles_estacionales():
+    """Perfiles mensuales (precio, acopio) estimados con el modelo estacional.
+
+    Devuelve dos arreglos de 12 valores (enero a diciembre) con el nivel
+    esperado de la serie nacional en cada mes, sin el efecto de la
+    tendencia. Se cachea con `cache_datos` por generación y filas de los
+    dos CSV: sólo se vuelve a ajustar cuando alguno cambia. Lanza una de
+    ERRORES_DATOS si alguno de los datasets no puede cargarse.
+    """
+    acopio = lectura_acopio()
+    precio = lectura_precios()
+    firma = (acopio.generacion, len(acopio.df), precio.generacion, len(precio.df))
+    return cache_datos.memo(('inversion', 'perfiles'), firma, _ajustar_perfiles)
+
+
+def _ajustar_perfiles():
+    df_acopio = cargar_acopio()
+    col_anio = 'año' if 'año' in df_acopio.columns else 'ano'
+    df_acopio['mes_num'] = df_acopio['mes'].astype(str).str.strip().str.upper().map(
+        {m: i + 1 for i, m in enumerate(MESES_NOMBRES)})
+    df_acopio = df_acopio.dropna(subset=['mes_num', 'nacional']).sort_values([col_anio, 'mes_num'])
+    y_acopio = df_acopio[['nacional']].to_numpy(dtype=float).T
+    perfil_acopio = perfil_estacional(y_acopio, ~np.isnan(y_acopio), df_acopio['mes_num'].astype(int).to_numpy())
+
+    df_precios, cols_precios = cargar_precios()
+    df_precios = df_precios.sort_values('FECHA')
+    serie = df_precios['NACIONAL'] if 'NACIONAL' in cols_precios else df_precios[cols_precios].mean(axis=1)
+    y_precio = serie.to_numpy(dtype=float)[None, :]
+    perfil_precio = perfil_estacional(y_precio, ~np.isnan(y_precio), df_precios['MES_NUM'].to_numpy())
+    return perfil_precio, perfil_acopio
 
 
 def obtener_mejor_mes():
     """Retorna una tupla (mes, precio, acopio) con el mes de mayor rentabilidad.
 
-    Implementado como función simple que usa datos estáticos para
-    facilitar demos cuando no hay modelos disponibles.
+    Usa los perfiles estacionales de precio y acopio nacionales; si los
+    datos no están disponibles recurre a valores estáticos para no
+    romper la vista.
     """
-    meses = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-             'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
-    precios = [1450, 1480, 1500, 1520, 1490, 1510, 1530, 1620, 1580, 1550, 1500, 1480]
-    acopios = [88, 90, 91, 89, 87, 92, 93, 92, 90, 89, 88, 87]
-    df = pd.DataFrame({'mes': meses, 'precio': precios, 'acopio': acopios})
+    try:
+        precios, acopios = perfiles_estacionales()
+        df = pd.DataFrame({'mes': MESES_ES, 'precio': precios.round(2), 'acopio': acopios.round(0)})
+    except ERRORES_DATOS:
+        precios = [1450, 1480, 1500, 1520, 1490, 1510, 1530, 1620, 1580, 1550, 1500, 1480]
+        acopios = [88, 90, 91, 89, 87, 92, 93, 92, 90, 89, 88, 87]
+        df = pd.DataFrame({'mes': MESES_ES, 'precio': precios, 'acopio': acopios})
     df['rentabilidad'] = df['precio'] / df['acopio']
     if df.empty:
         return "No disponible", 0, 0
     mejor = df.sort_values(by='rentabilidad', ascending=False).iloc[0]
     return mejor['mes'], mejor['precio'], mejor['acopio']
 
-def cargar_acopio():
-    """Carga el CSV de acopio y devuelve un DataFrame limpio."""
-    ruta = os.path.join(BASE_DIR, 'DataSheet', 'Volumen de Acopio Directos - Res 0017 de 2012.csv')
-    if not os.path.exists(ruta):
-        raise FileNotFoundError(f"Archivo de acopio no encontrado: {ruta}")
-    df = pd.read_csv(ruta, sep=';', encoding='utf-8')
+def _limpiar_acopio(df):
     # Normalizar nombres de columnas (minúsculas, sin espacios exteriores)
     df.columns = [c.strip().lower() for c in df.columns]
     # Limpiar columnas numéricas: quitar puntos miles y 'nd'
@@ -118,6 +153,24 @@ def cargar_acopio():
             df[col] = df[col].apply(clean_num)
     return df
 
+def lectura_acopio():
+    """`ingesta.Lectura` del CSV de acopio limpio (sólo limpia las filas nuevas si el CSV creció)."""
+    ruta = os.path.join(BASE_DIR, 'DataSheet', 'Volumen de Acopio Directos - Res 0017 de 2012.csv')
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(f"Archivo de acopio no encontrado: {ruta}")
+    return ingesta.leer('acopio_inversion', ruta,
+                        lambda buffer, dtype=None: pd.read_csv(buffer, sep=';', encoding='utf-8', dtype=dtype),
+                        _limpiar_acopio, columna_anio='año')
+
+@medido('inversion.acopio')
+def cargar_acopio():
+    """Carga el CSV de acopio y devuelve un DataFrame limpio.
+
+    Usa `ingesta`, así que si el CSV sólo creció se limpian únicamente
+    las filas nuevas; devuelve una copia que el llamador puede modificar.
+    """
+    return lectura_acopio().df.copy()
+
 def mejores_meses_acopio(n_top=3, departamento=None):
     """Devuelve los n_top meses con mayor acopio promedio. Si departamento es None usa NACIONAL, si no usa la columna del departamento."""
     try:
@@ -144,14 +197,20 @@ def mejores_meses_acopio(n_top=3, departamento=None):
     return [{'mes': m, 'valor': float(v)} for m, v in top.items()]
 
 def mejores_meses_por_acopio(n=3):
-    """Devuelve los n meses con mayor volumen de acopio (lista de meses)."""
-    meses = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-             'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
-    acopios = [88, 90, 91, 89, 87, 92, 93, 92, 90, 89, 88, 87]
-    df_m = pd.DataFrame({'mes': meses, 'acopio': acopios})
+    """Devuelve los n meses con mayor volumen de acopio (lista de meses).
+
+    El ranking sale del perfil estacional del acopio nacional; si no se
+    puede estimar se usa una tabla estática de referencia.
+    """
+    try:
+        _, acopios = perfiles_estacionales()
+    except ERRORES_DATOS:
+        acopios = [88, 90, 91, 89, 87, 92, 93, 92, 90, 89, 88, 87]
+    df_m = pd.DataFrame({'mes': MESES_ES, 'acopio': acopios})
     top = df_m.sort_values(by='acopio', ascending=False).head(n)
     return top['mes'].tolist()
 
+@medido('inversion.series_anuales')
 def serie_anual_departamento(departamento, ano=2025):
     """Devuelve la serie mensual (12 meses) del año `ano` para el departamento indicado.
     Resultado: lista de dicts [{'mes': 'Enero', 'valor': float}, ...] en orden de enero a diciembre.
@@ -208,6 +267,7 @@ def serie_anual_departamento(departamento, ano=2025):
         return []
     return series
 
+@medido('inversion.analisis_censo')
 def generar_analisis_censo(df):
     grupos = ['terneras < 1 año', 'hembras 1 - 2 años', 'hembras 2 - 3 años', 'hembras > 3 años']
     grupos_existentes = [g for g in grupos if g in df.columns]
@@ -253,8 +313,10 @@ def inversion():
             tabla_censo_df = df_censo.copy()
             # Mejorar nombres de columnas para visualización
             tabla_censo_df.columns = [c.title() for c in tabla_censo_df.columns]
+            medicion = etapa('inversion.tabla_censo').iniciar()
             tabla_censo = tabla_censo_df.to_html(classes="table table-striped table-sm table-hover",
                                                  index=False, border=0, justify="center", na_rep="")
+            medicion.terminar()
         except Exception:
             tabla_censo = "<p class='text-danger'>No fue posible cargar la tabla del censo.</p>"
 
@@ -480,6 +542,7 @@ def inversion():
 
                         cols_norm = {(_norm(c)): c for c in cols_precios}
 
+                        medicion = etapa('inversion.precios_departamentos').iniciar()
                         for info in lista_mejores_info:
                             depto = info['departamento']
                             key = _norm(depto)
@@ -509,6 +572,7 @@ def inversion():
                                 'precio': precio_val,
                                 'precio_str': f"{precio_val:,.0f}" if precio_val is not None else 'N/A'
                             })
+                        medicion.terminar()
                     except Exception:
                         # Si falla la carga de precios, inicializar lista vacía con N/A
                         precios_departamentos = [{'departamento': i['departamento'], 'precio': None, 'precio_str': 'N/A'} for i in lista_mejores_info]
@@ -0,0 +1,220 @@
+"""Endpoint `/metrics` en formato de texto de Prometheus.
+
+Todo se calcula en el proceso, sin servicios externos: cada worker de
+gunicorn expone sus propios valores (la etiqueta `pid` los distingue).
+Incluye:
+
+- histograma de latencia por endpoint y método, y peticiones por código;
+- sentencias y segundos de BD por endpoint (de `monitor_sql`);
+- aciertos/fallos/extensiones de `cache_datos` (datasets, pronósticos,
+  gráficos y resúmenes), de la caché de usuarios y de las lecturas de
+  `ingesta`;
+- respuestas comprimidas, bytes ahorrados y aciertos de la caché de
+  `compresion`;
+- duración de la última reconstrucción de datos por etapa
+  (`recarga_datos`) y de la última lectura de cada CSV;
+- memoria residente (RSS) del worker.
+
+Generar la respuesta sólo copia diccionarios pequeños, así que se puede
+consultar cada 15 segundos.
+
+Expone nombres de endpoints, rutas de datasets y contadores internos, así
+que exige `METRICAS_TOKEN` en la cabecera `Authorization: Bearer <token>`
+(no como parámetro de la URL, que quedaría en los logs de acceso). Sin
+`METRICAS_TOKEN` definido se rechaza toda petición, salvo con la app en
+modo debug.
+"""
+
+import bisect
+import hmac
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, current_app, g, request
+
+import cache_datos
+import cache_usuarios
+import compresion
+import ingesta
+import monitor_sql
+import recarga_datos
+
+
+# Límites (segundos) de los buckets del histograma de latencia
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TOKEN = os.environ.get('METRICAS_TOKEN')
+
+metricas_bp = Blueprint('metricas', __name__)
+
+_LOCK = threading.Lock()
+# (endpoint, método) -> [cuentas por bucket (+Inf al final), suma, total]
+_LATENCIAS = {}
+# (endpoint, método, código) -> peticiones
+_PETICIONES = {}
+
+
+def _inicio_peticion():
+    g.metricas_inicio = time.perf_counter()
+
+
+def _fin_peticion(respuesta):
+    inicio = g.get('metricas_inicio')
+    if inicio is None:
+        return respuesta
+    segundos = time.perf_counter() - inicio
+    endpoint = request.endpoint or '(sin ruta)'
+    clave = (endpoint, request.method)
+    with _LOCK:
+        h = _LATENCIAS.get(clave)
+        if h is None:
+            h = _LATENCIAS[clave] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        h[0][bisect.bisect_left(BUCKETS, segundos)] += 1
+        h[1] += segundos
+        h[2] += 1
+        codigo = clave + (str(respuesta.status_code),)
+        _PETICIONES[codigo] = _PETICIONES.get(codigo, 0) + 1
+    return respuesta
+
+
+def instalar(app):
+    """Registra los hooks que miden la latencia de cada petición."""
+    app.before_request(_inicio_peticion)
+    app.after_request(_fin_peticion)
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss (pico, en KB en Linux) si no hay /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return None
+
+
+def _etiquetas(**kwargs):
+    partes = []
+    for k, v in kwargs.items():
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{k}="{v}"')
+    return '{' + ','.join(partes) + '}'
+
+
+class _Salida:
+    def __init__(self, pid):
+        self.lineas = []
+        self.pid = pid
+
+    def metrica(self, nombre, tipo, ayuda):
+        self.lineas.append(f'# HELP {nombre} {ayuda}')
+        self.lineas.append(f'# TYPE {nombre} {tipo}')
+
+    def valor(self, nombre, valor, **etiquetas):
+        if valor is None:
+            return
+        self.lineas.append(f'{nombre}{_etiquetas(pid=self.pid, **etiquetas)} {valor}')
+
+
+def generar():
+    """Texto de exposición de Prometheus con todas las métricas del proceso."""
+    s = _Salida(os.getpid())
+    with _LOCK:
+        latencias = {k: (list(v[0]), v[1], v[2]) for k, v in _LATENCIAS.items()}
+        peticiones = dict(_PETICIONES)
+
+    s.metrica('app_peticion_segundos', 'histogram', 'Latencia de las peticiones por endpoint.')
+    for (endpoint, metodo), (cuentas, suma, total) in sorted(latencias.items()):
+        acumulado = 0
+        for limite, n in zip(BUCKETS + ('+Inf',), cuentas):
+            acumulado += n
+            s.valor('app_peticion_segundos_bucket', acumulado, endpoint=endpoint, metodo=metodo, le=limite)
+        s.valor('app_peticion_segundos_sum', round(suma, 6), endpoint=endpoint, metodo=metodo)
+        s.valor('app_peticion_segundos_count', total, endpoint=endpoint, metodo=metodo)
+
+    s.metrica('app_peticiones_total', 'counter', 'Peticiones respondidas por endpoint, método y código.')
+    for (endpoint, metodo, codigo), n in sorted(peticiones.items()):
+        s.valor('app_peticiones_total', n, endpoint=endpoint, metodo=metodo, codigo=codigo)
+
+    sql = monitor_sql.estadisticas()
+    s.metrica('app_db_sentencias_total', 'counter', 'Sentencias SQL ejecutadas por endpoint.')
+    for endpoint, e in sql.items():
+        s.valor('app_db_sentencias_total', e['sentencias'], endpoint=endpoint)
+    s.metrica('app_db_segundos_total', 'counter', 'Segundos en sentencias SQL por endpoint.')
+    for endpoint, e in sql.items():
+        s.valor('app_db_segundos_total', e['segundos'], endpoint=endpoint)
+    s.metrica('app_db_lentas_total', 'counter', 'Sentencias SQL sobre el umbral de monitor_sql.')
+    for endpoint, e in sql.items():
+        s.valor('app_db_lentas_total', e['lentas'], endpoint=endpoint)
+
+    cache = cache_datos.contadores()
+    s.metrica('app_cache_total', 'counter',
+              'Búsquedas en cache_datos por grupo y resultado (acierto, fallo o extensión incremental).')
+    for grupo, c in sorted(cache.items()):
+        s.valor('app_cache_total', c['aciertos'], grupo=grupo, resultado='acierto')
+        s.valor('app_cache_total', c['fallos'], grupo=grupo, resultado='fallo')
+        s.valor('app_cache_total', c['extensiones'], grupo=grupo, resultado='extension')
+    s.metrica('app_cache_construccion_segundos_total', 'counter',
+              'Segundos construyendo o extendiendo valores de cache_datos por grupo.')
+    for grupo, c in sorted(cache.items()):
+        s.valor('app_cache_construccion_segundos_total', round(c['segundos_construccion'], 6), grupo=grupo)
+
+    usuarios = cache_usuarios.resumen()
+    s.metrica('app_cache_usuarios_total', 'counter', 'Búsquedas en la caché de usuarios por resultado.')
+    s.valor('app_cache_usuarios_total', usuarios['aciertos'], resultado='acierto')
+    s.valor('app_cache_usuarios_total', usuarios['fallos'], resultado='fallo')
+    s.metrica('app_cache_usuarios_entradas', 'gauge', 'Usuarios en la caché.')
+    s.valor('app_cache_usuarios_entradas', usuarios['entradas'])
+
+    comp = compresion.contadores()
+    s.metrica('app_compresion_respuestas_total', 'counter', 'Respuestas comprimidas con gzip o brotli.')
+    s.valor('app_compresion_respuestas_total', comp['comprimidas'])
+    s.metrica('app_compresion_bytes_total', 'counter', 'Bytes de las respuestas comprimidas, antes y después.')
+    s.valor('app_compresion_bytes_total', comp['bytes_originales'], tipo='original')
+    s.valor('app_compresion_bytes_total', comp['bytes_enviados'], tipo='enviado')
+    s.metrica('app_compresion_cache_aciertos_total', 'counter', 'Cuerpos comprimidos servidos desde la caché.')
+    s.valor('app_compresion_cache_aciertos_total', comp['cache_aciertos'])
+    s.metrica('app_compresion_cache_bytes', 'gauge', 'Bytes comprimidos guardados en la caché.')
+    s.valor('app_compresion_cache_bytes', comp['cache_bytes'])
+
+    lecturas = ingesta.lecturas()
+    s.metrica('app_dataset_lecturas_total', 'counter',
+              'Lecturas de CSV por cargador y tipo (publicada, sin cambios, incremental, completa).')
+    for clave, c in sorted(lecturas.items()):
+        for tipo in ('publicadas', 'sin_cambios', 'incrementales', 'completas'):
+            s.valor('app_dataset_lecturas_total', c[tipo], dataset=clave, tipo=tipo)
+    s.metrica('app_dataset_lectura_segundos', 'gauge', 'Duración de la última lectura de cada CSV.')
+    for clave, c in sorted(lecturas.items()):
+        s.valor('app_dataset_lectura_segundos', c['segundos_completa'], dataset=clave, tipo='completa')
+        s.valor('app_dataset_lectura_segundos', c['segundos_incremental'], dataset=clave, tipo='incremental')
+
+    recarga = recarga_datos.estado()
+    s.metrica('app_recarga_etapa_segundos', 'gauge', 'Duración por etapa de la última reconstrucción de datos.')
+    for etapa, segundos in sorted(recarga['tiempos'].items()):
+        s.valor('app_recarga_etapa_segundos', segundos, etapa=etapa)
+    s.metrica('app_recarga_segundos', 'gauge', 'Duración total de la última reconstrucción de datos.')
+    s.valor('app_recarga_segundos', recarga['duracion_total'])
+    s.metrica('app_recarga_version', 'gauge', 'Versión publicada de DataSheet.')
+    s.valor('app_recarga_version', recarga['version'])
+
+    s.metrica('app_proceso_rss_bytes', 'gauge', 'Memoria residente del worker.')
+    s.valor('app_proceso_rss_bytes', _rss_bytes())
+    return '\n'.join(s.lineas) + '\n'
+
+
+@metricas_bp.route('/metrics')
+def metrics():
+    """Métricas del worker en formato de texto de Prometheus."""
+    if TOKEN:
+        cabecera = request.headers.get('Authorization', '')
+        enviado = cabecera[7:] if cabecera.startswith('Bearer ') else ''
+        # comparación en tiempo constante
+        if not hmac.compare_digest(enviado.encode('utf-8'), TOKEN.encode('utf-8')):
+            return Response('No autorizado\n', status=403, mimetype='text/plain')
+    elif not current_app.debug:
+        return Response('Métricas desactivadas: define METRICAS_TOKEN\n', status=403, mimetype='text/plain')
+    return Response(generar(), mimetype='text/plain; version=0.0.4; charset=utf-8')
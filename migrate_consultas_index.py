@@ -0,0 +1,27 @@
+"""Crea el índice compuesto (user_id, created_at) de `consultas`.
+
+El índice `ix_consultas_user_created` está declarado en el modelo
+`Consulta`; las bases nuevas lo obtienen con `create_all`, y este script
+lo agrega a bases existentes (SQLite o MySQL). Es idempotente: si el
+índice ya existe no hace nada.
+
+Uso:
+  python migrate_consultas_index.py
+"""
+from database import db
+from models import Consulta
+from app import app
+
+
+def migrate():
+    with app.app_context():
+        for indice in Consulta.__table__.indexes:
+            try:
+                indice.create(bind=db.engine, checkfirst=True)
+                print('Índice listo:', indice.name)
+            except Exception as e:
+                print(f'Advertencia creando índice {indice.name}:', e)
+
+
+if __name__ == '__main__':
+    migrate()
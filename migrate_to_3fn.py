@@ -7,85 +7,125 @@ Pasos:
  - puebla `departamentos` con valores distintos de `consulta_precios.departamento`
  - actualiza filas para apuntar a los nuevos IDs (sin borrar columnas string legacy)
 
-Ejecutar con MySQL activo. Evita que `app.py` cree tablas automáticas estableciendo
-`SKIP_CREATE_ALL=1` en el entorno.
+Cada tabla se normaliza con dos sentencias en una sola transacción:
+`INSERT INTO lookup (name) SELECT DISTINCT TRIM(col) ...` (sólo los nombres
+que aún no existen) y `UPDATE tabla JOIN lookup ... SET fk = lookup.id`
+(en SQLite, `UPDATE ... FROM`). Sólo se tocan filas con la FK en NULL, así
+que volver a ejecutarlo es seguro y no repite trabajo. Funciona en MySQL
+y en SQLite; el costo lo pone el motor y no depende del número de
+valores distintos.
+
+Ejemplo de uso:
+  python migrate_to_3fn.py                      # BD configurada en app.py
+  python migrate_to_3fn.py --uri "sqlite:///instance/usuarios.db"
+
+Sin `--uri` se usa la BD de la app; `SKIP_CREATE_ALL=1` se fija
+automáticamente para que importar `app.py` no cree tablas.
 """
-from app import app
-from database import db
+import argparse
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, inspect, select, insert, update, exists, func, and_, text, table, column
+
 from models import Raza, Departamento, Consulta, ConsultaPrecio
 
-with app.app_context():
-    # Crear tablas lookup
-    try:
-        Raza.__table__.create(bind=db.engine, checkfirst=True)
-        Departamento.__table__.create(bind=db.engine, checkfirst=True)
-    except Exception as e:
-        print('Advertencia creando tablas lookup:', e)
 
-    # Añadir columnas FK si faltan
-    try:
-        db.engine.execute("ALTER TABLE consultas ADD COLUMN IF NOT EXISTS raza_id BIGINT NULL")
-        db.engine.execute("ALTER TABLE consulta_precios ADD COLUMN IF NOT EXISTS departamento_id BIGINT NULL")
-    except Exception:
-        # fallback para MySQL que no soporte IF NOT EXISTS
-        try:
-            db.engine.execute("ALTER TABLE consultas ADD COLUMN raza_id BIGINT NULL")
-        except Exception:
-            pass
-        try:
-            db.engine.execute("ALTER TABLE consulta_precios ADD COLUMN departamento_id BIGINT NULL")
-        except Exception:
-            pass
-
-    # Poblar `razas` desde valores existentes
-    distinct_razas = db.engine.execute("SELECT DISTINCT raza FROM consultas WHERE raza IS NOT NULL AND raza != ''").fetchall()
-    inserted_razas = {}
-    for (r,) in distinct_razas:
-        if not r:
-            continue
-        # normalizar espacio y mayúsculas mínimamente
-        name = r.strip()
-        exists = db.engine.execute("SELECT id FROM razas WHERE name = %s", (name,)).fetchone()
-        if exists:
-            inserted_razas[name] = exists[0]
-        else:
-            res = db.engine.execute("INSERT INTO razas (name) VALUES (%s)", (name,))
-            # obtener id recién insertado
-            idrow = db.engine.execute("SELECT id FROM razas WHERE name = %s", (name,)).fetchone()
-            inserted_razas[name] = idrow[0]
-
-    # Poblar `departamentos` desde `consulta_precios.departamento`
-    distinct_depts = db.engine.execute("SELECT DISTINCT departamento FROM consulta_precios WHERE departamento IS NOT NULL AND departamento != ''").fetchall()
-    inserted_depts = {}
-    for (d,) in distinct_depts:
-        if not d:
-            continue
-        name = d.strip()
-        exists = db.engine.execute("SELECT id FROM departamentos WHERE name = %s", (name,)).fetchone()
-        if exists:
-            inserted_depts[name] = exists[0]
-        else:
-            db.engine.execute("INSERT INTO departamentos (name) VALUES (%s)", (name,))
-            idrow = db.engine.execute("SELECT id FROM departamentos WHERE name = %s", (name,)).fetchone()
-            inserted_depts[name] = idrow[0]
-
-    # Actualizar consultas: asignar raza_id según el valor string
-    for name, rid in inserted_razas.items():
-        try:
-            db.engine.execute("UPDATE consultas SET raza_id = %s WHERE raza = %s", (rid, name))
-        except Exception as e:
-            print('ERROR actualizando consultas para raza', name, e)
+# (tabla, columna string, columna FK, tabla lookup). Las tablas de datos se
+# describen sólo con las columnas usadas: así el UPDATE no arrastra los
+# `onupdate` del modelo (p. ej. `updated_at`) ni exige columnas que una BD
+# migrada podría no tener.
+NORMALIZACIONES = (
+    (table(Consulta.__tablename__, column('raza'), column('raza_id')),
+     'raza', 'raza_id', Raza.__table__),
+    (table(ConsultaPrecio.__tablename__, column('departamento'), column('departamento_id')),
+     'departamento', 'departamento_id', Departamento.__table__),
+)
+
 
-    # Actualizar consulta_precios: asignar departamento_id según departamento string
-    for name, did in inserted_depts.items():
+def _asegurar_columna(engine, tabla, columna):
+    """Añade `columna` BIGINT NULL a `tabla` si falta (DDL fuera de la transacción de datos)."""
+    existentes = {c['name'] for c in inspect(engine).get_columns(tabla.name)}
+    if columna in existentes:
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {columna} BIGINT NULL"))
+    return True
+
+
+def _update_join(conn, tabla, col, fk, lookup):
+    """UPDATE tabla JOIN lookup SET fk = lookup.id para las filas con fk en NULL."""
+    origen = tabla.c[col]
+    destino = tabla.c[fk]
+    if conn.dialect.name == 'sqlite' and conn.dialect.dbapi.sqlite_version_info < (3, 33, 0):
+        # SQLite antiguo no tiene UPDATE ... FROM: subconsulta correlacionada (usa el índice único de name)
+        sub = select(lookup.c.id).where(lookup.c.name == func.trim(origen)).scalar_subquery()
+        return conn.execute(
+            update(tabla).values({fk: sub}).where(destino.is_(None), origen.is_not(None))
+        ).rowcount
+    # SQLAlchemy genera `UPDATE ... JOIN` en MySQL y `UPDATE ... FROM` en SQLite/PostgreSQL
+    return conn.execute(
+        update(tabla)
+        .values({fk: lookup.c.id})
+        .where(and_(destino.is_(None), lookup.c.name == func.trim(origen)))
+    ).rowcount
+
+
+def normalizar_tabla(engine, tabla, col, fk, lookup):
+    """Puebla `lookup` y asigna `fk` en `tabla` en una transacción. Devuelve (insertados, actualizados)."""
+    origen = tabla.c[col]
+    nombre = func.trim(origen)
+    ya_existe = exists().where(lookup.c.name == nombre)
+    distintos = (
+        select(nombre)
+        .where(origen.is_not(None), nombre != '', ~ya_existe)
+        .distinct()
+    )
+    with engine.begin() as conn:
+        insertados = conn.execute(insert(lookup).from_select(['name'], distintos)).rowcount
+        actualizados = _update_join(conn, tabla, col, fk, lookup)
+    return insertados, actualizados
+
+
+def normalizar(engine):
+    """Ejecuta todas las normalizaciones sobre `engine` e imprime un resumen por tabla."""
+    for lookup in {n[3] for n in NORMALIZACIONES}:
         try:
-            db.engine.execute("UPDATE consulta_precios SET departamento_id = %s WHERE departamento = %s", (did, name))
+            lookup.create(bind=engine, checkfirst=True)
         except Exception as e:
-            print('ERROR actualizando consulta_precios para dept', name, e)
+            print('Advertencia creando tablas lookup:', e)
+
+    totales = {}
+    for tabla, col, fk, lookup in NORMALIZACIONES:
+        if _asegurar_columna(engine, tabla, fk):
+            print(f"Columna {tabla.name}.{fk} añadida")
+        t0 = time.perf_counter()
+        insertados, actualizados = normalizar_tabla(engine, tabla, col, fk, lookup)
+        print(f"{tabla.name}: {insertados} {lookup.name} nuevos, {actualizados} filas actualizadas "
+              f"({time.perf_counter() - t0:.2f}s)")
+        totales[lookup.name] = insertados
+    return totales
+
+
+def _engine_de_la_app():
+    os.environ.setdefault('SKIP_CREATE_ALL', '1')
+    from app import app
+    from database import db
+    with app.app_context():
+        return db.engine
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Normalizar razas y departamentos a tablas lookup (3FN)')
+    parser.add_argument('--uri', help='URI SQLAlchemy de la BD (por defecto, la configurada en app.py)')
+    args = parser.parse_args()
 
     try:
-        db.session.commit()
+        engine = create_engine(args.uri) if args.uri else _engine_de_la_app()
+        totales = normalizar(engine)
     except Exception as e:
-        print('ERROR commit final en migrate_to_3fn:', e)
-
-    print('Normalización parcial completada. Razas creadas:', len(inserted_razas), 'Departamentos creados:', len(inserted_depts))
+        print('ERROR en migrate_to_3fn:', e)
+        sys.exit(1)
+    print('Normalización parcial completada. Razas creadas:', totales.get('razas', 0),
+          'Departamentos creados:', totales.get('departamentos', 0))
@@ -1,39 +1,40 @@
 """Herramientas de predicción de volumen de acopio.
 
 Contiene utilidades para cargar el CSV histórico de acopios y generar
-predicciones de volumen nacional mediante una regresión lineal simple.
+predicciones de volumen nacional con los pronosticadores de
+`pronosticos` (tendencia lineal por defecto, o tendencia + estacionalidad).
 El módulo intenta ser robusto frente a formatos locales de números y
 nombres de columnas.
 """
 
 import pandas as pd
-from sklearn.linear_model import LinearRegression
+from pronosticos import AjusteLote, modelo_para, validar_horizonte, HORIZONTE_MAX
+import cache_datos
+import ingesta
+from tiempos import medido
 import numpy as np
 import os
 
 
-def predecir_acopio():
-    """Cargar datos históricos de acopio y predecir 6 meses siguientes.
+# Ruta del archivo CSV (y alternativa relativa a este módulo)
+RUTA_ACOPIO = os.path.join("DataSheet", "Volumen de Acopio Directos - Res 0017 de 2012.csv")
+RUTA_ACOPIO_ALT = os.path.join(os.path.dirname(__file__), "DataSheet", "Volumen de Acopio Directos - Res 0017 de 2012.csv")
+# Meses pronosticados por defecto en la vista
+HORIZONTE = 6
 
-    Esta función normaliza los valores numéricos (quita separadores de
-    miles, normaliza comas decimales), entrena una regresión lineal
-    sobre la columna nacional y devuelve un DataFrame con las 6 filas
-    de predicción. En caso de errores de lectura, intenta rutas
-    alternativas y, si no puede, lanza excepción para que la vista la
-    gestione.
-    """
 
-    # Ruta del archivo CSV
-    ruta = os.path.join("DataSheet", "Volumen de Acopio Directos - Res 0017 de 2012.csv")
+def _leer_csv(buffer, dtype=None):
+    return pd.read_csv(buffer, sep=';', encoding='latin-1', dtype=dtype)
 
-    # Cargar los datos
-    try:
-        df = pd.read_csv(ruta, sep=';', encoding='latin-1')
-    except FileNotFoundError:
-        # Si falla, intentar con ruta relativa al archivo
-        ruta_alt = os.path.join(os.path.dirname(__file__), "DataSheet", "Volumen de Acopio Directos - Res 0017 de 2012.csv")
-        df = pd.read_csv(ruta_alt, sep=';', encoding='latin-1')
-    
+
+def _limpiar(df):
+    """Normalizar el CSV de acopio para el ajuste.
+
+    Normaliza los valores numéricos (quita separadores de miles,
+    normaliza comas decimales; 'nd' queda como faltante), renombra la
+    columna nacional a 'NACIONAL' y agrega MES_NUM. Sin columna nacional
+    devuelve un DataFrame vacío.
+    """
     # Normalizar nombres de columnas: quitar espacios y tildes
     def normalize_col(col):
         import unicodedata
@@ -80,17 +81,19 @@ def predecir_acopio():
     nacional_col = next((c for c in df.columns if 'NACIONAL' in c), None)
     if not nacional_col:
         print("⚠️ No se encontró columna de volumen nacional. Columnas disponibles:", df.columns.tolist())
-        return pd.DataFrame()
-    df[nacional_col] = df[nacional_col].astype(str).str.strip().replace('nd', '0')
-    if df[nacional_col].str.contains(r'\.', regex=True).any():
-        # remover puntos de miles de forma literal
-        df[nacional_col] = df[nacional_col].str.replace('.', '', regex=False)
-    # normalizar coma decimal a punto
-    df[nacional_col] = df[nacional_col].str.replace(',', '.', regex=False)
-    df[nacional_col] = pd.to_numeric(df[nacional_col], errors='coerce')
-    df.dropna(subset=[nacional_col], inplace=True)
+        return df.iloc[0:0]
     df = df.rename(columns={nacional_col: 'NACIONAL'})
 
+    # Limpiar todas las columnas de volumen (departamentos y nacional):
+    # 'nd' queda como faltante y se enmascara en el ajuste.
+    columnas = [c for c in df.columns if c not in ('AÑO', 'MES')]
+    for col in columnas:
+        valores = df[col].astype(str).str.strip().replace('nd', '')
+        # remover puntos de miles de forma literal y normalizar coma decimal a punto
+        valores = valores.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        df[col] = pd.to_numeric(valores, errors='coerce')
+    df.dropna(subset=columnas, how='all', inplace=True)
+
 
 
     #======================================================================
@@ -133,29 +136,77 @@ def predecir_acopio():
 
 
 
-    # Crear columna "periodo" para numerar el tiempo
-    df = df.sort_values(by=['AÑO', 'MES_NUM'])
-    df['PERIODO'] = range(1, len(df) + 1)
+    return df
+
 
-    # Preparar datos para el modelo
-    X = df[['PERIODO']]
-    y = df['NACIONAL']
+def lectura_acopio():
+    """`ingesta.Lectura` del CSV de acopio limpio (relee sólo las filas agregadas).
 
-    # Entrenar modelo
-    modelo = LinearRegression()
-    modelo.fit(X, y)
+    Si la ruta principal no existe se usa la alternativa relativa a este
+    módulo; si ninguna existe se lanza excepción para que la vista la
+    gestione.
+    """
+    ruta = RUTA_ACOPIO if os.path.exists(RUTA_ACOPIO) else RUTA_ACOPIO_ALT
+    return ingesta.leer('acopio_modelo', ruta, _leer_csv, _limpiar)
 
-    # Predicción para los próximos 6 meses
-    ult_periodo = df['PERIODO'].max()
-    futuros = np.array(range(ult_periodo + 1, ult_periodo + 7)).reshape(-1, 1)
-    predicciones = modelo.predict(futuros)
-    # Calcular los meses futuros
-    ultimo_mes = int(df.iloc[-1]['MES_NUM'])
-    ultimo_año = int(df.iloc[-1]['AÑO'])
 
-    meses_futuros = []
-    mes_actual = ultimo_mes
-    año_actual = ultimo_año
+def _columnas(df):
+    return [c for c in df.columns if c not in ('AÑO', 'MES', 'MES_NUM')]
+
+
+def _matriz(df, columnas):
+    # Ordenar cronológicamente: (Y, máscara, años, meses) para AjusteLote
+    df = df.sort_values(by=['AÑO', 'MES_NUM'])
+    Y = df[columnas].to_numpy(dtype=float).T
+    return Y, ~np.isnan(Y), df['AÑO'].astype(int).to_numpy(), df['MES_NUM'].to_numpy()
+
+
+def pronostico_acopio(modelo):
+    """`AjusteLote` de todas las columnas de acopio con `modelo`, cacheado.
+
+    Ajusta en lote el pronosticador `modelo` sobre la columna nacional y
+    las de cada departamento, con bandas bootstrap hasta `HORIZONTE_MAX`.
+    Se mantiene un ajuste por modelo mientras el CSV no cambie; si sólo
+    se agregaron meses, se actualiza con las filas nuevas. Devuelve None
+    si el CSV no tiene columna nacional.
+    """
+    lectura = lectura_acopio()
+    columnas = _columnas(lectura.df)
+
+    def construir():
+        if 'NACIONAL' not in columnas:
+            return None
+        return AjusteLote(columnas, *_matriz(lectura.df, columnas),
+                          modelos={c: modelo for c in columnas}, horizonte_intervalos=HORIZONTE_MAX)
+
+    def extender(ajuste, desde):
+        nuevas = lectura.df.iloc[desde:]
+        if ajuste is None:
+            return None
+        ultimo = int((ajuste.anios * 12 + ajuste.meses).max()) if len(ajuste.anios) else -1
+        if int((nuevas['AÑO'].astype(int) * 12 + nuevas['MES_NUM']).min()) <= ultimo:
+            return None
+        return ajuste.extender(*_matriz(nuevas, columnas))
+
+    return cache_datos.memo_incremental(('acopio', 'departamentos', modelo), lectura, construir, extender)
+
+
+@medido('acopio.pronostico')
+def predecir_acopio(modelo=None, horizonte=HORIZONTE, departamento='NACIONAL'):
+    """Predecir el acopio de los `horizonte` meses siguientes (6 por defecto).
+
+    Devuelve un DataFrame con AÑO, MES, PREDICCION y las bandas de 80% y
+    95% (LIM_INF_80 ... LIM_SUP_95) para `departamento` (la serie
+    nacional por defecto). Sale del ajuste cacheado, sin reentrenar;
+    `modelo` fuerza 'lineal' o 'estacional'.
+    """
+    horizonte = validar_horizonte(horizonte)
+    ajuste = pronostico_acopio(modelo_para(departamento, modelo))
+    if ajuste is None:
+        return pd.DataFrame()
+    if departamento not in ajuste.columnas:
+        raise ValueError(f"❌ El departamento '{departamento}' no está en los datos de acopio.")
+    d = ajuste.columnas.index(departamento)
 
     meses = {
         1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL',
@@ -163,19 +214,17 @@ def predecir_acopio():
         9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
     }
 
-    for i in range(6):
-        mes_actual += 1
-        if mes_actual > 12:
-            mes_actual = 1
-            año_actual += 1
-        meses_futuros.append({
-            'AÑO': año_actual,
-            'MES': meses[mes_actual],
+    predicciones = ajuste.predecir(horizonte)[d]
+    bandas = ajuste.bandas(horizonte)
+    meses_futuros = []
+    for i, (año, mes) in enumerate(ajuste.periodos_futuros(horizonte)[d]):
+        fila = {
+            'AÑO': año,
+            'MES': meses[mes],
             'PREDICCION': float(predicciones[i])
-        })
-
-    
-        print("✅ Predicciones generadas:")
-        print(pd.DataFrame(meses_futuros))
+        }
+        for clave, valores in bandas.items():
+            fila[clave] = float(valores[d, i])
+        meses_futuros.append(fila)
 
-    return pd.DataFrame(meses_futuros)
\ No newline at end of file
+    return pd.DataFrame(meses_futuros)
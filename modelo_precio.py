@@ -1,7 +1,9 @@
 """Predicción y preprocesamiento de precios pagados al productor.
 
 Provee funciones para cargar y limpiar los CSV de precios, y generar
-predicciones tanto a nivel nacional como por departamento. El módulo
+predicciones tanto a nivel nacional como por departamento. Los ajustes
+(con sus bandas bootstrap) se guardan en `cache_datos` mientras el CSV
+no cambie, así que las vistas no reentrenan en cada petición. El módulo
 es tolerante a formatos locales (puntos como separador de miles,
 comas como decimales) y normaliza nombres de columnas.
 """
@@ -11,28 +13,25 @@ import numpy as np
 import os
 import unicodedata
 import re
-from sklearn.linear_model import LinearRegression
+from pronosticos import AjusteLote, modelo_para, validar_horizonte, HORIZONTE_MAX
+import cache_datos
+import ingesta
+from tiempos import medido
 
-def cargar_datos():
-    """
-    Carga y limpia los datos del archivo CSV.
-    Esta versión es más robusta para encontrar las columnas de Año y Mes.
-    """
-    rutas = [
-        os.path.join("DataSheet", "PRECIO_PAGADO_AL_PRODUCTOR_2_-_RES_0017_DE_2012.csv"),
-        os.path.join("DataSheet", "Precio Pagado al Productor - Res 0017 de 2012.csv")
-    ]
-    for ruta in rutas:
-        if os.path.exists(ruta):
-            try:
-                df = pd.read_csv(ruta, sep=";", encoding="latin-1", engine="python", on_bad_lines='warn')
-                break
-            except Exception as e:
-                print(f"Error al leer el archivo {ruta}: {e}")
-                continue
-    else:
-        raise FileNotFoundError("⚠️ No se encontró el archivo de precios en la carpeta DataSheet")
+RUTAS_PRECIOS = [
+    os.path.join("DataSheet", "PRECIO_PAGADO_AL_PRODUCTOR_2_-_RES_0017_DE_2012.csv"),
+    os.path.join("DataSheet", "Precio Pagado al Productor - Res 0017 de 2012.csv")
+]
+# Meses pronosticados por defecto en la vista
+HORIZONTE = 6
+
+
+def _leer_csv(buffer, dtype=None):
+    return pd.read_csv(buffer, sep=";", encoding="latin-1", engine="python", on_bad_lines='warn', dtype=dtype)
 
+
+def _limpiar(df):
+    """Normaliza columnas, convierte precios a número y agrega MES_NUM y FECHA."""
     def normalizar(col):
         col = col.strip().upper()
         col = unicodedata.normalize("NFKD", col).encode("ASCII", "ignore").decode("ASCII")
@@ -54,8 +53,7 @@ def cargar_datos():
     df["AÑO"] = pd.to_numeric(df["AÑO"], errors="coerce").astype("Int64")
     df.dropna(subset=["AÑO", "MES"], inplace=True)
 
-    columnas_excluidas = ["AÑO", "MES", "MES_NUM", "FECHA"]
-    departamentos = [c for c in df.columns if c not in columnas_excluidas]
+    departamentos = _departamentos(df)
 
     for col in departamentos:
         df[col] = (
@@ -79,98 +77,215 @@ def cargar_datos():
     df.dropna(subset=["MES_NUM"], inplace=True)
     df["MES_NUM"] = df["MES_NUM"].astype(int)
     df["FECHA"] = pd.to_datetime(df["AÑO"].astype(str) + "-" + df["MES_NUM"].astype(str) + "-01")
+    return df
 
-    return df, departamentos
 
-def predecir_precio_nacional():
-    """Entrena un modelo simple (regresión lineal) sobre la serie nacional
-    y devuelve un DataFrame con las predicciones para los próximos 6 meses
-    junto con un DataFrame de estadísticas resumen.
+def _departamentos(df):
+    columnas_excluidas = ["AÑO", "MES", "MES_NUM", "FECHA"]
+    return [c for c in df.columns if c not in columnas_excluidas]
+
+
+@medido('precio.csv')
+def lectura_precios():
+    """`ingesta.Lectura` del CSV de precios (sólo parsea las filas nuevas si el archivo creció)."""
+    for ruta in RUTAS_PRECIOS:
+        if os.path.exists(ruta):
+            try:
+                return ingesta.leer("precio", ruta, _leer_csv, _limpiar)
+            except KeyError:
+                raise
+            except Exception as e:
+                print(f"Error al leer el archivo {ruta}: {e}")
+                continue
+    raise FileNotFoundError("⚠️ No se encontró el archivo de precios en la carpeta DataSheet")
+
+
+@medido('precio.datos')
+def cargar_datos():
     """
-    df, departamentos = cargar_datos()
-    print(f"DEBUG: Datos cargados. Shape: {df.shape}")
+    Carga y limpia los datos del archivo CSV.
+    Esta versión es más robusta para encontrar las columnas de Año y Mes.
+    Devuelve una copia del DataFrame cacheado por `ingesta`, que sólo
+    relee las filas agregadas al final del archivo.
+    """
+    df = lectura_precios().df
+    return df.copy(), _departamentos(df)
 
-    df["NACIONAL"] = df[departamentos].mean(axis=1)
-    df = df.dropna(subset=["NACIONAL", "FECHA"]).sort_values("FECHA")
-    print(f"DEBUG: DataFrame para predicción nacional. Shape: {df.shape}")
-    print(f"DEBUG: Muestra de datos para predicción nacional:\n{df.head()}")
 
-    if df.empty:
-        print("🚨 ADVERTENCIA: El DataFrame para la predicción nacional está VACÍO. No se puede entrenar el modelo.")
-        # Devuelve un DataFrame vacío pero con las columnas correctas para que no falle el HTML
-        fechas_futuras = pd.date_range(start=pd.to_datetime('today'), periods=6, freq="MS")
-        df_predicciones = pd.DataFrame({"FECHA": fechas_futuras, "PREDICCION_NACIONAL": 0})
-        df_estadistica = pd.DataFrame()
-        return df_predicciones, df_estadistica
+def _filas_posteriores(ajuste, nuevas):
+    """True si todas las filas nuevas son posteriores al último mes del ajuste."""
+    if nuevas.empty:
+        return True
+    ultimo = int((ajuste.anios * 12 + ajuste.meses).max()) if len(ajuste.anios) else -1
+    return int((nuevas["AÑO"].astype(int) * 12 + nuevas["MES_NUM"]).min()) > ultimo
+
+def _matriz_series(df, columnas):
+    """Convierte las columnas de `df` en la matriz (D, T) que usan los pronosticadores.
+
+    Devuelve `(Y, mascara, años, meses)` con las filas ordenadas por FECHA;
+    la máscara marca los valores observados (no NaN).
+    """
+    df = df.sort_values("FECHA")
+    Y = df[columnas].to_numpy(dtype=float).T
+    return Y, ~np.isnan(Y), df["AÑO"].astype(int).to_numpy(), df["MES_NUM"].astype(int).to_numpy()
+
 
-    df["ORDEN"] = range(len(df))
-    X = df[["ORDEN"]]
-    y = df["NACIONAL"]
-    modelo = LinearRegression()
-    modelo.fit(X, y)
+def _fechas_futuras(periodos):
+    return pd.to_datetime([f"{a}-{m:02d}-01" for a, m in periodos])
 
-    ult_orden = df["ORDEN"].max()
-    fechas_futuras = pd.date_range(df["FECHA"].max() + pd.DateOffset(months=1), periods=6, freq="MS")
-    ordenes_futuras = np.arange(ult_orden + 1, ult_orden + 7).reshape(-1, 1)
-    predicciones = modelo.predict(ordenes_futuras)
 
-    df_predicciones = pd.DataFrame({
-        "FECHA": fechas_futuras,
-        "PREDICCION_NACIONAL": predicciones
+def _tabla_pronostico(ajuste, i, columna, horizonte=HORIZONTE):
+    """DataFrame FECHA / `columna` / bandas LIM_INF_80 ... LIM_SUP_95 para la serie `i`."""
+    tabla = pd.DataFrame({
+        "FECHA": _fechas_futuras(ajuste.periodos_futuros(horizonte)[i]),
+        columna: ajuste.predecir(horizonte)[i]
     })
+    for clave, valores in ajuste.bandas(horizonte).items():
+        tabla[clave] = valores[i]
+    return tabla
+
 
+def _estadistica(df, departamentos):
     df_melted = df.melt(id_vars=["AÑO", "MES", "FECHA"], value_vars=departamentos, var_name="DEPARTAMENTO", value_name="PRECIO").dropna()
+    if df_melted.empty:
+        return pd.DataFrame()
     idx_max = df_melted['PRECIO'].idxmax()
     idx_min = df_melted['PRECIO'].idxmin()
     max_info = df_melted.loc[idx_max]
     min_info = df_melted.loc[idx_min]
-    df_estadistica = pd.DataFrame([{
+    return pd.DataFrame([{
         "AÑO": max_info["AÑO"], "DEPTO_MAYOR_PRECIO": max_info["DEPARTAMENTO"], "MES_MAX": max_info["MES"], "PRECIO_MAX": max_info["PRECIO"],
         "DEPTO_MENOR_PRECIO": min_info["DEPARTAMENTO"], "MES_MIN": min_info["MES"], "PRECIO_MIN": min_info["PRECIO"]
     }])
 
-    return df_predicciones, df_estadistica
 
+def _combinar_estadistica(previa, nueva):
+    """Máximo y mínimo globales a partir de los de dos tramos (ante empate gana el anterior)."""
+    if previa.empty or nueva.empty:
+        return nueva if previa.empty else previa
+    salida = previa.copy()
+    a, b = previa.iloc[0], nueva.iloc[0]
+    if b["PRECIO_MAX"] > a["PRECIO_MAX"]:
+        for c in ("AÑO", "DEPTO_MAYOR_PRECIO", "MES_MAX", "PRECIO_MAX"):
+            salida.at[0, c] = b[c]
+    if b["PRECIO_MIN"] < a["PRECIO_MIN"]:
+        for c in ("DEPTO_MENOR_PRECIO", "MES_MIN", "PRECIO_MIN"):
+            salida.at[0, c] = b[c]
+    return salida
+
+
+def _serie_nacional(df, departamentos):
+    df = df.copy()
+    df["NACIONAL"] = df[departamentos].mean(axis=1)
+    return df.dropna(subset=["NACIONAL", "FECHA"]).sort_values("FECHA")
+
+
+@medido('precio.ajuste_nacional')
+def pronostico_nacional(modelo=None):
+    """Ajuste (con bandas) y estadísticas de la serie nacional, cacheados.
 
-def predecir_precio_departamento(departamento):
-    """Entrena un modelo por departamento y devuelve un DataFrame con
-    las predicciones para los próximos 6 meses. Si el departamento no
-    tiene datos suficientes, devuelve un DataFrame con ceros en las
-    predicciones para no romper la vista que las consume.
+    La serie nacional es el promedio de los departamentos. El resultado
+    se reutiliza mientras el CSV de precios no cambie y, si sólo se
+    agregaron meses, se extiende con las filas nuevas; devuelve un dict
+    {'ajuste': AjusteLote | None, 'estadistica': DataFrame}.
     """
-    df, departamentos = cargar_datos()
-    print(f"DEBUG: Datos cargados para depto {departamento}. Shape: {df.shape}")
+    modelo = modelo_para("NACIONAL", modelo)
+    lectura = lectura_precios()
+    departamentos = _departamentos(lectura.df)
 
-    if departamento not in departamentos:
-        raise ValueError(f"❌ El departamento '{departamento}' no está en los datos disponibles.")
+    def construir():
+        df = _serie_nacional(lectura.df, departamentos)
+        if df.empty:
+            return {"ajuste": None, "estadistica": pd.DataFrame()}
 
-    df_depto = df.dropna(subset=[departamento, "FECHA"]).sort_values("FECHA")
-    print(f"DEBUG: DataFrame para predicción de {departamento}. Shape: {df_depto.shape}")
-    print(f"DEBUG: Muestra de datos para predicción de {departamento}:\n{df_depto.head()}")
+        ajuste = AjusteLote(["NACIONAL"], *_matriz_series(df, ["NACIONAL"]),
+                            modelos={"NACIONAL": modelo}, horizonte_intervalos=HORIZONTE_MAX)
+        return {"ajuste": ajuste, "estadistica": _estadistica(df, departamentos)}
 
-    if df_depto.empty:
-        print(f"🚨 ADVERTENCIA: El DataFrame para la predicción de {departamento} está VACÍO. No se puede entrenar el modelo.")
-        # Devuelve un DataFrame vacío pero con las columnas correctas
-        fechas_futuras = pd.date_range(start=pd.to_datetime('today'), periods=6, freq="MS")
-        return pd.DataFrame({"FECHA": fechas_futuras, f"PREDICCION_{departamento}": 0})
+    def extender(previo, desde):
+        nuevas = _serie_nacional(lectura.df.iloc[desde:], departamentos)
+        if previo["ajuste"] is None or not _filas_posteriores(previo["ajuste"], nuevas):
+            return None
+        if nuevas.empty:
+            return previo
+        return {
+            "ajuste": previo["ajuste"].extender(*_matriz_series(nuevas, ["NACIONAL"])),
+            "estadistica": _combinar_estadistica(previo["estadistica"], _estadistica(nuevas, departamentos)),
+        }
 
-    df_depto["ORDEN"] = range(len(df_depto))
-    X = df_depto[["ORDEN"]]
-    y = df_depto[departamento]
-    modelo = LinearRegression()
-    modelo.fit(X, y)
+    return cache_datos.memo_incremental(("precio", "nacional", modelo), lectura, construir, extender)
 
-    ult_orden = df_depto["ORDEN"].max()
-    fechas_futuras = pd.date_range(df_depto["FECHA"].max() + pd.DateOffset(months=1), periods=6, freq="MS")
-    ordenes_futuras = np.arange(ult_orden + 1, ult_orden + 7).reshape(-1, 1)
-    predicciones = modelo.predict(ordenes_futuras)
 
-    df_predicciones = pd.DataFrame({
-        "FECHA": fechas_futuras,
-        f"PREDICCION_{departamento}": predicciones
-    })
+@medido('precio.pred_nacional')
+def predecir_precio_nacional(modelo=None, horizonte=HORIZONTE):
+    """Devuelve un DataFrame con las predicciones nacionales para los
+    próximos `horizonte` meses (6 por defecto, con bandas de 80% y 95%)
+    junto con un DataFrame de estadísticas resumen.
+
+    `modelo` permite forzar 'lineal' o 'estacional'; por defecto se usa
+    el configurado para 'NACIONAL' en `pronosticos`.
+    """
+    horizonte = validar_horizonte(horizonte)
+    resultado = pronostico_nacional(modelo)
+    if resultado["ajuste"] is None:
+        print("🚨 ADVERTENCIA: El DataFrame para la predicción nacional está VACÍO. No se puede entrenar el modelo.")
+        # Devuelve un DataFrame vacío pero con las columnas correctas para que no falle el HTML
+        fechas_futuras = pd.date_range(start=pd.to_datetime('today'), periods=horizonte, freq="MS")
+        df_predicciones = pd.DataFrame({"FECHA": fechas_futuras, "PREDICCION_NACIONAL": 0})
+        df_estadistica = pd.DataFrame()
+        return df_predicciones, df_estadistica
+
+    df_predicciones = _tabla_pronostico(resultado["ajuste"], 0, "PREDICCION_NACIONAL", horizonte)
+    return df_predicciones, resultado["estadistica"].copy()
+
+
+@medido('precio.ajuste_departamentos')
+def pronostico_departamentos(modelo):
+    """`AjusteLote` de todos los departamentos con `modelo`, con bandas y cacheado.
+
+    Se mantiene un ajuste por modelo (con bandas hasta `HORIZONTE_MAX`);
+    cada departamento toma del ajuste correspondiente al modelo que
+    tenga asignado. Si el CSV sólo creció, el ajuste se actualiza con
+    las filas nuevas en lugar de recalcularse.
+    """
+    lectura = lectura_precios()
+    departamentos = _departamentos(lectura.df)
+
+    def construir():
+        return AjusteLote(departamentos, *_matriz_series(lectura.df, departamentos),
+                          modelos={d: modelo for d in departamentos}, horizonte_intervalos=HORIZONTE_MAX)
+
+    def extender(ajuste, desde):
+        nuevas = lectura.df.iloc[desde:]
+        if not _filas_posteriores(ajuste, nuevas):
+            return None
+        return ajuste.extender(*_matriz_series(nuevas, departamentos))
+
+    return cache_datos.memo_incremental(("precio", "departamentos", modelo), lectura, construir, extender)
+
+
+@medido('precio.pred_departamento')
+def predecir_precio_departamento(departamento, modelo=None, horizonte=HORIZONTE):
+    """Predice los próximos `horizonte` meses (6 por defecto, con bandas
+    de 80% y 95%) para un departamento con el pronosticador que tenga
+    asignado (o `modelo` si se indica). Si el departamento no tiene
+    datos, devuelve un DataFrame con ceros en las predicciones para no
+    romper la vista que las consume.
+    """
+    horizonte = validar_horizonte(horizonte)
+    ajuste = pronostico_departamentos(modelo_para(departamento, modelo))
+
+    if departamento not in ajuste.columnas:
+        raise ValueError(f"❌ El departamento '{departamento}' no está en los datos disponibles.")
+
+    i = ajuste.columnas.index(departamento)
+    if ajuste.n_obs()[i] == 0:
+        print(f"🚨 ADVERTENCIA: El DataFrame para la predicción de {departamento} está VACÍO. No se puede entrenar el modelo.")
+        # Devuelve un DataFrame vacío pero con las columnas correctas
+        fechas_futuras = pd.date_range(start=pd.to_datetime('today'), periods=horizonte, freq="MS")
+        return pd.DataFrame({"FECHA": fechas_futuras, f"PREDICCION_{departamento}": 0})
 
-    return df_predicciones
+    return _tabla_pronostico(ajuste, i, f"PREDICCION_{departamento}", horizonte)
 
 def predecir_precio(departamento=None):
     if departamento:
@@ -8,12 +8,18 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from database import db
 from datetime import datetime
+import json
+
+
+# Claves primarias BIGINT en MySQL; en SQLite sólo INTEGER PRIMARY KEY es
+# autoincremental (alias de rowid), así que allí se usa INTEGER.
+BigIntPK = db.BigInteger().with_variant(db.Integer, 'sqlite')
 
 
 # Lookup para razas y departamentos (3FN)
 class Raza(db.Model):
     __tablename__ = 'razas'
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(BigIntPK, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
 
     def save(self):
@@ -24,7 +30,7 @@ class Raza(db.Model):
 
 class Departamento(db.Model):
     __tablename__ = 'departamentos'
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(BigIntPK, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
 
     def save(self):
@@ -39,7 +45,7 @@ class User(db.Model, UserMixin):
     Campos principales: id, name, email, password, is_admin.
     Métodos: set_password, check_password, save, y selectores estáticos.
     """
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(BigIntPK, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(256), unique=True, nullable=False)
     password = db.Column(db.String(128), nullable=False)
@@ -103,14 +109,36 @@ class User(db.Model, UserMixin):
         return User.query.filter_by(email=email).first()
 
 
+class UserSearchToken(db.Model):
+    """Índice de búsqueda de usuarios: un token normalizado por fila.
+
+    Los tokens (minúsculas, sin tildes) salen de los campos de texto del
+    usuario y los mantiene `busqueda_usuarios`; la PK (token, user_id)
+    permite buscar por prefijo con un rango sobre el índice.
+    """
+    __tablename__ = 'blog_user_tokens'
+    token = db.Column(db.String(60), primary_key=True)
+    user_id = db.Column(db.BigInteger, db.ForeignKey('blog_user.id'), primary_key=True, index=True)
+
+
+# Sentencias extra que cuesta cargar query, resumen y precios de una página
+# de consultas con `Consulta.detail_options()` (una por colección).
+DETAIL_STATEMENTS = 3
+
+
 class Consulta(db.Model):
-    __tablename__ = 'consultas'
     """Modelo para consultas de inversión guardadas por usuarios.
 
     `query_text` almacena el JSON de la solicitud y `summary` guarda
     metadatos/estimaciones precalculadas como JSON en texto.
     """
-    id = db.Column(db.BigInteger, primary_key=True)
+    __tablename__ = 'consultas'
+    # Índice compuesto para listar y recortar (FIFO) las consultas de un
+    # usuario en orden de creación sin recorrer la tabla completa.
+    __table_args__ = (
+        db.Index('ix_consultas_user_created', 'user_id', 'created_at'),
+    )
+    id = db.Column(BigIntPK, primary_key=True)
     user_id = db.Column(db.BigInteger, db.ForeignKey('blog_user.id'), nullable=False)
     titulo = db.Column(db.String(200), nullable=False)
     descripcion = db.Column(db.Text, nullable=True)
@@ -131,10 +159,98 @@ class Consulta(db.Model):
         db.session.commit()
 
     def delete(self):
-        """Elimina esta instancia de la base de datos y hace commit."""
-        db.session.delete(self)
+        """Elimina esta instancia (y sus filas normalizadas) y hace commit."""
+        Consulta.delete_many([self.id])
         db.session.commit()
 
+    @staticmethod
+    def page_for_user(user_id, limit, cursor=None, with_details=False):
+        """Página de consultas de `user_id`, más recientes primero (paginación keyset).
+
+        `cursor` es la tupla (created_at, id) de la última consulta de la
+        página anterior; se devuelven las `limit` siguientes. Con el índice
+        (user_id, created_at) cada página es un rango del índice, sin OFFSET.
+        Con `with_details` se cargan también query, resumen y precios de
+        toda la página en `DETAIL_STATEMENTS` sentencias adicionales.
+        """
+        q = Consulta.query.filter(Consulta.user_id == user_id)
+        if with_details:
+            q = q.options(*Consulta.detail_options())
+        if cursor is not None:
+            creada, cid = cursor
+            q = q.filter(db.or_(Consulta.created_at < creada,
+                                db.and_(Consulta.created_at == creada, Consulta.id < cid)))
+        return q.order_by(Consulta.created_at.desc(), Consulta.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def get_with_details(cid):
+        """(consulta, query_text, summary) de la consulta `cid` en una sola consulta SQL.
+
+        Une `consulta_queries` y `consulta_summaries` con LEFT JOIN; los
+        textos son None si la fila normalizada no existe (consultas
+        antiguas). Devuelve None si la consulta no existe.
+        """
+        fila = db.session.execute(
+            db.select(Consulta, ConsultaQuery.query_text, ConsultaSummary.summary)
+            .outerjoin(ConsultaQuery, ConsultaQuery.consulta_id == Consulta.id)
+            .outerjoin(ConsultaSummary, ConsultaSummary.consulta_id == Consulta.id)
+            .where(Consulta.id == cid)
+            .order_by(ConsultaSummary.id.desc(), ConsultaQuery.id.desc())
+            .limit(1)
+        ).first()
+        return tuple(fila) if fila is not None else None
+
+    @staticmethod
+    def surplus_ids(user_id, keep):
+        """Ids de las consultas de `user_id` más allá de las `keep` más recientes.
+
+        Recorre el índice (user_id, created_at) desde la más reciente, por
+        lo que sólo toca `keep` entradas más las sobrantes.
+        """
+        return db.session.execute(
+            db.select(Consulta.id)
+            .where(Consulta.user_id == user_id)
+            .order_by(Consulta.created_at.desc(), Consulta.id.desc())
+            .offset(keep)
+        ).scalars().all()
+
+    @staticmethod
+    def surplus_ids_many(keep_by_user):
+        """Como `surplus_ids` para varios usuarios a la vez ({user_id: keep}), en una sola consulta.
+
+        Numera las consultas de cada usuario de la más reciente a la más
+        antigua con ROW_NUMBER() (MySQL 8+, SQLite 3.25+).
+        """
+        if not keep_by_user:
+            return []
+        numeradas = db.select(
+            Consulta.id, Consulta.user_id,
+            db.func.row_number().over(
+                partition_by=Consulta.user_id,
+                order_by=(Consulta.created_at.desc(), Consulta.id.desc()),
+            ).label('n'),
+        ).where(Consulta.user_id.in_(list(keep_by_user))).subquery()
+        filas = db.session.execute(
+            db.select(numeradas.c.id, numeradas.c.user_id, numeradas.c.n)
+            .where(numeradas.c.n > min(keep_by_user.values()))
+        ).all()
+        return [cid for cid, uid, n in filas if n > keep_by_user[uid]]
+
+    @staticmethod
+    def delete_many(ids):
+        """Elimina las consultas `ids` y sus filas hijas con un DELETE por tabla.
+
+        No hace commit: pensado para usarse dentro de una transacción más
+        amplia (p. ej. la política FIFO de `guardar_consulta`). Las tablas
+        hijas no tienen ON DELETE CASCADE, por eso se borran primero.
+        """
+        ids = list(ids)
+        if not ids:
+            return
+        for modelo in (ConsultaPrecio, ConsultaSummary, ConsultaQuery):
+            db.session.execute(db.delete(modelo).where(modelo.consulta_id.in_(ids)))
+        db.session.execute(db.delete(Consulta).where(Consulta.id.in_(ids)))
+
     def __repr__(self):
         return f'<Consulta {self.id} - {self.titulo}>'
 
@@ -146,10 +262,48 @@ class Consulta(db.Model):
 
     raza_rel = db.relationship('Raza', backref=db.backref('consultas', lazy='dynamic'))
 
+    # Colecciones de sólo lectura para carga anticipada (selectinload). Las
+    # relaciones `queries`/`summaries`/`precios` son dinámicas (una consulta
+    # SQL por acceso) y no admiten carga anticipada; éstas sí.
+    query_rows = db.relationship('ConsultaQuery', viewonly=True, order_by='ConsultaQuery.id')
+    summary_rows = db.relationship('ConsultaSummary', viewonly=True, order_by='ConsultaSummary.id')
+    precio_rows = db.relationship('ConsultaPrecio', viewonly=True, order_by='ConsultaPrecio.id')
+
+    @staticmethod
+    def detail_options():
+        """Opciones de carga para traer query, resumen y precios de varias consultas.
+
+        Con `selectinload` el número de sentencias es fijo (una por
+        colección) sin importar cuántas consultas tenga la página.
+        """
+        return (
+            db.selectinload(Consulta.query_rows),
+            db.selectinload(Consulta.summary_rows),
+            db.selectinload(Consulta.precio_rows),
+        )
+
+    @property
+    def query_data(self):
+        """Payload JSON de la consulta (tabla normalizada o columna heredada), o None."""
+        texto = self.query_rows[-1].query_text if self.query_rows else self.query_text
+        try:
+            return json.loads(texto) if texto else None
+        except Exception:
+            return None
+
+    @property
+    def summary_data(self):
+        """Resumen (prod_info) guardado de la consulta, o None."""
+        texto = self.summary_rows[-1].summary if self.summary_rows else self.summary
+        try:
+            return json.loads(texto) if texto else None
+        except Exception:
+            return None
+
 
 class ConsultaQuery(db.Model):
     __tablename__ = 'consulta_queries'
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(BigIntPK, primary_key=True)
     consulta_id = db.Column(db.BigInteger, db.ForeignKey('consultas.id'), nullable=False)
     query_text = db.Column(db.Text, nullable=True)
 
@@ -163,7 +317,7 @@ class ConsultaQuery(db.Model):
 
 class ConsultaSummary(db.Model):
     __tablename__ = 'consulta_summaries'
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(BigIntPK, primary_key=True)
     consulta_id = db.Column(db.BigInteger, db.ForeignKey('consultas.id'), nullable=False)
     summary = db.Column(db.Text, nullable=True)
 
@@ -177,7 +331,7 @@ class ConsultaSummary(db.Model):
 
 class ConsultaPrecio(db.Model):
     __tablename__ = 'consulta_precios'
-    id = db.Column(db.BigInteger, primary_key=True)
+    id = db.Column(BigIntPK, primary_key=True)
     consulta_id = db.Column(db.BigInteger, db.ForeignKey('consultas.id'), nullable=False)
     departamento = db.Column(db.String(120), nullable=True)
     departamento_id = db.Column(db.BigInteger, db.ForeignKey('departamentos.id'), nullable=True)
@@ -0,0 +1,139 @@
+"""Registro de consultas SQL lentas y tiempo de BD por endpoint.
+
+Reemplaza el logger `sqlalchemy.engine` en nivel INFO (que formateaba y
+escribía cada sentencia con sus parámetros) por dos eventos del engine
+que sólo miden la duración de cada sentencia. Se escribe en el log
+`sql` únicamente:
+
+- las sentencias que tardan al menos `UMBRAL_LENTA_MS` milisegundos
+  (variable de entorno `SQL_LENTA_MS`, 200 por defecto), y
+- una fracción `MUESTREO` de las demás (`SQL_MUESTREO`, 0 por defecto;
+  p. ej. 0.01 registra una de cada cien).
+
+Además se acumulan por endpoint las peticiones, sentencias y segundos de
+BD, visibles en `/admin/sql` (sólo administradores). Con
+`SQL_LOG_COMPLETO=1` se vuelve al log completo de SQLAlchemy para
+depurar en local.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import Blueprint, g, has_request_context, jsonify, request
+from flask_login import login_required, current_user
+from sqlalchemy import event
+
+from database import db
+
+
+UMBRAL_LENTA_MS = float(os.environ.get('SQL_LENTA_MS', '200'))
+MUESTREO = float(os.environ.get('SQL_MUESTREO', '0'))
+LOG_COMPLETO = os.environ.get('SQL_LOG_COMPLETO') == '1'
+# Caracteres de la sentencia que se escriben en el log
+LARGO_SENTENCIA = 500
+
+logger = logging.getLogger('sql')
+monitor_sql_bp = Blueprint('monitor_sql', __name__)
+
+_LOCK = threading.Lock()
+# endpoint -> {'peticiones', 'sentencias', 'segundos', 'lentas', 'max_sentencias'}
+_POR_ENDPOINT = {}
+_INSTALADO = set()
+
+
+def _endpoint():
+    if not has_request_context():
+        return '(sin petición)'
+    return request.endpoint or request.path
+
+
+def _antes(conn, cursor, sentencia, parametros, contexto, executemany):
+    conn.info.setdefault('monitor_sql_inicio', []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, sentencia, parametros, contexto, executemany):
+    pila = conn.info.get('monitor_sql_inicio')
+    if not pila:
+        return
+    segundos = time.perf_counter() - pila.pop()
+    lenta = segundos * 1000 >= UMBRAL_LENTA_MS
+    if has_request_context():
+        g.sql_sentencias = g.get('sql_sentencias', 0) + 1
+        g.sql_segundos = g.get('sql_segundos', 0.0) + segundos
+        g.sql_lentas = g.get('sql_lentas', 0) + (1 if lenta else 0)
+    else:
+        _acumular('(sin petición)', 1, segundos, 1 if lenta else 0, peticion=False)
+    if lenta or (MUESTREO > 0 and random.random() < MUESTREO):
+        logger.warning('%s %.1fms endpoint=%s filas=%s%s: %s',
+                       'lenta' if lenta else 'muestra', segundos * 1000, _endpoint(),
+                       cursor.rowcount, ' (executemany)' if executemany else '',
+                       ' '.join(sentencia.split())[:LARGO_SENTENCIA])
+
+
+def _error(contexto):
+    # la sentencia falló: descartar su inicio para no desalinear la pila
+    conn = contexto.connection
+    if conn is not None and conn.info.get('monitor_sql_inicio'):
+        conn.info['monitor_sql_inicio'].pop()
+
+
+def _acumular(endpoint, sentencias, segundos, lentas, peticion=True):
+    with _LOCK:
+        e = _POR_ENDPOINT.setdefault(endpoint, {'peticiones': 0, 'sentencias': 0, 'segundos': 0.0,
+                                                'lentas': 0, 'max_sentencias': 0})
+        e['peticiones'] += 1 if peticion else 0
+        e['sentencias'] += sentencias
+        e['segundos'] += segundos
+        e['lentas'] += lentas
+        e['max_sentencias'] = max(e['max_sentencias'], sentencias)
+
+
+def _fin_peticion(exc=None):
+    _acumular(_endpoint(), g.pop('sql_sentencias', 0), g.pop('sql_segundos', 0.0), g.pop('sql_lentas', 0))
+
+
+def instalar(app):
+    """Engancha los eventos al engine de `app` y el conteo por petición. Idempotente."""
+    if LOG_COMPLETO:
+        logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+    with app.app_context():
+        engine = db.engine
+    if id(engine) in _INSTALADO:
+        return
+    _INSTALADO.add(id(engine))
+    event.listen(engine, 'before_cursor_execute', _antes)
+    event.listen(engine, 'after_cursor_execute', _despues)
+    event.listen(engine, 'handle_error', _error)
+    app.teardown_request(_fin_peticion)
+
+
+def estadisticas():
+    """Copia de los acumulados por endpoint, ordenados por tiempo de BD."""
+    with _LOCK:
+        filas = {k: dict(v) for k, v in _POR_ENDPOINT.items()}
+    for v in filas.values():
+        v['segundos'] = round(v['segundos'], 4)
+        v['media_sentencias'] = round(v['sentencias'] / v['peticiones'], 2) if v['peticiones'] else None
+    return dict(sorted(filas.items(), key=lambda kv: kv[1]['segundos'], reverse=True))
+
+
+def reiniciar():
+    """Pone a cero los acumulados."""
+    with _LOCK:
+        _POR_ENDPOINT.clear()
+
+
+@monitor_sql_bp.route('/admin/sql')
+@login_required
+def admin_sql():
+    """Sentencias y tiempo de BD por endpoint desde el arranque del worker (JSON)."""
+    if not (current_user.email == 'admin@example.com' or getattr(current_user, 'is_admin', False)):
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify({
+        'umbral_lenta_ms': UMBRAL_LENTA_MS,
+        'muestreo': MUESTREO,
+        'endpoints': estadisticas(),
+    })
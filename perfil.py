@@ -7,19 +7,30 @@ de otros módulos pesados se realizan de forma perezosa dentro de las funciones
 para evitar dependencias circulares en tiempo de importación.
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, abort, jsonify
 from flask_login import login_required, current_user
 
 from models import User, Consulta
+import busqueda_usuarios
+import importar_consultas
+from razas import estimar_produccion
 from database import db
 import json
 from datetime import datetime, timedelta
 import os
 import unicodedata
 from sqlalchemy import or_
+from sqlalchemy.orm.attributes import flag_modified
 
 perfil_bp = Blueprint('perfil', __name__)
 
+# Máximo de consultas guardadas por usuario (política FIFO en guardar_consulta)
+MAX_CONSULTAS_USUARIO = 10
+# Consultas por página en /mis-consultas
+CONSULTAS_POR_PAGINA = 10
+# Usuarios por página en /admin/users
+USUARIOS_POR_PAGINA = 50
+
 
 @perfil_bp.route('/perfil', methods=['GET', 'POST'])
 @login_required
@@ -117,6 +128,9 @@ def suscripcion():
                 else:
                     current_user.role = 'free'
                     current_user.subscription_expires = None
+                # el rol pudo estar degradado sólo en memoria (ver `suscripciones`):
+                # escribirlo siempre para que la BD quede igual a lo que ve el usuario
+                flag_modified(current_user, 'role')
                 db.session.commit()
                 flash('Plan actualizado correctamente.', 'success')
             elif action == 'renew':
@@ -129,6 +143,7 @@ def suscripcion():
                 # si era free y renueva, no cambiar role a menos que especificado
                 if current_user.role == 'free' and selected in ('pago1','pago2'):
                     current_user.role = selected
+                flag_modified(current_user, 'role')
                 db.session.commit()
                 flash('Suscripción renovada por 30 días.', 'success')
         except Exception:
@@ -151,9 +166,32 @@ def mis_consultas():
         flash('Tu plan no permite acceder a Mis Consultas. Actualiza tu suscripción.', 'danger')
         return redirect(url_for('perfil.perfil'))
 
-    # Recuperar consultas del usuario
-    consultas_guardadas = Consulta.query.filter_by(user_id=current_user.id).order_by(Consulta.created_at.desc()).all()
-    return render_template('mis_consultas.html', consultas=consultas_guardadas)
+    # Recuperar una página de consultas del usuario (keyset: ?antes=<fecha>|<id>)
+    cursor = _leer_cursor(request.args.get('antes'))
+    filas = Consulta.page_for_user(current_user.id, CONSULTAS_POR_PAGINA + 1, cursor)
+    consultas_guardadas = filas[:CONSULTAS_POR_PAGINA]
+    siguiente = None
+    if len(filas) > CONSULTAS_POR_PAGINA:
+        siguiente = _cursor_de(consultas_guardadas[-1])
+    total = Consulta.query.filter_by(user_id=current_user.id).count()
+    return render_template('mis_consultas.html', consultas=consultas_guardadas, total=total,
+                           siguiente=siguiente, paginado=cursor is not None)
+
+
+def _cursor_de(consulta):
+    """Cursor de paginación 'fecha|id' a partir de una consulta."""
+    return f"{consulta.created_at.isoformat()}|{consulta.id}"
+
+
+def _leer_cursor(valor):
+    """Convierte 'fecha|id' en (datetime, id); None si falta o es inválido."""
+    if not valor:
+        return None
+    try:
+        fecha, cid = valor.rsplit('|', 1)
+        return datetime.fromisoformat(fecha), int(cid)
+    except (ValueError, TypeError):
+        return None
 
 
 @perfil_bp.route('/mis-consultas/nueva', methods=['GET', 'POST'])
@@ -183,147 +221,52 @@ def guardar_consulta():
     descripcion = request.form.get('descripcion', '').strip()
     query_raw = request.form.get('query', '').strip()
 
-    if not query_raw:
-        flash('No se recibieron datos para guardar la consulta.', 'danger')
-        return redirect(request.referrer or url_for('inversion.inversion'))
-
-    # validar JSON
+    # validar JSON (mismas reglas que la importación masiva, ver importar_consultas)
     try:
-        payload = json.loads(query_raw)
-    except Exception:
-        flash('Formato de datos inválido. Asegúrate de enviar JSON válido.', 'danger')
+        payload = importar_consultas.leer_payload(query_raw)
+    except importar_consultas.ConsultaInvalida as e:
+        flash(str(e), 'danger')
         return redirect(request.referrer or url_for('inversion.inversion'))
 
-    # autogenerar título si falta
-    if not titulo:
-        raza = payload.get('raza') or 'SinRaza'
-        nv = payload.get('num_vacas') or payload.get('numVacas') or ''
-        titulo = f"Consulta inversión - {raza} - {nv}"
+    # título autogenerado si falta, campos atómicos y precios por departamento
+    campos, precios = importar_consultas.campos_consulta(payload, titulo, descripcion)
 
-    # --- construir prod_info similar a la vista de ver_consulta ---
-    prod_info = None
+    # --- construir prod_info (estimación de producción) que se guarda en ConsultaSummary ---
+    prod_info = estimar_produccion(payload)
+
+    # crear objeto Consulta y persistir (con control de máximo 10 consultas por usuario).
+    # Todo ocurre en una sola transacción: la política FIFO, la consulta y sus
+    # filas normalizadas se confirman juntas con un único commit, o no se
+    # guarda nada si algo falla.
     try:
-        # Importar estadísticas de razas localmente. Si no están disponibles,
-        # usamos un diccionario vacío (no es crítico para guardar la consulta).
-        try:
-            from inversion import BREED_STATS
-        except Exception:
-            BREED_STATS = {}
-        raza = (payload.get('raza') or '').strip() if payload.get('raza') else None
-        num_vacas = payload.get('num_vacas') or payload.get('numVacas') or None
-        try:
-            nv = int(num_vacas) if num_vacas is not None else None
-        except Exception:
-            nv = None
+        from models import ConsultaQuery, ConsultaSummary, ConsultaPrecio
 
-        litros_por_vaca = None
-        if raza:
-            bkey = next((k for k in BREED_STATS.keys() if str(k).strip().lower() == raza.strip().lower()), None)
-            bstats = BREED_STATS.get(bkey) if bkey else BREED_STATS.get(raza) or BREED_STATS.get(raza.strip())
-            if bstats:
-                try:
-                    litros_por_vaca = float(bstats.get('avg', 0.0))
-                except Exception:
-                    litros_por_vaca = None
-
-        if litros_por_vaca and nv:
-            litros_diario_total = litros_por_vaca * nv
-            litros_mensual_total = litros_diario_total * 30
-            litros_por_vaca_mensual = litros_por_vaca * 30
-
-            precios = payload.get('precios_departamentos') or []
-            deptos = []
-            if isinstance(precios, list):
-                for p in precios:
-                    dept = p.get('departamento') or ''
-                    precio_val = None
-                    try:
-                        precio_val = float(p.get('precio')) if p.get('precio') is not None else None
-                    except Exception:
-                        precio_val = None
-                    deptos.append({'departamento': dept, 'precio': precio_val})
-
-            prod_info = {
-                'litros_diario_total': litros_diario_total,
-                'litros_mensual_total': litros_mensual_total,
-                'litros_por_vaca_diario': litros_por_vaca,
-                'litros_por_vaca_mensual': litros_por_vaca_mensual,
-                'por_departamento': deptos
-            }
-    except Exception:
-        # Si ocurre algún error al calcular prod_info, continuamos sin la estimación
-        prod_info = None
+        # Política FIFO: conservar las 9 más recientes (más la nueva = 10).
+        # Una sola consulta (sobre el índice user_id, created_at) devuelve
+        # los ids sobrantes y se borran con un DELETE por tabla.
+        Consulta.delete_many(Consulta.surplus_ids(current_user.id, MAX_CONSULTAS_USUARIO - 1))
 
-    # crear objeto Consulta y persistir (con control de máximo 10 consultas por usuario)
-    try:
-        # Política FIFO: eliminar consultas antiguas si el usuario tiene >=10
-        existing_count = Consulta.query.filter_by(user_id=current_user.id).count()
-        if existing_count >= 10:
-            to_remove = existing_count - 9
-            oldest = Consulta.query.filter_by(user_id=current_user.id).order_by(Consulta.created_at.asc()).limit(to_remove).all()
-            for o in oldest:
-                o.delete()
-
-        # Extraer campos atómicos desde el payload para normalizar
-        raza_val = None
-        nv_val = None
-        litros_vaca = None
-        try:
-            raza_val = payload.get('raza') or payload.get('Raza') or None
-            nv_val = payload.get('num_vacas') or payload.get('numVacas') or None
-            if nv_val is not None:
-                try:
-                    nv_val = int(nv_val)
-                except Exception:
-                    nv_val = None
-            # intentar extraer litros_por_vaca si viene en payload
-            litros_vaca = payload.get('litros_por_vaca') or payload.get('litrosPorVaca') or None
-            if litros_vaca is not None:
-                try:
-                    litros_vaca = float(litros_vaca)
-                except Exception:
-                    litros_vaca = None
-        except Exception:
-            raza_val = nv_val = litros_vaca = None
-
-        c = Consulta(
-            user_id=current_user.id,
-            titulo=titulo,
-            descripcion=descripcion,
-            raza=raza_val,
-            num_vacas=nv_val,
-            litros_por_vaca=litros_vaca,
-        )
-        c.save()
+        c = Consulta(user_id=current_user.id, **campos)
+        db.session.add(c)
+        # flush (sin commit) para obtener el id que usan las tablas hijas
+        db.session.flush()
 
         # Guardar query_text y summary en tablas normalizadas
-        from models import ConsultaQuery, ConsultaSummary, ConsultaPrecio
-        q = ConsultaQuery(consulta_id=c.id, query_text=json.dumps(payload, ensure_ascii=False))
-        q.save()
+        db.session.add(ConsultaQuery(consulta_id=c.id, query_text=json.dumps(payload, ensure_ascii=False)))
         if prod_info is not None:
-            s = ConsultaSummary(consulta_id=c.id, summary=json.dumps(prod_info, ensure_ascii=False))
-            s.save()
-
-        # Guardar precios por departamento en tabla normalizada
-        precios = payload.get('precios_departamentos') or payload.get('precios') or []
-        if isinstance(precios, list):
-            for p in precios:
-                dept = p.get('departamento') or p.get('departamento') or ''
-                precio_val = None
-                try:
-                    precio_val = float(p.get('precio')) if p.get('precio') is not None else None
-                except Exception:
-                    precio_val = None
-                cp = ConsultaPrecio(consulta_id=c.id, departamento=dept, precio=precio_val)
-                try:
-                    cp.save()
-                except Exception:
-                    # si falla una fila, continuamos con las demás
-                    pass
+            db.session.add(ConsultaSummary(consulta_id=c.id, summary=json.dumps(prod_info, ensure_ascii=False)))
+
+        # Guardar precios por departamento en tabla normalizada (un solo INSERT multi-fila)
+        filas_precios = [dict(p, consulta_id=c.id) for p in precios]
+        if filas_precios:
+            db.session.execute(db.insert(ConsultaPrecio), filas_precios)
+        db.session.commit()
         flash('Consulta guardada correctamente.', 'success')
         return redirect(url_for('perfil.mis_consultas'))
     except Exception:
-        # Si la persistencia falla, mostramos un mensaje y redirigimos.
+        # Si la persistencia falla, deshacemos la transacción completa,
+        # mostramos un mensaje y redirigimos.
+        db.session.rollback()
         try:
             import traceback, os
             log_dir = os.path.join(os.path.dirname(__file__), 'instance')
@@ -337,6 +280,26 @@ def guardar_consulta():
         return redirect(request.referrer or url_for('inversion.inversion'))
 
 
+@perfil_bp.route('/mis-consultas/importar', methods=['POST'])
+@login_required
+def importar_mis_consultas():
+    """Importar consultas del usuario actual desde JSON-lines (respuesta JSON).
+
+    El cuerpo de la petición es el archivo (una consulta por línea) o se
+    sube como campo `archivo` de un formulario multipart. Se aplican las
+    mismas validaciones y la misma política FIFO que en `guardar_consulta`
+    (ver importar_consultas).
+    """
+    archivo = request.files.get('archivo')
+    # se lee línea a línea, sin cargar el cuerpo completo en memoria
+    lineas = archivo.stream if archivo else request.stream
+    resumen = importar_consultas.importar(lineas, MAX_CONSULTAS_USUARIO, usuario_fijo=current_user.id)
+    codigo = 200 if resumen['importadas'] or not resumen['leidas'] else 400
+    if resumen['lotes_fallidos']:
+        codigo = 500
+    return jsonify(resumen), codigo
+
+
 @perfil_bp.route('/mis-consultas/<int:cid>/editar', methods=['GET', 'POST'])
 @login_required
 def editar_consulta(cid):
@@ -372,79 +335,44 @@ def eliminar_consulta(cid):
 def ver_consulta(cid):
     """Mostrar una consulta guardada y su estimación de producción.
 
-    Solo el propietario puede ver la consulta. Se parsea el JSON
-    almacenado y se intenta calcular una estimación de producción
-    basada en estadística de razas (si está disponible).
+    Solo el propietario puede ver la consulta. La consulta, su JSON y el
+    resumen guardado (`ConsultaSummary`) se leen con un solo SELECT; la
+    estimación sólo se recalcula para consultas antiguas sin resumen.
     """
-    c = Consulta.query.get_or_404(cid)
+    fila = Consulta.get_with_details(cid)
+    if fila is None:
+        abort(404)
+    c, query_text, summary_text = fila
     if c.user_id != current_user.id:
         flash('No tienes permiso para ver esta consulta.', 'danger')
         return redirect(url_for('perfil.mis_consultas'))
-    # Parsear el JSON almacenado para pasar datos ya procesados a la plantilla
+    # Parsear el JSON almacenado (tabla normalizada o columna heredada)
     consulta_data = None
-    if c.query_text:
+    texto = query_text or c.query_text
+    if texto:
         try:
-            consulta_data = json.loads(c.query_text)
+            consulta_data = json.loads(texto)
         except Exception:
             consulta_data = None
-    # Calcular estimación de producción y de ventas
+
+    # La estimación se guarda al crear la consulta; sólo las filas antiguas
+    # sin resumen se recalculan, y el resultado se guarda para la próxima vez.
     prod_info = None
-    try:
-        # Importar estadísticas de razas localmente; si no están disponibles,
-        # la estimación de producción se omite.
+    summary_text = summary_text or c.summary
+    if summary_text:
         try:
-            from inversion import BREED_STATS
+            prod_info = json.loads(summary_text)
         except Exception:
-            BREED_STATS = {}
-        if consulta_data:
-            raza = (consulta_data.get('raza') or '').strip() if consulta_data.get('raza') else None
-            num_vacas = consulta_data.get('num_vacas') or consulta_data.get('numVacas') or None
+            prod_info = None
+    elif consulta_data:
+        prod_info = estimar_produccion(consulta_data)
+        if prod_info is not None:
             try:
-                nv = int(num_vacas) if num_vacas is not None else None
+                from models import ConsultaSummary
+                db.session.add(ConsultaSummary(consulta_id=c.id, summary=json.dumps(prod_info, ensure_ascii=False)))
+                db.session.commit()
             except Exception:
-                nv = None
-
-            # tomar valor promedio por vaca si existe en BREED_STATS
-            litros_por_vaca = None
-            if raza:
-                bkey = next((k for k in BREED_STATS.keys() if str(k).strip().lower() == raza.strip().lower()), None)
-                bstats = BREED_STATS.get(bkey) if bkey else BREED_STATS.get(raza) or BREED_STATS.get(raza.strip())
-                if bstats:
-                    try:
-                        litros_por_vaca = float(bstats.get('avg', 0.0))
-                    except Exception:
-                        litros_por_vaca = None
-
-            if litros_por_vaca and nv:
-                # estimaciones
-                litros_diario_total = litros_por_vaca * nv
-                litros_mensual_total = litros_diario_total * 30
-                litros_por_vaca_mensual = litros_por_vaca * 30
-
-                # preparar lista de precios por departamento si están presentes
-                precios = consulta_data.get('precios_departamentos') or []
-                deptos = []
-                if isinstance(precios, list):
-                    for p in precios:
-                        dept = p.get('departamento') or ''
-                        precio_val = None
-                        try:
-                            precio_val = float(p.get('precio')) if p.get('precio') is not None else None
-                        except Exception:
-                            precio_val = None
-                        deptos.append({'departamento': dept, 'precio': precio_val})
-
-                prod_info = {
-                    'litros_diario_total': litros_diario_total,
-                    'litros_mensual_total': litros_mensual_total,
-                    'litros_por_vaca_diario': litros_por_vaca,
-                    'litros_por_vaca_mensual': litros_por_vaca_mensual,
-                    'por_departamento': deptos
-                }
-            else:
-                prod_info = None
-    except Exception:
-        prod_info = None
+                db.session.rollback()
 
     return render_template('mis_consulta_view.html', consulta=c, consulta_data=consulta_data, prod_info=prod_info)
 
@@ -461,28 +389,54 @@ def admin_users():
         flash('No tienes permiso para acceder a la administración.', 'danger')
         return redirect(url_for('perfil.perfil'))
 
-    # Soporta buscador por cualquier campo (parámetro GET `q`)
+    # Buscador indexado (parámetro GET `q`, ver busqueda_usuarios) con
+    # paginación keyset por id (`despues=<id>`)
     q = (request.args.get('q') or '').strip()
+    despues = request.args.get('despues', type=int)
+    limite = USUARIOS_POR_PAGINA + 1
     if q:
-        pattern = f"%{q}%"
-        filters = [
-            User.name.ilike(pattern),
-            User.email.ilike(pattern),
-            User.tipo_documento.ilike(pattern),
-            User.numero_documento.ilike(pattern),
-            User.primer_nombre.ilike(pattern),
-            User.segundo_nombre.ilike(pattern),
-            User.primer_apellido.ilike(pattern),
-            User.segundo_apellido.ilike(pattern),
-            User.telefono.ilike(pattern),
-            User.direccion.ilike(pattern),
-            User.role.ilike(pattern),
-        ]
-        users = User.query.filter(or_(*filters)).order_by(User.id.asc()).all()
+        consulta_ids = busqueda_usuarios.ids_pagina(q, despues, limite)
+        if consulta_ids is None:
+            users = []
+        else:
+            try:
+                ids = db.session.execute(consulta_ids).scalars().all()
+                users = db.session.execute(busqueda_usuarios.listado(ids)).all() if ids else []
+            except Exception:
+                # índice aún no creado (falta ejecutar seed_db.py): búsqueda lenta como respaldo
+                db.session.rollback()
+                try:
+                    import traceback
+                    log_dir = os.path.join(os.path.dirname(__file__), 'instance')
+                    os.makedirs(log_dir, exist_ok=True)
+                    with open(os.path.join(log_dir, 'busqueda_usuarios_error.log'), 'a', encoding='utf-8') as f:
+                        f.write(f"--- {datetime.utcnow().isoformat()} ---\n")
+                        f.write(traceback.format_exc())
+                except Exception:
+                    pass
+                pattern = f"%{q}%"
+                filters = [getattr(User, campo).ilike(pattern) for campo in busqueda_usuarios.CAMPOS + ('role',)]
+                consulta = busqueda_usuarios.listado(despues=despues, limite=limite).where(or_(*filters))
+                users = db.session.execute(consulta).all()
     else:
-        users = User.query.order_by(User.id.asc()).all()
+        # sólo las columnas de la tabla, una página por id
+        users = db.session.execute(busqueda_usuarios.listado(despues=despues, limite=limite)).all()
+
+    siguiente = None
+    if len(users) > USUARIOS_POR_PAGINA:
+        users = users[:USUARIOS_POR_PAGINA]
+        siguiente = users[-1].id
+
+    # total de usuarios registrados (cacheado; estimado en MySQL)
+    total, total_aproximado = None, False
+    if not q:
+        try:
+            total, total_aproximado = busqueda_usuarios.total_usuarios(db.session.connection())
+        except Exception:
+            db.session.rollback()
 
-    return render_template('admin_users.html', users=users, q=q)
+    return render_template('admin_users.html', users=users, q=q, siguiente=siguiente,
+                           paginado=despues is not None, total=total, total_aproximado=total_aproximado)
 
 
 @perfil_bp.route('/admin/users/<int:uid>/change-password', methods=['POST'])
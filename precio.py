@@ -12,7 +12,10 @@ import matplotlib
 # Solucionamos el warning de Matplotlib
 matplotlib.use('Agg') 
 import matplotlib.pyplot as plt
-from modelo_precio import predecir_precio_nacional, predecir_precio_departamento, cargar_datos
+from modelo_precio import predecir_precio_nacional, predecir_precio_departamento, cargar_datos, lectura_precios
+import cache_datos
+from pronosticos import PRONOSTICADORES, modelo_para
+from tiempos import medido
 
 precio_bp = Blueprint('precio', __name__, template_folder='templates')
 
@@ -20,6 +23,57 @@ precio_bp = Blueprint('precio', __name__, template_folder='templates')
 # (pandas + matplotlib). Mantener la lógica en la vista centralizada facilita
 # gestionar errores y capturar excepciones para no romper el servidor.
 
+@medido('precio.resumen_anual')
+def resumen_anual(anio):
+    """Estadísticas y gráfica (base64) de precios de `anio`, cacheadas.
+
+    Devuelve un dict con las claves de contexto de la plantilla
+    (depto_mayor, precio_max, depto_menor, precio_min, grafico) o None
+    si no hay datos del año. Se recalcula sólo cuando llegan filas de
+    ese año al CSV (ver `ingesta`).
+    """
+    lectura = lectura_precios()
+    return cache_datos.memo(("precio", "anual", int(anio)), cache_datos.firma_anio(lectura, anio),
+                            lambda: _calcular_resumen_anual(lectura.df, anio))
+
+
+def _calcular_resumen_anual(df, anio_sel):
+    departamentos = [c for c in df.columns if c not in ("AÑO", "MES", "MES_NUM", "FECHA")]
+    df_anio = df[df["AÑO"] == anio_sel].copy()
+    if df_anio.empty:
+        return None
+    resumen = {"grafico": None}
+    df_melted = df_anio.melt(id_vars=["AÑO", "MES"], value_vars=departamentos, var_name="DEPARTAMENTO", value_name="PRECIO").dropna()
+    if not df_melted.empty:
+        idx_max = df_melted['PRECIO'].idxmax()
+        idx_min = df_melted['PRECIO'].idxmin()
+        resumen["depto_mayor"] = df_melted.loc[idx_max, "DEPARTAMENTO"]
+        resumen["precio_max"] = int(df_melted.loc[idx_max, "PRECIO"])
+        resumen["depto_menor"] = df_melted.loc[idx_min, "DEPARTAMENTO"]
+        resumen["precio_min"] = int(df_melted.loc[idx_min, "PRECIO"])
+
+    # Generar gráfica
+    df_anio["NACIONAL"] = df_anio[departamentos].mean(axis=1)
+    precio_nacional_mensual = df_anio.groupby(df_anio['MES_NUM'])['NACIONAL'].mean()
+    
+    fig, ax = plt.subplots(figsize=(10, 5))
+    precio_nacional_mensual.plot(kind='line', marker='o', ax=ax, linewidth=2, markersize=8, color="mediumblue")
+    ax.set_title(f"Precio Nacional Promedio Mensual - {anio_sel}") # Quité el emoji para evitar warnings de fuente
+    ax.set_xlabel("Mes")
+    ax.set_ylabel("Precio (COP/L)")
+    ax.set_xticks(range(1, 13))
+    ax.set_xticklabels(['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic'], rotation=45)
+    ax.grid(True)
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    buf.seek(0)
+    resumen["grafico"] = base64.b64encode(buf.getvalue()).decode("utf-8")
+    plt.close(fig)
+    print("Gráfica generada con éxito.")
+    return resumen
+
+
 @precio_bp.route('/precio', methods=['GET', 'POST'])
 def mostrar_precio():
     """Vista principal para mostrar análisis y predicciones de precios.
@@ -44,7 +98,9 @@ def mostrar_precio():
             "predicciones": [],
             "departamentos_disponibles": departamentos,
             "departamento_actual": None,
-            "pred_departamento": []
+            "pred_departamento": [],
+            "modelos_disponibles": list(PRONOSTICADORES),
+            "modelo_actual": None
         }
 
         # --- Manejar la selección de AÑO (POST) ---
@@ -54,37 +110,10 @@ def mostrar_precio():
             print(f"Formulario de AÑO recibido: {anio_sel}")
             
             try:
-                df_anio = df[df["AÑO"] == anio_sel].copy()
-                if not df_anio.empty:
-                    df_melted = df_anio.melt(id_vars=["AÑO", "MES"], value_vars=departamentos, var_name="DEPARTAMENTO", value_name="PRECIO").dropna()
-                    if not df_melted.empty:
-                        idx_max = df_melted['PRECIO'].idxmax()
-                        idx_min = df_melted['PRECIO'].idxmin()
-                        contexto["depto_mayor"] = df_melted.loc[idx_max, "DEPARTAMENTO"]
-                        contexto["precio_max"] = int(df_melted.loc[idx_max, "PRECIO"])
-                        contexto["depto_menor"] = df_melted.loc[idx_min, "DEPARTAMENTO"]
-                        contexto["precio_min"] = int(df_melted.loc[idx_min, "PRECIO"])
-                        print(f"Estadísticas calculadas: Max={contexto['depto_mayor']}, Min={contexto['depto_menor']}")
-
-                    # Generar gráfica
-                    df_anio["NACIONAL"] = df_anio[departamentos].mean(axis=1)
-                    precio_nacional_mensual = df_anio.groupby(df_anio['MES_NUM'])['NACIONAL'].mean()
-                    
-                    fig, ax = plt.subplots(figsize=(10, 5))
-                    precio_nacional_mensual.plot(kind='line', marker='o', ax=ax, linewidth=2, markersize=8, color="mediumblue")
-                    ax.set_title(f"Precio Nacional Promedio Mensual - {anio_sel}") # Quité el emoji para evitar warnings de fuente
-                    ax.set_xlabel("Mes")
-                    ax.set_ylabel("Precio (COP/L)")
-                    ax.set_xticks(range(1, 13))
-                    ax.set_xticklabels(['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic'], rotation=45)
-                    ax.grid(True)
-                    plt.tight_layout()
-                    buf = io.BytesIO()
-                    plt.savefig(buf, format="png")
-                    buf.seek(0)
-                    contexto["grafico"] = base64.b64encode(buf.getvalue()).decode("utf-8")
-                    plt.close(fig)
-                    print("Gráfica generada con éxito.")
+                resumen = resumen_anual(anio_sel)
+                if resumen is not None:
+                    contexto.update(resumen)
+                    print(f"Estadísticas calculadas: Max={contexto['depto_mayor']}, Min={contexto['depto_menor']}")
                 else:
                     print(f"ADVERTENCIA: No se encontraron datos para el año {anio_sel}")
 
@@ -95,11 +124,13 @@ def mostrar_precio():
         # --- Manejar la selección de DEPARTAMENTO (POST) ---
         if request.method == 'POST' and 'departamento' in request.form:
             depto_sel = request.form.get("departamento")
+            modelo_sel = modelo_para(depto_sel, request.form.get("modelo"))
             contexto["departamento_actual"] = depto_sel
-            print(f"Formulario de DEPARTAMENTO recibido: {depto_sel}")
+            contexto["modelo_actual"] = modelo_sel
+            print(f"Formulario de DEPARTAMENTO recibido: {depto_sel} (modelo {modelo_sel})")
             
             try:
-                df_pred_depto = predecir_precio_departamento(depto_sel)
+                df_pred_depto = predecir_precio_departamento(depto_sel, modelo=modelo_sel)
                 if not df_pred_depto.empty:
                     # --- CAMBIO CLAVE: Renombramos la columna para que coincida con el HTML ---
                     columna_original = f"PREDICCION_{depto_sel}"
@@ -0,0 +1,376 @@
+"""Pronosticadores vectorizados para las series mensuales.
+
+Define una interfaz común (`Pronosticador`) y dos implementaciones:
+
+- `TendenciaLineal`: recta sobre un índice ordinal de las observaciones
+  válidas. Reproduce el modelo histórico de `modelo_precio` y
+  `modelo_acopio` (antes un `LinearRegression` por serie).
+- `TendenciaEstacional`: recta sobre el índice de calendario más un
+  efecto fijo por mes del año (enero es la referencia).
+
+Ambas se ajustan para todas las columnas (departamentos) a la vez:
+las ecuaciones normales de cada serie se arman con un `matmul` por lote
+y se resuelven juntas, por lo que ajustar 28 departamentos cuesta una sola
+operación matricial. Los valores faltantes se manejan con una máscara
+(peso 0) en lugar de recortar cada serie por separado.
+
+El modelo de cada departamento se elige con `modelo_para()`: por
+defecto `MODELO_PRONOSTICO` (variable de entorno, 'lineal' si no existe)
+y excepciones por departamento en `PRONOSTICO_MODELOS`, por ejemplo
+``PRONOSTICO_MODELOS="NACIONAL=estacional;ANTIOQUIA=estacional"``.
+"""
+
+import os
+import numpy as np
+
+
+# Remuestreos del bootstrap de residuos y semilla fija (las bandas deben
+# ser idénticas entre workers). LIMITE_ELEMENTOS acota la memoria: los
+# remuestreos se procesan en bloques de a lo sumo ese número de residuos.
+REMUESTREOS_BOOTSTRAP = int(os.environ.get('PRONOSTICO_REMUESTREOS', '2000'))
+SEMILLA_BOOTSTRAP = 0
+LIMITE_ELEMENTOS = 4_000_000
+NIVELES_INTERVALO = (80, 95)
+# Horizonte máximo de pronóstico; las bandas se precalculan hasta aquí
+HORIZONTE_MAX = 36
+
+MESES_NOMBRES = ['ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO',
+                 'JULIO', 'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE']
+
+
+class Pronosticador:
+    """Interfaz de un modelo lineal en sus parámetros ajustable en lote.
+
+    Las subclases definen `nombre`, `indices()` (índice temporal que usa
+    el modelo) y `diseno()` (matriz de regresores). El ajuste y la
+    predicción son comunes y trabajan sobre arreglos (D, T): D series
+    por T meses.
+    """
+
+    nombre = None
+
+    def indices(self, mascara):
+        """Índice temporal (D, T) para las observaciones de cada serie."""
+        raise NotImplementedError
+
+    def diseno(self, indice, mes):
+        """Regresores (D, T, p) a partir del índice y el mes (1-12)."""
+        raise NotImplementedError
+
+    def indices_desde(self, ajuste, mascara):
+        """Índice temporal (D, T') de filas agregadas después de las ya ajustadas."""
+        raise NotImplementedError
+
+    def ajustar(self, Y, mascara, meses):
+        """Ajusta todas las series de `Y` en una sola resolución por lote.
+
+        `Y` y `mascara` tienen forma (D, T); `meses` es (T,) con el mes
+        de calendario de cada fila. Devuelve un dict con los
+        coeficientes (D, p), las sumas XᵀWX y XᵀWy (para `actualizar`),
+        el índice y mes de la última observación válida de cada serie y
+        el número de observaciones.
+        """
+        return self._acumular(None, Y, mascara, meses)
+
+    def actualizar(self, ajuste, Y, mascara, meses):
+        """Agrega filas nuevas (posteriores) a un ajuste sin recalcular desde cero.
+
+        Suma a XᵀWX y XᵀWy sólo la contribución de las filas nuevas y
+        vuelve a resolver; el resultado coincide con `ajustar` sobre la
+        serie completa.
+        """
+        return self._acumular(ajuste, Y, mascara, meses)
+
+    def _acumular(self, previo, Y, mascara, meses):
+        mascara = np.asarray(mascara, dtype=bool)
+        Y = np.where(mascara, np.asarray(Y, dtype=float), 0.0)
+        meses = np.broadcast_to(np.asarray(meses, dtype=int), Y.shape)
+        indice = self.indices(mascara) if previo is None else self.indices_desde(previo, mascara)
+        X = self.diseno(indice, meses)
+        Xw = X * mascara[..., None]
+        XtX = np.matmul(Xw.transpose(0, 2, 1), X)
+        XtY = np.einsum('dtp,dt->dp', Xw, Y)
+        n_obs = mascara.sum(axis=1)
+        # posición de la última observación válida (0 si la serie está vacía)
+        ultima = np.zeros(Y.shape[0], dtype=int)
+        indice_final = np.zeros(Y.shape[0], dtype=int)
+        mes_final = np.ones(Y.shape[0], dtype=int)
+        if Y.shape[1]:
+            ultima = np.where(n_obs > 0, Y.shape[1] - 1 - np.argmax(mascara[:, ::-1], axis=1), 0)
+            filas = np.arange(Y.shape[0])
+            indice_final, mes_final = indice[filas, ultima], meses[filas, ultima]
+        posicion_final = ultima
+        if previo is not None:
+            XtX = previo['xtx'] + XtX
+            XtY = previo['xty'] + XtY
+            nuevas = n_obs > 0
+            indice_final = np.where(nuevas, indice_final, previo['indice_final'])
+            mes_final = np.where(nuevas, mes_final, previo['mes_final'])
+            posicion_final = np.where(nuevas, previo['filas'] + ultima, previo['posicion_final'])
+            n_obs = previo['n_obs'] + n_obs
+        # pinv en lote: series sin datos (o sin algún mes) quedan con
+        # coeficientes nulos en lugar de romper el ajuste.
+        inversa = np.linalg.pinv(XtX)
+        coef = np.einsum('dpq,dq->dp', inversa, XtY)
+        return {
+            'modelo': self.nombre,
+            'coef': coef,
+            'inversa': inversa,
+            'xtx': XtX,
+            'xty': XtY,
+            'indice_final': indice_final,
+            'mes_final': mes_final,
+            'posicion_final': posicion_final,
+            'n_obs': n_obs,
+            'filas': Y.shape[1] + (previo['filas'] if previo is not None else 0),
+        }
+
+    def _diseno_futuro(self, ajuste, horizonte):
+        pasos = np.arange(1, horizonte + 1)
+        indice = ajuste['indice_final'][:, None] + pasos[None, :]
+        mes = (ajuste['mes_final'][:, None] - 1 + pasos[None, :]) % 12 + 1
+        return self.diseno(indice, mes)
+
+    def predecir(self, ajuste, horizonte):
+        """Predicciones (D, horizonte) para los meses siguientes a la última observación."""
+        return np.einsum('dhp,dp->dh', self._diseno_futuro(ajuste, horizonte), ajuste['coef'])
+
+    def intervalos(self, ajuste, Y, mascara, meses, horizonte,
+                   remuestreos=REMUESTREOS_BOOTSTRAP, semilla=SEMILLA_BOOTSTRAP):
+        """Bandas de predicción por bootstrap de residuos, en lote para todas las series.
+
+        Cada remuestreo suma a la predicción puntual (i) el cambio de los
+        coeficientes al reajustar sobre residuos remuestreados, que por ser
+        el modelo lineal en sus parámetros es ``(XᵀWX)⁺ XᵀW e*`` y se
+        calcula sin reajustar, y (ii) un residuo remuestreado para cada mes
+        futuro. Devuelve un dict {'LIM_INF_80', 'LIM_SUP_80', 'LIM_INF_95',
+        'LIM_SUP_95'} con arreglos (D, horizonte).
+        """
+        mascara = np.asarray(mascara, dtype=bool)
+        Y = np.where(mascara, np.asarray(Y, dtype=float), 0.0)
+        meses = np.broadcast_to(np.asarray(meses, dtype=int), Y.shape)
+        X = self.diseno(self.indices(mascara), meses)
+        Xw = X * mascara[..., None]
+        D, T, p = X.shape
+        n_obs = ajuste['n_obs']
+
+        # residuos reescalados por grados de libertad, compactados al inicio de cada fila
+        residuos = np.where(mascara, Y - np.einsum('dtp,dp->dt', X, ajuste['coef']), 0.0)
+        escala = np.sqrt(np.where(n_obs > p, n_obs / np.maximum(n_obs - p, 1), 1.0))
+        orden = np.argsort(~mascara, axis=1, kind='stable')
+        pool = np.take_along_axis(residuos, orden, axis=1) * escala[:, None]
+        alto = np.maximum(n_obs, 1)[:, None, None]
+
+        Xf = self._diseno_futuro(ajuste, horizonte)
+        base = np.einsum('dhp,dp->dh', Xf, ajuste['coef'])
+        rng = np.random.default_rng(semilla)
+        filas = np.arange(D)[:, None, None]
+        caminos = np.empty((D, horizonte, remuestreos))
+        bloque = max(1, LIMITE_ELEMENTOS // max(D * T, 1))
+        for inicio in range(0, remuestreos, bloque):
+            b = min(bloque, remuestreos - inicio)
+            e_hist = pool[filas, rng.integers(0, alto, size=(D, T, b))]
+            delta = np.matmul(ajuste['inversa'], np.matmul(Xw.transpose(0, 2, 1), e_hist))
+            e_fut = pool[filas, rng.integers(0, alto, size=(D, horizonte, b))]
+            caminos[:, :, inicio:inicio + b] = base[..., None] + np.matmul(Xf, delta) + e_fut
+
+        bandas = {}
+        for nivel in NIVELES_INTERVALO:
+            cola = (100 - nivel) / 200
+            inf, sup = np.quantile(caminos, [cola, 1 - cola], axis=2)
+            bandas[f'LIM_INF_{nivel}'] = inf
+            bandas[f'LIM_SUP_{nivel}'] = sup
+        return bandas
+
+
+class TendenciaLineal(Pronosticador):
+    """Tendencia lineal sobre el ordinal de las observaciones válidas."""
+
+    nombre = 'lineal'
+
+    def indices(self, mascara):
+        return np.cumsum(mascara, axis=1) - 1
+
+    def indices_desde(self, ajuste, mascara):
+        return ajuste['n_obs'][:, None] + np.cumsum(mascara, axis=1) - 1
+
+    def diseno(self, indice, mes):
+        indice = np.asarray(indice, dtype=float)
+        return np.stack([np.ones_like(indice), indice], axis=-1)
+
+
+class TendenciaEstacional(Pronosticador):
+    """Tendencia lineal sobre el calendario más un efecto por mes del año."""
+
+    nombre = 'estacional'
+
+    def indices(self, mascara):
+        return np.broadcast_to(np.arange(mascara.shape[1]), mascara.shape)
+
+    def indices_desde(self, ajuste, mascara):
+        return np.broadcast_to(ajuste['filas'] + np.arange(mascara.shape[1]), mascara.shape)
+
+    def diseno(self, indice, mes):
+        indice = np.asarray(indice, dtype=float)
+        # one-hot de febrero..diciembre (enero queda absorbido en el intercepto)
+        dummies = (np.asarray(mes)[..., None] == np.arange(2, 13)).astype(float)
+        return np.concatenate([np.ones_like(indice)[..., None], indice[..., None], dummies], axis=-1)
+
+
+PRONOSTICADORES = {p.nombre: p for p in (TendenciaLineal(), TendenciaEstacional())}
+
+
+def _leer_modelos_entorno():
+    modelos = {}
+    for par in os.environ.get('PRONOSTICO_MODELOS', '').split(';'):
+        if '=' not in par:
+            continue
+        depto, modelo = (s.strip() for s in par.split('=', 1))
+        if depto and modelo in PRONOSTICADORES:
+            modelos[depto.upper()] = modelo
+    return modelos
+
+
+MODELO_PRONOSTICO = os.environ.get('MODELO_PRONOSTICO', 'lineal')
+if MODELO_PRONOSTICO not in PRONOSTICADORES:
+    MODELO_PRONOSTICO = 'lineal'
+MODELOS_DEPARTAMENTO = _leer_modelos_entorno()
+
+
+def validar_horizonte(horizonte):
+    """Convierte `horizonte` a int y verifica que esté entre 1 y `HORIZONTE_MAX`."""
+    try:
+        horizonte = int(horizonte)
+    except (TypeError, ValueError):
+        raise ValueError(f"Horizonte inválido: {horizonte!r}")
+    if not 1 <= horizonte <= HORIZONTE_MAX:
+        raise ValueError(f"El horizonte debe estar entre 1 y {HORIZONTE_MAX} meses")
+    return horizonte
+
+
+def modelo_para(departamento, modelo=None):
+    """Nombre del modelo a usar para `departamento`.
+
+    `modelo` (si es válido) tiene prioridad; después la configuración por
+    departamento y por último el modelo por defecto.
+    """
+    if modelo in PRONOSTICADORES:
+        return modelo
+    return MODELOS_DEPARTAMENTO.get(str(departamento).upper(), MODELO_PRONOSTICO)
+
+
+class AjusteLote:
+    """Resultado del ajuste de varias series con su modelo respectivo.
+
+    Agrupa las columnas por modelo y ajusta cada grupo en lote, de modo
+    que el número de resoluciones es el número de modelos distintos (a
+    lo sumo 2), no el de departamentos. Si `horizonte_intervalos` > 0
+    calcula además las bandas bootstrap hasta ese horizonte, de modo que
+    quedan guardadas junto al ajuste.
+    """
+
+    def __init__(self, columnas, Y, mascara, anios, meses, modelos=None, horizonte_intervalos=0):
+        self.columnas = list(columnas)
+        self.modelos = [modelo_para(c, (modelos or {}).get(c)) for c in self.columnas]
+        Y = np.asarray(Y, dtype=float)
+        mascara = np.asarray(mascara, dtype=bool)
+        self.anios = np.asarray(anios, dtype=int)
+        self.meses = np.asarray(meses, dtype=int)
+        self.Y = Y
+        self.mascara = mascara
+        self.grupos = {}
+        self.horizonte_intervalos = horizonte_intervalos
+        self._bandas = {}
+        for nombre in dict.fromkeys(self.modelos):
+            idx = np.array([i for i, m in enumerate(self.modelos) if m == nombre])
+            ajuste = PRONOSTICADORES[nombre].ajustar(Y[idx], mascara[idx], self.meses)
+            self.grupos[nombre] = (idx, ajuste)
+        self._calcular_bandas()
+
+    def _calcular_bandas(self):
+        self._bandas = {}
+        if not self.horizonte_intervalos:
+            return
+        for nombre, (idx, ajuste) in self.grupos.items():
+            self._bandas[nombre] = PRONOSTICADORES[nombre].intervalos(
+                ajuste, self.Y[idx], self.mascara[idx], self.meses, self.horizonte_intervalos)
+
+    def extender(self, Y, mascara, anios, meses):
+        """Nuevo `AjusteLote` con filas (meses) agregadas al final.
+
+        Los coeficientes se actualizan con las sumas acumuladas de cada
+        pronosticador (sólo se procesan las filas nuevas). Las bandas sí
+        se recalculan sobre la serie completa ya en memoria, porque los
+        residuos de todas las filas cambian con los coeficientes. El
+        objeto original no se modifica, así que quien lo tenga en uso
+        sigue viendo un estado consistente.
+        """
+        Y = np.asarray(Y, dtype=float)
+        mascara = np.asarray(mascara, dtype=bool)
+        meses = np.asarray(meses, dtype=int)
+        nuevo = object.__new__(AjusteLote)
+        nuevo.columnas = self.columnas
+        nuevo.modelos = self.modelos
+        nuevo.Y = np.concatenate([self.Y, Y], axis=1)
+        nuevo.mascara = np.concatenate([self.mascara, mascara], axis=1)
+        nuevo.anios = np.concatenate([self.anios, np.asarray(anios, dtype=int)])
+        nuevo.meses = np.concatenate([self.meses, meses])
+        nuevo.horizonte_intervalos = self.horizonte_intervalos
+        nuevo.grupos = {}
+        for nombre, (idx, ajuste) in self.grupos.items():
+            nuevo.grupos[nombre] = (idx, PRONOSTICADORES[nombre].actualizar(ajuste, Y[idx], mascara[idx], meses))
+        nuevo._calcular_bandas()
+        return nuevo
+
+    def predecir(self, horizonte):
+        """Predicciones (D, horizonte) en el orden de `columnas`."""
+        salida = np.zeros((len(self.columnas), horizonte))
+        for nombre, (idx, ajuste) in self.grupos.items():
+            salida[idx] = PRONOSTICADORES[nombre].predecir(ajuste, horizonte)
+        return salida
+
+    def bandas(self, horizonte):
+        """Bandas precalculadas {'LIM_INF_80', ...} (D, horizonte) en el orden de `columnas`."""
+        if horizonte > self.horizonte_intervalos:
+            raise ValueError(f"Intervalos calculados sólo hasta {self.horizonte_intervalos} meses")
+        salida = {}
+        for nombre, (idx, _) in self.grupos.items():
+            for clave, valores in self._bandas[nombre].items():
+                salida.setdefault(clave, np.zeros((len(self.columnas), horizonte)))[idx] = valores[:, :horizonte]
+        return salida
+
+    def n_obs(self):
+        """Número de observaciones válidas por columna."""
+        salida = np.zeros(len(self.columnas), dtype=int)
+        for idx, ajuste in self.grupos.values():
+            salida[idx] = ajuste['n_obs']
+        return salida
+
+    def periodo_final(self):
+        """(años, meses) de la última observación válida de cada columna."""
+        posiciones = np.zeros(len(self.columnas), dtype=int)
+        for idx, ajuste in self.grupos.values():
+            posiciones[idx] = ajuste['posicion_final']
+        return self.anios[posiciones], self.meses[posiciones]
+
+    def periodos_futuros(self, horizonte):
+        """Listas de (año, mes) futuras por columna."""
+        anios, meses = self.periodo_final()
+        salida = []
+        for a, m in zip(anios, meses):
+            base = int(a) * 12 + int(m) - 1
+            salida.append([((base + k) // 12, (base + k) % 12 + 1) for k in range(1, horizonte + 1)])
+        return salida
+
+
+def perfil_estacional(Y, mascara, meses):
+    """Nivel esperado por mes del año (12,) según el modelo estacional.
+
+    Promedia entre series el intercepto más el efecto de cada mes,
+    descontando la tendencia. Útil para ranquear meses sin depender de
+    valores fijos.
+    """
+    ajuste = TendenciaEstacional().ajustar(Y, mascara, meses)
+    coef = ajuste['coef']
+    efectos = np.concatenate([np.zeros((coef.shape[0], 1)), coef[:, 2:]], axis=1)
+    return (coef[:, :1] + efectos).mean(axis=0)
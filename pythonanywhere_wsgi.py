@@ -33,5 +33,11 @@ else:
         # suele activar el venv automáticamente si se configura en el panel Web.
         pass
 
-# Importar la aplicación WSGI
-from app import application
+# PythonAnywhere no tiene fase de release (`python seed_db.py`): el esquema,
+# los departamentos y el admin se preparan al importar la app. Es
+# idempotente y con candado, así que varios workers no chocan.
+os.environ.setdefault('SEMBRAR_AL_ARRANCAR', '1')
+
+# Importar la aplicación WSGI y arrancar sus hilos en segundo plano
+from app import application, iniciar_hilos
+iniciar_hilos()
@@ -0,0 +1,110 @@
+"""Estadísticas de producción por raza y estimación de producción de una consulta.
+
+Módulo liviano (sin pandas ni modelos) para que `perfil` e
+`importar_consultas` puedan estimar la producción de una consulta sin
+importar `inversion`, que carga los datasets y las librerías de análisis.
+"""
+
+import numpy as np
+
+
+# Estadísticas por raza (valores por vaca en litros/día y composición)
+BREED_STATS = {
+    'Holstein': {'min': 30.0, 'max': 40.0, 'avg': 35.0, 'fat': 3.5, 'protein': 3.1},
+    'Simmental Suizo': {'min': 20.0, 'max': 30.0, 'avg': 25.0, 'fat': 4.0, 'protein': 3.4},
+    'Jersey': {'min': 18.0, 'max': 25.0, 'avg': 21.5, 'fat': 5.0, 'protein': 3.8},
+    'Normando': {'min': 20.0, 'max': 28.0, 'avg': 24.0, 'fat': 4.2, 'protein': 3.5},
+    'Gyr': {'min': 10.0, 'max': 18.0, 'avg': 14.0, 'fat': 4.75, 'protein': 3.65}
+}
+
+
+def _promedios_por_raza():
+    # nombre normalizado -> litros/día por vaca; si dos razas coinciden sin
+    # importar mayúsculas ni espacios, vale la primera (como antes)
+    promedios = {}
+    for k, stats in BREED_STATS.items():
+        try:
+            promedio = float(stats.get('avg', 0.0))
+        except Exception:
+            promedio = None
+        promedios.setdefault(str(k).strip().lower(), promedio)
+    return promedios
+
+
+def precios_por_departamento(payload):
+    """Lista de {'departamento', 'precio'} a partir de `precios_departamentos` del payload."""
+    precios = payload.get('precios_departamentos') or []
+    deptos = []
+    if isinstance(precios, list):
+        for p in precios:
+            dept = p.get('departamento') or ''
+            precio_val = None
+            try:
+                precio_val = float(p.get('precio')) if p.get('precio') is not None else None
+            except Exception:
+                precio_val = None
+            deptos.append({'departamento': dept, 'precio': precio_val})
+    return deptos
+
+
+def estimar_produccion(payload):
+    """Estimación de producción (`prod_info`) para el payload de una consulta.
+
+    Usa el promedio por vaca de la raza (búsqueda insensible a mayúsculas)
+    y el número de vacas; devuelve None si falta alguno de los dos o si el
+    payload no tiene el formato esperado. Es lo que se guarda en
+    `ConsultaSummary`.
+    """
+    return estimar_produccion_lote([payload])[0]
+
+
+def estimar_produccion_lote(payloads):
+    """`estimar_produccion` para una lista de payloads, con el cálculo en arreglos.
+
+    La raza se resuelve con un diccionario (no recorriendo BREED_STATS por
+    payload) y los litros diarios/mensuales de todo el lote se calculan con
+    numpy. La importación masiva (`importar_consultas`) lo usa por lote y
+    `guardar_consulta` con un solo payload.
+    """
+    promedios = _promedios_por_raza()
+    n = len(payloads)
+    litros = np.zeros(n)
+    vacas = np.zeros(n)
+    deptos = [None] * n
+    for i, payload in enumerate(payloads):
+        try:
+            raza = (payload.get('raza') or '').strip() if payload.get('raza') else None
+            num_vacas = payload.get('num_vacas') or payload.get('numVacas') or None
+            try:
+                nv = int(num_vacas) if num_vacas is not None else None
+            except Exception:
+                nv = None
+            promedio = promedios.get(raza.lower()) if raza else None
+            if not (promedio and nv):
+                continue
+            # OverflowError si el número de vacas no cabe en un float
+            litros[i] = promedio
+            vacas[i] = nv
+            deptos[i] = precios_por_departamento(payload)
+        except Exception:
+            # Si ocurre algún error al calcular la estimación, se omite
+            litros[i] = vacas[i] = 0.0
+            deptos[i] = None
+
+    diario = (litros * vacas).tolist()
+    mensual = (litros * vacas * 30).tolist()
+    por_vaca = litros.tolist()
+    por_vaca_mensual = (litros * 30).tolist()
+    resultados = []
+    for i in range(n):
+        if deptos[i] is None:
+            resultados.append(None)
+            continue
+        resultados.append({
+            'litros_diario_total': diario[i],
+            'litros_mensual_total': mensual[i],
+            'litros_por_vaca_diario': por_vaca[i],
+            'litros_por_vaca_mensual': por_vaca_mensual[i],
+            'por_departamento': deptos[i],
+        })
+    return resultados
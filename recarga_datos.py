@@ -0,0 +1,175 @@
+"""Vigilante de `DataSheet/`: recarga datos y pronósticos fuera de las peticiones.
+
+Un hilo en segundo plano revisa cada `INTERVALO_RECARGA` segundos la
+firma (mtime y tamaño) de los CSV de `DataSheet/`. Cuando cambia,
+vuelve a leerlos (incrementalmente si sólo crecieron, ver `ingesta`),
+reconstruye los pronósticos de cada modelo y los resúmenes/gráficos por
+año, y sólo al final publica la nueva versión: las peticiones siguen
+usando la anterior hasta ese momento y nunca ven una mezcla. No se usa
+inotify para no agregar dependencias; un `os.stat` por archivo cada
+intervalo es despreciable.
+
+`INTERVALO_RECARGA` sale de la variable de entorno
+`DATASHEET_RECARGA_SEGUNDOS` (30 por defecto; 0 desactiva el vigilante y
+se vuelve a revisar el disco en cada petición). El estado se consulta en
+`/admin/datos` (sólo administradores).
+
+El hilo lo arrancan sólo los puntos de entrada del servidor web
+(`app.iniciar_hilos()`), no el `import app` de los scripts.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import Blueprint, jsonify
+from flask_login import login_required, current_user
+
+import cache_datos
+import ingesta
+
+
+INTERVALO_RECARGA = float(os.environ.get('DATASHEET_RECARGA_SEGUNDOS', '30'))
+DIRECTORIO_DATOS = 'DataSheet'
+
+recarga_bp = Blueprint('recarga_datos', __name__)
+
+_LOCK = threading.Lock()
+_ESTADO = {
+    'activo': False,
+    'version': 0,
+    'firma': None,
+    'ultima_revision': None,
+    'ultima_recarga': None,
+    'duracion_total': None,
+    'tiempos': {},
+    'error': None,
+}
+
+
+def _firma_directorio():
+    try:
+        nombres = sorted(n for n in os.listdir(DIRECTORIO_DATOS) if n.lower().endswith('.csv'))
+    except OSError:
+        nombres = []
+    return cache_datos.firma(*(os.path.join(DIRECTORIO_DATOS, n) for n in nombres))
+
+
+def reconstruir():
+    """Relee los CSV y reconstruye todo lo derivado; publica al terminar.
+
+    Devuelve el dict de tiempos (segundos) por etapa. Si algo falla la
+    excepción se propaga y no se publica nada: las peticiones siguen con
+    la versión anterior.
+    """
+    # importaciones diferidas: estos módulos importan blueprints y pandas
+    from pronosticos import PRONOSTICADORES
+    import modelo_precio
+    import modelo_acopio
+    import precio
+    import acopio
+    import inversion
+
+    tiempos = {}
+
+    def etapa(nombre, funcion):
+        t0 = time.perf_counter()
+        resultado = funcion()
+        tiempos[nombre] = round(time.perf_counter() - t0, 4)
+        return resultado
+
+    with ingesta.preparando():
+        lectura_precio = etapa('precio.datos', modelo_precio.lectura_precios)
+        etapa('precio.pronosticos', lambda: [
+            (modelo_precio.pronostico_nacional(m), modelo_precio.pronostico_departamentos(m))
+            for m in PRONOSTICADORES])
+        etapa('precio.resumenes_anuales', lambda: [
+            precio.resumen_anual(a) for a in sorted(lectura_precio.df['AÑO'].dropna().unique())])
+
+        etapa('acopio.datos', lambda: (modelo_acopio.lectura_acopio(), acopio.cargar_datos()))
+        etapa('acopio.pronosticos', lambda: [modelo_acopio.pronostico_acopio(m) for m in PRONOSTICADORES])
+        df_acopio = acopio.cargar_datos()
+        etapa('acopio.graficos', lambda: [
+            acopio.grafico_anual(a) for a in sorted(df_acopio['AÑO'].unique())])
+        etapa('inversion.acopio', inversion.cargar_acopio)
+
+    ingesta.publicar()
+    return tiempos
+
+
+def revisar(forzar=False):
+    """Reconstruye y publica si la firma de `DataSheet/` cambió desde la última versión."""
+    firma = _firma_directorio()
+    with _LOCK:
+        _ESTADO['ultima_revision'] = datetime.utcnow().isoformat(timespec='seconds')
+        if not forzar and firma == _ESTADO['firma']:
+            return False
+    t0 = time.perf_counter()
+    try:
+        tiempos = reconstruir()
+    except Exception as e:
+        import traceback
+        print(f"[recarga_datos] Error reconstruyendo datos: {e}\n{traceback.format_exc()}")
+        with _LOCK:
+            _ESTADO['error'] = str(e)
+        return False
+    with _LOCK:
+        _ESTADO.update({
+            'version': _ESTADO['version'] + 1,
+            'firma': firma,
+            'ultima_recarga': datetime.utcnow().isoformat(timespec='seconds'),
+            'duracion_total': round(time.perf_counter() - t0, 4),
+            'tiempos': tiempos,
+            'error': None,
+        })
+        version = _ESTADO['version']
+    print(f"[recarga_datos] Versión {version} de DataSheet publicada en {time.perf_counter() - t0:.2f}s")
+    return True
+
+
+def _bucle(intervalo):
+    while True:
+        try:
+            revisar()
+        except Exception as e:
+            print(f"[recarga_datos] Error en el vigilante: {e}")
+        time.sleep(intervalo)
+
+
+def iniciar(intervalo=None):
+    """Arranca el hilo vigilante (una vez por proceso). Devuelve False si está desactivado."""
+    intervalo = INTERVALO_RECARGA if intervalo is None else intervalo
+    if intervalo <= 0:
+        return False
+    with _LOCK:
+        if _ESTADO['activo'] and _ESTADO.get('pid') == os.getpid():
+            return True
+        _ESTADO['activo'] = True
+        _ESTADO['pid'] = os.getpid()
+    ingesta.activar_vigilancia()
+    hilo = threading.Thread(target=_bucle, args=(intervalo,), name='recarga-datasheet', daemon=True)
+    hilo.start()
+    return True
+
+
+def estado():
+    """Estado del vigilante y de cada dataset (versión, filas, tiempos de la última recarga)."""
+    with _LOCK:
+        salida = {k: v for k, v in _ESTADO.items() if k != 'firma'}
+        salida['archivos'] = [
+            {'ruta': ruta, 'mtime_ns': mtime, 'bytes': tam} for ruta, mtime, tam in (_ESTADO['firma'] or ())
+        ]
+    salida['intervalo_segundos'] = INTERVALO_RECARGA
+    salida['datasets'] = ingesta.estado()
+    salida['cache'] = cache_datos.resumen()
+    return salida
+
+
+@recarga_bp.route('/admin/datos')
+@login_required
+def admin_datos():
+    """Versión publicada de los datos y tiempos de la última reconstrucción (JSON)."""
+    if not (current_user.email == 'admin@example.com' or getattr(current_user, 'is_admin', False)):
+        return jsonify({'error': 'No autorizado'}), 403
+    return jsonify(estado())
@@ -0,0 +1,305 @@
+"""Benchmark de cargadores, pronosticadores, gráficos y vistas.
+
+Genera copias sintéticas de los CSV de `DataSheet/` a varias escalas
+(1x, 10x, 100x el tamaño real, replicando las columnas de departamentos
+y las filas del censo: las series mensuales no se pueden alargar hacia
+atrás sin salir del rango de fechas de pandas), mide cada etapa en frío
+(cachés vacías) y en caliente, y recorre `/precio`, `/analisis_acopio`,
+`/inversion` y `/valor-venta` con el cliente de pruebas de Flask sobre
+una base SQLite temporal.
+
+Los resultados (mediana y mínimo en segundos por medición) se guardan
+en JSON para compararlos con una línea base:
+
+    python scripts/benchmark.py --salida instance/benchmark.json
+    python scripts/benchmark.py --escalas 1,10 --comparar instance/benchmark_base.json
+
+Con `--comparar` el script termina con código 1 si alguna medición es
+más lenta que la base en más de `--tolerancia` (25% por defecto).
+Pensado para ejecución manual; no debe importarse desde la aplicación.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVOS_SERIES = [
+    'PRECIO_PAGADO_AL_PRODUCTOR_2_-_RES_0017_DE_2012.csv',
+    'Volumen de Acopio Directos - Res 0017 de 2012.csv',
+]
+ARCHIVO_CENSO = 'CENSO-BOVINO-2025.csv'
+# Columnas que no son departamentos en los CSV de series
+COLUMNAS_FIJAS = {b'A\xc3\x91O', b'\xef\xbb\xbfA\xc3\x91O', b'MES', b'NACIONAL'}
+
+
+# ==========================
+# Datos sintéticos
+# ==========================
+def _lineas(ruta):
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    fin = b'\r\n' if b'\r\n' in datos else b'\n'
+    return [l for l in datos.split(fin) if l.strip()], fin
+
+
+def _escalar_series(origen, destino, factor):
+    """Replica `factor` veces las columnas de departamentos (sufijo ' 2', ' 3', ...)."""
+    lineas, fin = _lineas(origen)
+    cabecera = lineas[0].split(b';')
+    deptos = [i for i, c in enumerate(cabecera) if c.strip() not in COLUMNAS_FIJAS]
+    salida = []
+    for n, linea in enumerate(lineas):
+        campos = linea.split(b';')
+        extra = []
+        for copia in range(2, factor + 1):
+            for i in deptos:
+                valor = campos[i] if i < len(campos) else b''
+                extra.append(valor + (b' %d' % copia if n == 0 else b''))
+        # mantener NACIONAL (última columna) al final
+        salida.append(b';'.join(campos[:-1] + extra + campos[-1:]))
+    with open(destino, 'wb') as f:
+        f.write(fin.join(salida) + fin)
+
+
+def _escalar_censo(origen, destino, factor):
+    """Replica `factor` veces las filas de departamentos del censo."""
+    lineas, fin = _lineas(origen)
+    salida = list(lineas)
+    for copia in range(2, factor + 1):
+        for linea in lineas[1:]:
+            campos = linea.split(b';')
+            salida.append(b';'.join([campos[0] + b' %d' % copia] + campos[1:]))
+    with open(destino, 'wb') as f:
+        f.write(fin.join(salida) + fin)
+
+
+def generar_datos(directorio, factor):
+    """Crea `directorio/DataSheet` con los CSV escalados `factor` veces."""
+    datos = os.path.join(directorio, 'DataSheet')
+    os.makedirs(datos, exist_ok=True)
+    for nombre in ARCHIVOS_SERIES:
+        _escalar_series(os.path.join(RAIZ, 'DataSheet', nombre), os.path.join(datos, nombre), factor)
+    _escalar_censo(os.path.join(RAIZ, 'DataSheet', ARCHIVO_CENSO), os.path.join(datos, ARCHIVO_CENSO), factor)
+    return sum(os.path.getsize(os.path.join(datos, n)) for n in os.listdir(datos))
+
+
+# ==========================
+# Medición
+# ==========================
+def medir(funcion, repeticiones, antes=None, calentar=False):
+    """Mediana y mínimo (segundos) de `repeticiones` llamadas.
+
+    `antes()` se ejecuta fuera del tiempo antes de cada llamada; con
+    `calentar` se hace una llamada previa sin medir (cachés llenas).
+    """
+    tiempos = []
+    if calentar:
+        with contextlib.redirect_stdout(io.StringIO()):
+            funcion()
+    for _ in range(repeticiones):
+        if antes is not None:
+            antes()
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - t0)
+    return {'mediana_s': round(statistics.median(tiempos), 6), 'min_s': round(min(tiempos), 6),
+            'repeticiones': repeticiones}
+
+
+def _preparar_app(directorio):
+    """Importa la app con una BD SQLite temporal (sin hilos en segundo plano)."""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directorio, 'benchmark.db')
+    sys.path.insert(0, RAIZ)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+    import seed_db
+    from database import db
+    from models import User
+    # importar app ya no crea el esquema: se hace aquí, como en el release
+    with contextlib.redirect_stdout(io.StringIO()):
+        seed_db.sembrar_app(app)
+    with app.app_context():
+        usuario = User.get_by_email('benchmark@example.com')
+        if usuario is None:
+            usuario = User(name='Benchmark', email='benchmark@example.com', role='pago2',
+                           primer_nombre='Bench', primer_apellido='Mark')
+            usuario.set_password('benchmark')
+            db.session.add(usuario)
+            db.session.commit()
+        uid = usuario.id
+    return app, uid
+
+
+def ejecutar_escala(app, uid, factor, base, repeticiones):
+    """Mide todas las etapas con los datos escalados `factor` veces."""
+    import cache_datos
+    import ingesta
+    import inversion
+    import modelo_acopio
+    import modelo_precio
+    import acopio
+    import precio
+    from pronosticos import PRONOSTICADORES
+
+    directorio = os.path.join(base, f'x{factor}')
+    tam = generar_datos(directorio, factor)
+    os.chdir(directorio)
+    # inversion arma sus rutas desde la carpeta del módulo
+    inversion.BASE_DIR = directorio
+
+    def en_frio():
+        ingesta.olvidar()
+        cache_datos.invalidar()
+
+    r = {'bytes_datasheet': tam}
+    # cargadores
+    r['cargar.precio'] = medir(modelo_precio.cargar_datos, repeticiones, en_frio)
+    r['cargar.acopio'] = medir(acopio.cargar_datos, repeticiones, en_frio)
+    r['cargar.acopio_modelo'] = medir(modelo_acopio.lectura_acopio, repeticiones, en_frio)
+    r['cargar.inversion_acopio'] = medir(inversion.cargar_acopio, repeticiones)
+    r['cargar.censo'] = medir(inversion.cargar_censo_bovino, repeticiones)
+    r['cargar.precio_caliente'] = medir(modelo_precio.cargar_datos, repeticiones, calentar=True)
+
+    # pronosticadores (ajuste en frío = sin ajuste cacheado, datos ya leídos)
+    modelo_precio.lectura_precios()
+    modelo_acopio.lectura_acopio()
+    for modelo in PRONOSTICADORES:
+        r[f'ajuste.precio_nacional.{modelo}'] = medir(
+            lambda: modelo_precio.pronostico_nacional(modelo), repeticiones, cache_datos.invalidar)
+        r[f'ajuste.precio_departamentos.{modelo}'] = medir(
+            lambda: modelo_precio.pronostico_departamentos(modelo), repeticiones, cache_datos.invalidar)
+        r[f'ajuste.acopio.{modelo}'] = medir(
+            lambda: modelo_acopio.pronostico_acopio(modelo), repeticiones, cache_datos.invalidar)
+    r['predecir.precio_nacional_caliente'] = medir(modelo_precio.predecir_precio_nacional, repeticiones,
+                                                   calentar=True)
+    r['predecir.acopio_caliente'] = medir(modelo_acopio.predecir_acopio, repeticiones, calentar=True)
+
+    # gráficos (sin caché)
+    df_precio, _ = modelo_precio.cargar_datos()
+    anio_precio = int(df_precio['AÑO'].max())
+    r['grafico.precio_anual'] = medir(lambda: precio._calcular_resumen_anual(df_precio, anio_precio), repeticiones)
+    df_acopio = acopio.cargar_datos()
+    anio_acopio = int(df_acopio['AÑO'].max())
+    r['grafico.acopio_anual'] = medir(lambda: acopio.generar_grafico(df_acopio, anio_acopio), repeticiones)
+
+    # vistas por el cliente de pruebas
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s['_user_id'] = str(uid)
+        s['_fresh'] = True
+        s['last_activity'] = time.time()
+    rutas = {
+        'vista.precio': lambda: cliente.post('/precio', data={'departamento': 'ANTIOQUIA'}),
+        'vista.analisis_acopio': lambda: cliente.get('/analisis_acopio'),
+        'vista.inversion': lambda: cliente.post('/inversion', data={
+            'departamento': 'ANTIOQUIA', 'raza': 'Holstein', 'num_vacas': '10'}),
+        'vista.valor_venta': lambda: cliente.get('/valor-venta'),
+    }
+    for nombre, peticion in rutas.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            estado = peticion().status_code
+        if estado >= 400:
+            print(f'ADVERTENCIA: {nombre} respondió {estado}')
+        r[nombre + '.frio'] = medir(peticion, 1, en_frio)
+        r[nombre] = medir(peticion, repeticiones)
+    return r
+
+
+# ==========================
+# Comparación con la línea base
+# ==========================
+def comparar(actual, base, tolerancia):
+    """Lista de (escala, medición, base_s, actual_s, cambio) más lentas que la tolerancia."""
+    regresiones = []
+    for escala, mediciones in actual['escalas'].items():
+        previas = base.get('escalas', {}).get(escala, {})
+        for nombre, m in mediciones.items():
+            p = previas.get(nombre)
+            if not isinstance(m, dict) or not isinstance(p, dict) or not p.get('mediana_s'):
+                continue
+            cambio = m['mediana_s'] / p['mediana_s'] - 1
+            if cambio > tolerancia:
+                regresiones.append((escala, nombre, p['mediana_s'], m['mediana_s'], cambio))
+    return regresiones
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--escalas', default='1,10,100', help='factores separados por coma (1,10,100)')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', default=os.path.join(RAIZ, 'instance', 'benchmark.json'))
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior usada como línea base')
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='aumento relativo de la mediana tolerado (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    escalas = [int(e) for e in args.escalas.split(',') if e.strip()]
+    # los avisos de pandas se repiten en cada medición y ensucian la salida
+    warnings.simplefilter('ignore')
+    base = tempfile.mkdtemp(prefix='benchmark_')
+    original = os.getcwd()
+    try:
+        app, uid = _preparar_app(base)
+        resultado = {
+            'fecha': datetime.utcnow().isoformat(timespec='seconds'),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'repeticiones': args.repeticiones,
+            'escalas': {},
+        }
+        for factor in escalas:
+            print(f'== Escala {factor}x ==')
+            t0 = time.perf_counter()
+            mediciones = ejecutar_escala(app, uid, factor, base, args.repeticiones)
+            resultado['escalas'][f'{factor}x'] = mediciones
+            for nombre, m in mediciones.items():
+                if isinstance(m, dict):
+                    print(f'  {nombre:45s} {m["mediana_s"] * 1000:10.1f} ms')
+            print(f'  ({time.perf_counter() - t0:.1f}s)')
+    finally:
+        os.chdir(original)
+        shutil.rmtree(base, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f'Resultados guardados en {args.salida}')
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            linea_base = json.load(f)
+        regresiones = comparar(resultado, linea_base, args.tolerancia)
+        if regresiones:
+            print(f'Regresiones (> {args.tolerancia:.0%} sobre {args.comparar}):')
+            for escala, nombre, antes, ahora, cambio in regresiones:
+                print(f'  [{escala}] {nombre}: {antes * 1000:.1f} ms -> {ahora * 1000:.1f} ms (+{cambio:.0%})')
+            return 1
+        print('Sin regresiones respecto a la línea base.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
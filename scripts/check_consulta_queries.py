@@ -0,0 +1,68 @@
+"""Comprueba que el listado de consultas cueste un número fijo de sentencias SQL.
+
+Crea una base SQLite temporal, guarda consultas con query, resumen y
+precios, y cuenta las sentencias que ejecuta
+`Consulta.page_for_user(..., with_details=True)` (y el recorrido de sus
+colecciones) para distintos tamaños de página. Debe ser siempre
+1 + `DETAIL_STATEMENTS`, sin importar el tamaño. Pensado para ejecución
+manual; termina con código 1 si la cuenta varía.
+
+Uso:
+  python scripts/check_consulta_queries.py
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+
+def main():
+    ruta_db = os.path.join(tempfile.mkdtemp(), 'check_consultas.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{ruta_db}'
+    os.environ['SKIP_CREATE_ALL'] = '1'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from sqlalchemy import event
+    from app import app
+    from database import db
+    from models import User, Consulta, ConsultaQuery, ConsultaSummary, ConsultaPrecio, DETAIL_STATEMENTS
+
+    with app.app_context():
+        db.create_all()
+        user = User(name='Check', email='check@example.com', primer_nombre='Check', primer_apellido='Queries')
+        user.set_password('check')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(25):
+            c = Consulta(user_id=user.id, titulo=f'Consulta {i}')
+            db.session.add(c)
+            db.session.flush()
+            db.session.add(ConsultaQuery(consulta_id=c.id, query_text=json.dumps({'raza': 'Holstein', 'num_vacas': i + 1})))
+            db.session.add(ConsultaSummary(consulta_id=c.id, summary=json.dumps({'litros_mensual_total': 1000.0 * i})))
+            for d in ('ANTIOQUIA', 'BOYACA', 'CALDAS'):
+                db.session.add(ConsultaPrecio(consulta_id=c.id, departamento=d, precio=1500.0))
+        db.session.commit()
+        user_id = user.id
+
+        sentencias = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: sentencias.append(a[2]))
+
+        resultados = {}
+        for tamano in (1, 5, 25):
+            db.session.expunge_all()
+            sentencias.clear()
+            pagina = Consulta.page_for_user(user_id, tamano, with_details=True)
+            for c in pagina:
+                c.query_data, c.summary_data, len(c.precio_rows)
+            resultados[tamano] = len(sentencias)
+            print(f'Página de {len(pagina)} consultas: {len(sentencias)} sentencias')
+
+    esperado = 1 + DETAIL_STATEMENTS
+    if set(resultados.values()) != {esperado}:
+        print(f'ERROR: se esperaban {esperado} sentencias para cualquier tamaño de página')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
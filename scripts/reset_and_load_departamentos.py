@@ -3,37 +3,21 @@ ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+from sqlalchemy import delete, select, func
+
 from app import app
 from database import db
-
-DEPARTAMENTOS = [
-    'Amazonas', 'Antioquia', 'Arauca', 'Atlántico', 'Bolívar', 'Boyacá', 'Caldas', 'Caquetá',
-    'Casanare', 'Cauca', 'Cesar', 'Chocó', 'Córdoba', 'Cundinamarca', 'Guainía', 'Guaviare',
-    'Huila', 'La Guajira', 'Magdalena', 'Meta', 'Nariño', 'Norte de Santander', 'Putumayo',
-    'Quindío', 'Risaralda', 'San Andrés y Providencia', 'Santander', 'Sucre', 'Tolima',
-    'Valle del Cauca', 'Vaupés', 'Vichada', 'Bogotá D.C.'
-]
+from models import Departamento
+import seed_db
 
 with app.app_context():
-    try:
-        # Eliminar todas las filas (no eliminar la tabla)
-        db.engine.execute('DELETE FROM departamentos')
-    except Exception as e:
-        print('ERROR borrando departamentos:', e)
-
-    inserted = 0
-    for name in DEPARTAMENTOS:
-        try:
-            db.engine.execute('INSERT INTO departamentos (name) VALUES (%s)', (name.strip(),))
-            inserted += 1
-        except Exception as e:
-            print('ERROR insertando', name, e)
-
-    try:
-        db.session.commit()
-    except Exception as e:
-        print('ERROR commit:', e)
-
-    total = db.engine.execute('SELECT COUNT(*) FROM departamentos').fetchone()[0]
+    tabla = Departamento.__table__
+    with db.engine.connect() as conn:
+        # Eliminar todas las filas (no eliminar la tabla) y reinsertar en la misma transacción
+        with seed_db.candado(conn):
+            conn.execute(delete(tabla))
+            inserted = seed_db.sembrar_departamentos(conn)
+            conn.commit()
+        total = conn.execute(select(func.count()).select_from(tabla)).scalar()
     print('Departamentos reinsertados:', inserted)
     print('Total departamentos en la tabla:', total)
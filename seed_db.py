@@ -0,0 +1,185 @@
+"""Crea el esquema y carga los datos iniciales (departamentos y admin).
+
+Pensado para ejecutarse UNA vez por despliegue (fase de release /
+pre-deploy), no en cada worker de gunicorn:
+
+  python seed_db.py                       # BD configurada en app.py
+  python seed_db.py --uri "sqlite:///instance/usuarios.db"
+  python seed_db.py --sin-esquema         # sólo datos, sin create_all
+
+Es idempotente y seguro si se lanza varias veces en paralelo:
+ - toma un candado consultivo de la BD (`GET_LOCK` en MySQL,
+   `pg_advisory_lock` en PostgreSQL, `BEGIN IMMEDIATE` en SQLite);
+ - inserta los 33 departamentos con un solo INSERT multi-fila con
+   `ON DUPLICATE KEY UPDATE` / `ON CONFLICT DO NOTHING`, sin SELECT previo;
+ - crea el admin (`DEFAULT_ADMIN_EMAIL` / `DEFAULT_ADMIN_PASSWORD`) sólo si
+   no hay ningún administrador y se definió la contraseña;
+ - indexa para la búsqueda de `/admin/users` a los usuarios sin tokens
+   (ver `busqueda_usuarios.py`).
+
+`app.py` ya no hace este trabajo al importarse salvo con
+`SEMBRAR_AL_ARRANCAR=1` (hosts sin fase de release) o al ejecutar
+`python app.py` en desarrollo.
+"""
+import argparse
+import os
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, select, insert, func, text, exists
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+import busqueda_usuarios
+from database import db
+from models import Departamento, User
+
+
+# Lista de departamentos de Colombia (incluye Bogotá D.C. y San Andrés y Providencia)
+DEPARTAMENTOS = [
+    'Amazonas', 'Antioquia', 'Arauca', 'Atlántico', 'Bolívar', 'Boyacá', 'Caldas', 'Caquetá',
+    'Casanare', 'Cauca', 'Cesar', 'Chocó', 'Córdoba', 'Cundinamarca', 'Guainía', 'Guaviare',
+    'Huila', 'La Guajira', 'Magdalena', 'Meta', 'Nariño', 'Norte de Santander', 'Putumayo',
+    'Quindío', 'Risaralda', 'San Andrés y Providencia', 'Santander', 'Sucre', 'Tolima',
+    'Valle del Cauca', 'Vaupés', 'Vichada', 'Bogotá D.C.'
+]
+
+CANDADO = 'del_campo_seed_db'
+# pg_advisory_lock recibe un entero de 64 bits
+CANDADO_PG = 7_341_025_119
+ESPERA_CANDADO = int(os.environ.get('SEED_ESPERA_CANDADO', '60'))
+
+
+@contextmanager
+def candado(conn, espera=ESPERA_CANDADO):
+    """Candado consultivo sobre la conexión `conn` mientras dura el bloque."""
+    dialecto = conn.dialect.name
+    if dialecto == 'mysql':
+        obtenido = conn.execute(text('SELECT GET_LOCK(:n, :t)'), {'n': CANDADO, 't': espera}).scalar()
+        if obtenido != 1:
+            raise RuntimeError(f'No se obtuvo el candado {CANDADO} en {espera}s')
+        try:
+            yield
+        finally:
+            conn.execute(text('SELECT RELEASE_LOCK(:n)'), {'n': CANDADO})
+    elif dialecto == 'postgresql':
+        conn.execute(text('SELECT pg_advisory_lock(:k)'), {'k': CANDADO_PG})
+        try:
+            yield
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:k)'), {'k': CANDADO_PG})
+    elif dialecto == 'sqlite':
+        # bloqueo de escritura desde el inicio: otro proceso espera aquí
+        # (busy timeout) en vez de chocar en el CREATE TABLE
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+        yield
+    else:
+        yield
+
+
+def _insert_ignorando_duplicados(conn, tabla, filas, clave):
+    """INSERT multi-fila que ignora las filas cuya `clave` única ya existe."""
+    dialecto = conn.dialect.name
+    if dialecto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as insert_mysql
+        stmt = insert_mysql(tabla).values(filas)
+        # asignar la clave a sí misma: no cambia nada y evita el error de duplicado
+        stmt = stmt.on_duplicate_key_update({clave: stmt.inserted[clave]})
+    elif dialecto in ('sqlite', 'postgresql'):
+        if dialecto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+        else:
+            from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+        stmt = insert_dialecto(tabla).values(filas).on_conflict_do_nothing(index_elements=[clave])
+    else:
+        existentes = set(conn.execute(select(tabla.c[clave]).where(tabla.c[clave].in_([f[clave] for f in filas]))).scalars())
+        filas = [f for f in filas if f[clave] not in existentes]
+        if not filas:
+            return
+        stmt = insert(tabla).values(filas)
+    conn.execute(stmt)
+
+
+def sembrar_departamentos(conn):
+    """Inserta los departamentos que falten. Devuelve cuántos se agregaron."""
+    tabla = Departamento.__table__
+    antes = conn.execute(select(func.count()).select_from(tabla)).scalar()
+    _insert_ignorando_duplicados(conn, tabla, [{'name': n} for n in DEPARTAMENTOS], 'name')
+    return conn.execute(select(func.count()).select_from(tabla)).scalar() - antes
+
+
+def sembrar_admin(conn):
+    """Crea el admin por defecto si no hay ninguno y hay contraseña configurada."""
+    admin_password = os.environ.get('DEFAULT_ADMIN_PASSWORD')
+    if not admin_password:
+        return False
+    tabla = User.__table__
+    if conn.execute(select(exists().where(tabla.c.is_admin.is_(True)))).scalar():
+        return False
+    admin_email = os.environ.get('DEFAULT_ADMIN_EMAIL', 'admin@example.com')
+    try:
+        with conn.begin_nested():
+            conn.execute(insert(tabla).values(
+                name='Administrador', email=admin_email, is_admin=True,
+                primer_nombre='Admin', primer_apellido='User',
+                password=generate_password_hash(admin_password),
+            ))
+    except IntegrityError:
+        print(f'Advertencia: ya existe un usuario {admin_email} que no es administrador; no se crea el admin.')
+        return False
+    return True
+
+
+def sembrar(engine, crear_esquema=True):
+    """Esquema + datos iniciales bajo el candado. Devuelve un dict con lo realizado."""
+    with engine.connect() as conn:
+        with candado(conn):
+            if crear_esquema:
+                db.metadata.create_all(bind=conn)
+            departamentos = sembrar_departamentos(conn)
+            admin = sembrar_admin(conn)
+            indexados = busqueda_usuarios.reindexar(conn)
+            conn.commit()
+    return {'departamentos': departamentos, 'admin': admin, 'indexados': indexados}
+
+
+def sembrar_app(app):
+    """Ejecuta `sembrar` con la BD de `app`; registra errores en instance/seed_error.log."""
+    try:
+        with app.app_context():
+            return sembrar(db.engine)
+    except Exception:
+        try:
+            import traceback
+            log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+            os.makedirs(log_dir, exist_ok=True)
+            with open(os.path.join(log_dir, 'seed_error.log'), 'a', encoding='utf-8') as f:
+                f.write('\n--- SEED ERROR ---\n')
+                f.write(traceback.format_exc())
+        except Exception:
+            pass
+        print('WARNING: la carga inicial de la BD falló; ver instance/seed_error.log', file=sys.stderr)
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crear esquema y datos iniciales (idempotente)')
+    parser.add_argument('--uri', help='URI SQLAlchemy de la BD (por defecto, la configurada en app.py)')
+    parser.add_argument('--sin-esquema', action='store_true', help='No ejecutar create_all, sólo datos')
+    args = parser.parse_args()
+
+    try:
+        if args.uri:
+            resultado = sembrar(create_engine(args.uri), crear_esquema=not args.sin_esquema)
+        else:
+            # que importar app.py no siembre por su cuenta
+            os.environ['SEMBRAR_AL_ARRANCAR'] = '0'
+            from app import app
+            with app.app_context():
+                resultado = sembrar(db.engine, crear_esquema=not args.sin_esquema)
+    except Exception as e:
+        print('ERROR en seed_db:', e)
+        sys.exit(1)
+    print('Departamentos insertados (nuevos):', resultado['departamentos'])
+    print('Admin creado:', 'sí' if resultado['admin'] else 'no')
+    print('Usuarios indexados para búsqueda:', resultado['indexados'])
@@ -0,0 +1,119 @@
+"""Vencimiento de suscripciones en segundo plano.
+
+Antes cada petición comprobaba `subscription_expires` y, si había
+vencido, degradaba al usuario con un commit en medio de la petición.
+Ahora un hilo por proceso ejecuta cada `INTERVALO_BARRIDO` segundos
+(variable de entorno `SUSCRIPCIONES_BARRIDO_SEGUNDOS`, 300 por defecto;
+0 lo desactiva) un único `UPDATE` que pasa a 'free' a todos los usuarios
+'pago1'/'pago2' vencidos. El barrido es idempotente, así que no importa
+que cada worker de gunicorn tenga el suyo.
+
+Mientras el barrido no llega, `aplicar_vencimiento()` degrada al usuario
+sólo en memoria durante la petición (sin escribir), de modo que los
+permisos se respetan desde el instante del vencimiento.
+
+El hilo lo arrancan sólo los puntos de entrada del servidor web
+(`app.iniciar_hilos()`): los scripts que importan `app` no escriben en
+la BD por su cuenta.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+import cache_usuarios
+from database import db
+from models import User
+
+
+INTERVALO_BARRIDO = float(os.environ.get('SUSCRIPCIONES_BARRIDO_SEGUNDOS', '300'))
+ROLES_DE_PAGO = ('pago1', 'pago2')
+
+_LOCK = threading.Lock()
+_ESTADO = {'activo': False, 'pid': None, 'ultimo_barrido': None, 'degradados': 0, 'error': None}
+
+
+def vencida(usuario, ahora=None):
+    """True si `usuario` tiene un plan de pago con la fecha de expiración ya pasada."""
+    expira = getattr(usuario, 'subscription_expires', None)
+    if expira is None or getattr(usuario, 'role', None) not in ROLES_DE_PAGO:
+        return False
+    return expira < (ahora or datetime.utcnow())
+
+
+def aplicar_vencimiento(usuario):
+    """Degrada `usuario` a 'free' sólo para esta petición si su plan venció.
+
+    Los valores se marcan como ya confirmados, así que no generan un
+    UPDATE en el siguiente flush; lo persiste `degradar_vencidas()`.
+    Devuelve la fecha de expiración vencida o None.
+    """
+    if not vencida(usuario):
+        return None
+    expira = usuario.subscription_expires
+    set_committed_value(usuario, 'role', 'free')
+    set_committed_value(usuario, 'subscription_expires', None)
+    return expira
+
+
+def degradar_vencidas(ahora=None):
+    """Pasa a 'free' en una sola sentencia a todos los planes de pago vencidos.
+
+    Devuelve el número de usuarios degradados. Requiere contexto de app.
+    """
+    resultado = db.session.execute(
+        db.update(User)
+        .where(User.role.in_(ROLES_DE_PAGO),
+               User.subscription_expires.isnot(None),
+               User.subscription_expires < (ahora or datetime.utcnow()))
+        .values(role='free', subscription_expires=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    degradados = resultado.rowcount or 0
+    if degradados:
+        # el UPDATE masivo no pasa por los eventos del ORM
+        cache_usuarios.invalidar()
+    return degradados
+
+
+def _bucle(app, intervalo):
+    while True:
+        try:
+            with app.app_context():
+                degradados = degradar_vencidas()
+            with _LOCK:
+                _ESTADO['ultimo_barrido'] = datetime.utcnow().isoformat(timespec='seconds')
+                _ESTADO['degradados'] += degradados
+                _ESTADO['error'] = None
+            if degradados:
+                print(f"[suscripciones] {degradados} suscripciones vencidas degradadas a free")
+        except Exception as e:
+            print(f"[suscripciones] Error en el barrido: {e}")
+            with _LOCK:
+                _ESTADO['error'] = str(e)
+        time.sleep(intervalo)
+
+
+def iniciar(app, intervalo=None):
+    """Arranca el hilo del barrido (una vez por proceso). Devuelve False si está desactivado."""
+    intervalo = INTERVALO_BARRIDO if intervalo is None else intervalo
+    if intervalo <= 0:
+        return False
+    with _LOCK:
+        if _ESTADO['activo'] and _ESTADO['pid'] == os.getpid():
+            return True
+        _ESTADO['activo'] = True
+        _ESTADO['pid'] = os.getpid()
+    hilo = threading.Thread(target=_bucle, args=(app, intervalo), name='barrido-suscripciones', daemon=True)
+    hilo.start()
+    return True
+
+
+def estado():
+    """Estado del barrido (para diagnóstico)."""
+    with _LOCK:
+        return dict(_ESTADO, intervalo_segundos=INTERVALO_BARRIDO)
@@ -0,0 +1,152 @@
+"""Tiempos por etapa de cada petición (cabecera `Server-Timing`).
+
+Las vistas y modelos marcan sus etapas con el gestor de contexto
+`etapa('nombre')` o el decorador `medido('nombre')`. Con
+`TIEMPOS_ETAPAS=1` los tiempos se suman por petición (una etapa que se
+repite acumula su duración) y, al responder, se agregan como cabecera
+`Server-Timing` (visible en la pestaña Red del navegador) junto con el
+total y el tiempo de BD de `monitor_sql`, y se escribe una línea JSON en
+el log `tiempos`. El render de plantillas se mide solo, como etapa
+`plantilla`, con las señales `before_render_template`/`template_rendered`
+de Flask (requieren blinker, dependencia de Flask desde la 2.3).
+
+Desactivado (por defecto), `medido` devuelve la función sin envolver y
+`etapa` un objeto vacío compartido: el costo es una llamada. Fuera de
+una petición (por ejemplo en el vigilante de `recarga_datos`) tampoco
+se mide nada.
+"""
+
+import functools
+import json
+import logging
+import os
+import time
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+
+ACTIVO = os.environ.get('TIEMPOS_ETAPAS', '0') == '1'
+
+logger = logging.getLogger('tiempos')
+
+
+class _SinMedir:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iniciar(self):
+        return self
+
+    def terminar(self):
+        pass
+
+
+_SIN_MEDIR = _SinMedir()
+
+
+class _Etapa:
+    __slots__ = ('nombre', 'inicio')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.terminar()
+        return False
+
+    def iniciar(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def terminar(self):
+        duracion = time.perf_counter() - self.inicio
+        etapas = g.setdefault('tiempos_etapas', {})
+        etapas[self.nombre] = etapas.get(self.nombre, 0.0) + duracion
+
+
+def etapa(nombre):
+    """Gestor de contexto que suma la duración del bloque a la etapa `nombre`.
+
+    Para no reindentar un bloque existente también se puede usar con
+    llamadas explícitas: `m = etapa('x').iniciar()` ... `m.terminar()`.
+    """
+    if not ACTIVO or not has_request_context():
+        return _SIN_MEDIR
+    return _Etapa(nombre)
+
+
+def medido(nombre=None):
+    """Decorador: mide cada llamada como la etapa `nombre` (por defecto, el de la función)."""
+    def decorador(funcion):
+        if not ACTIVO:
+            return funcion
+        etiqueta = nombre or funcion.__name__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with etapa(etiqueta):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def _inicio_peticion():
+    g.tiempos_inicio = time.perf_counter()
+
+
+def _inicio_plantilla(app, template, context, **extra):
+    if has_request_context():
+        g.tiempos_plantilla = etapa('plantilla').iniciar()
+
+
+def _fin_plantilla(app, template, context, **extra):
+    medicion = g.pop('tiempos_plantilla', None) if has_request_context() else None
+    if medicion is not None:
+        medicion.terminar()
+
+
+def _cabecera(etapas, total, sql):
+    partes = [f'{nombre};dur={segundos * 1000:.1f}' for nombre, segundos in etapas.items()]
+    partes.append(f'db;dur={sql[1] * 1000:.1f};desc="{sql[0]} sentencias"')
+    partes.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(partes)
+
+
+def _fin_peticion(respuesta):
+    inicio = g.get('tiempos_inicio')
+    if inicio is None:
+        return respuesta
+    total = time.perf_counter() - inicio
+    etapas = g.get('tiempos_etapas', {})
+    # contadores de `monitor_sql` (se descartan después, en teardown_request)
+    sql = (g.get('sql_sentencias', 0), g.get('sql_segundos', 0.0))
+    respuesta.headers['Server-Timing'] = _cabecera(etapas, total, sql)
+    logger.info(json.dumps({
+        'endpoint': request.endpoint,
+        'metodo': request.method,
+        'estado': respuesta.status_code,
+        'total_ms': round(total * 1000, 1),
+        'etapas_ms': {k: round(v * 1000, 1) for k, v in etapas.items()},
+        'sql': {'sentencias': sql[0], 'ms': round(sql[1] * 1000, 1)},
+    }, ensure_ascii=False))
+    return respuesta
+
+
+def instalar(app):
+    """Registra los hooks de petición si `TIEMPOS_ETAPAS=1`. Devuelve si quedó activo."""
+    if not ACTIVO:
+        return False
+    app.before_request(_inicio_peticion)
+    app.after_request(_fin_peticion)
+    # etapa 'plantilla': render_template de cualquier vista, con las señales de Flask
+    before_render_template.connect(_inicio_plantilla, app)
+    template_rendered.connect(_fin_plantilla, app)
+    return True